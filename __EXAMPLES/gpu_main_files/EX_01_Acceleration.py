@@ -97,6 +97,7 @@ if worker.isMaster:
 
 worker.initLog(bool(args['log']), args['logdir'])
 worker.initTrace(bool(args['trace']), args['tracefile'])
+worker.initReduction(args['reduction'], bool(args['compacthisto']))
 worker.taskparallelism = withtp
 
 mpiprint(args)
@@ -26,7 +26,9 @@ from blond.llrf.rf_noise import FlatSpectrum, LHCNoiseFB
 from blond.llrf.beam_feedback import BeamFeedback
 from blond.trackers.tracker import RingAndRFTracker, FullRingAndRF
 from blond.input_parameters.rf_parameters import RFStation
+from blond.input_parameters.rf_parameters_options import RFStationOptions
 from blond.input_parameters.ring import Ring
+from blond.input_parameters.ring_options import RingOptions
 from blond.utils.mpi_config import worker, mpiprint
 from blond.utils.input_parser import parse
 from blond.utils import bmath as bm
@@ -100,6 +102,7 @@ if worker.isMaster:
 
 worker.initLog(bool(args['log']), args['logdir'])
 worker.initTrace(bool(args['trace']), args['tracefile'])
+worker.initReduction(args['reduction'], bool(args['compacthisto']))
 worker.taskparallelism = withtp
 
 mpiprint(args)
@@ -110,51 +113,85 @@ mpiprint("Setting up the simulation...")
 mpiprint("")
 
 # Import pre-processed momentum and voltage for the acceleration ramp
-if REAL_RAMP:
-    ps = np.load(os.path.join(inputDir, 'LHC_momentum_programme_6.5TeV.npz'))[
-        'arr_0']
-    # ps = np.loadtxt(wrkDir+r'input/LHC_momentum_programme_6.5TeV.dat',
-    # unpack=True)
-    ps = np.ascontiguousarray(ps)
-    ps = np.concatenate((ps, np.ones(436627)*6.5e12))
-else:
-    ps = 450.e9*np.ones(n_turns+1)
-mpiprint("Flat top momentum %.4e eV" % ps[-1])
-if REAL_RAMP:
-    V = np.concatenate((np.linspace(6.e6, 12.e6, 13563374),
-                        np.ones(436627)*12.e6))
-else:
-    V = 6.e6*np.ones(n_turns+1)
-mpiprint("Flat top voltage %.4e V" % V[-1])
-mpiprint("Momentum and voltage loaded...")
+def build_ring():
+    if REAL_RAMP:
+        ps = np.load(os.path.join(inputDir, 'LHC_momentum_programme_6.5TeV.npz'))[
+            'arr_0']
+        # ps = np.loadtxt(wrkDir+r'input/LHC_momentum_programme_6.5TeV.dat',
+        # unpack=True)
+        ps = np.ascontiguousarray(ps)
+        ps = np.concatenate((ps, np.ones(436627)*6.5e12))
+    else:
+        ps = 450.e9*np.ones(n_turns+1)
+
+    # Define general parameters
+    return Ring(C, alpha, ps[0:n_turns+1], Proton(), n_turns=n_turns,
+                RingOptions=RingOptions(cache_dir=args['cachedir']))
+
+
+def build_rf():
+    if REAL_RAMP:
+        V = np.concatenate((np.linspace(6.e6, 12.e6, 13563374),
+                            np.ones(436627)*12.e6))
+    else:
+        V = 6.e6*np.ones(n_turns+1)
 
-# Define general parameters
-ring = Ring(C, alpha, ps[0:n_turns+1], Proton(), n_turns=n_turns)
-mpiprint("General parameters set...")
+    # Define RF parameters (noise to be added for CC case)
+    return RFStation(ring, [h], [V[0:n_turns+1]], [0.],
+                     RFStationOptions=RFStationOptions(
+                         cache_dir=args['cachedir']))
 
-# Define RF parameters (noise to be added for CC case)
-rf = RFStation(ring, [h], [V[0:n_turns+1]], [0.])
-mpiprint("RF parameters set...")
+
+if args['sharedmem']:
+    # Programmes built by the master of the node only, and held once per
+    # node, except the ones modified by the feedbacks
+    ring = worker.shared_object(build_ring)
+    rf = worker.shared_object(build_rf,
+                              exclude=['phi_rf', 'omega_rf', 'dphi_rf'])
+    mpiprint("Programmes shared in the node...")
+else:
+    ring = build_ring()
+    rf = build_rf()
+mpiprint("Flat top momentum %.4e eV" % ring.momentum[0, -1])
+mpiprint("Flat top voltage %.4e V" % rf.voltage[0, -1])
+mpiprint("General and RF parameters set...")
 
 # Generate RF phase noise
 LHCnoise = FlatSpectrum(ring, rf, fmin_s0=0.8571, fmax_s0=1.001,
                         initial_amplitude=1.e-5,
                         predistortion='weightfunction')
-LHCnoise.dphi = np.load(
-    os.path.join(inputDir, 'LHCNoise_fmin0.8571_fmax1.001_ampl1e-5_weightfct_6.5TeV.npz'))['arr_0']
-LHCnoise.dphi = np.ascontiguousarray(LHCnoise.dphi[0:n_turns+1])
-mpiprint("RF phase noise loaded...")
+def load_noise():
+    dphi = np.load(os.path.join(
+        inputDir, 'LHCNoise_fmin0.8571_fmax1.001_ampl1e-5_weightfct_6.5TeV.npz'))['arr_0']
+    return np.ascontiguousarray(dphi[0:n_turns+1])
+
+
+if args['gennoise']:
+    LHCnoise.dphi = LHCnoise.windowed(n_threads=args['gennoise'])
+    mpiprint("RF phase noise generated on demand...")
+else:
+    if args['sharedmem']:
+        LHCnoise.dphi = worker.shared_array(load_noise)
+    else:
+        LHCnoise.dphi = load_noise()
+    mpiprint("RF phase noise loaded...")
 
 # FULL BEAM
-bunch = Beam(ring, n_particles, N_b)
-beam = Beam(ring, n_particles*n_bunches, N_b)
-bigaussian(ring, rf, bunch, 0.3e-9, reinsertion=True, seed=seed)
 bunch_spacing_buckets = 10
+if args['splitgen']:
+    # Every worker generates its own particles only
+    beam = Beam(ring, n_particles*n_bunches, N_b, split=True)
+    bigaussian(ring, rf, beam, 0.3e-9, reinsertion=True, seed=seed)
+    beam.dt += ((beam.id - 1) // n_particles) * rf.t_rf[0, 0]*10
+else:
+    bunch = Beam(ring, n_particles, N_b)
+    beam = Beam(ring, n_particles*n_bunches, N_b)
+    bigaussian(ring, rf, bunch, 0.3e-9, reinsertion=True, seed=seed)
 
-for i in np.arange(n_bunches):
-    beam.dt[i*n_particles:(i+1) *
-            n_particles] = bunch.dt[0:n_particles] + i*rf.t_rf[0, 0]*10
-    beam.dE[i*n_particles:(i+1)*n_particles] = bunch.dE[0:n_particles]
+    for i in np.arange(n_bunches):
+        beam.dt[i*n_particles:(i+1) *
+                n_particles] = bunch.dt[0:n_particles] + i*rf.t_rf[0, 0]*10
+        beam.dE[i*n_particles:(i+1)*n_particles] = bunch.dE[0:n_particles]
 
 
 # Profile required for PL
@@ -189,17 +226,30 @@ mpiprint("   SL t_i = %.4f t_f = %.4f" % (PL.lhc_t[0], PL.lhc_t[n_turns]))
 # Injecting noise in the cavity, PL on
 
 # Define machine impedance from http://impedance.web.cern.ch/impedance/
-ZTot = np.loadtxt(os.path.join(inputDir, 'Zlong_Allthemachine_450GeV_B1_LHC_inj_450GeV_B1.dat'),
-                  skiprows=1)
-ZTable = InputTable(ZTot[:, 0], ZTot[:, 1], ZTot[:, 2])
+def build_impedance_table():
+    ZTot = np.loadtxt(os.path.join(inputDir, 'Zlong_Allthemachine_450GeV_B1_LHC_inj_450GeV_B1.dat'),
+                      skiprows=1)
+    return InputTable(ZTot[:, 0], ZTot[:, 1], ZTot[:, 2])
+
+
+if args['sharedmem']:
+    ZTable = worker.shared_object(build_impedance_table)
+else:
+    ZTable = build_impedance_table()
 indVoltage = InducedVoltageFreq(
     beam, profile, [ZTable], frequency_resolution=freq_res)
 totVoltage = TotalInducedVoltage(beam, profile, [indVoltage])
+if args['sharedmem']:
+    # The impedance is computed by every worker from the shared table, then
+    # a single copy is kept per node
+    worker.share_arrays(indVoltage, ['total_impedance'])
+    totVoltage.fuse_impedances()
 
 # TODO add the noiseFB
 tracker = RingAndRFTracker(rf, beam, BeamFeedback=PL, Profile=profile,
                            interpolation=True, TotalInducedVoltage=totVoltage,
-                           solver='simple')
+                           solver='simple',
+                           rf_voltage_resync=args['rfresync'])
 # interpolation=True, TotalInducedVoltage=None)
 mpiprint("PL, SL, and tracker set...")
 # Fill beam distribution
@@ -222,7 +272,8 @@ mpiprint('dt std: ', np.std(beam.dE))
 mpiprint('dt mean, 1st bunch: ', np.mean(beam.dt[:n_particles]))
 mpiprint('shift ', rf.phi_rf[0, 0]/rf.omega_rf[0, 0])
 
-beam.split(random=False)
+if not args['splitgen']:
+    beam.split(random=False)
 
 mpiprint("Statistics set...")
 
@@ -263,63 +314,91 @@ timing.reset()
 start_t = time.time()
 
 
-for turn in range(n_iterations):
+# Without the approximations, task parallelism or GPUs, the turns between the
+# monitor, the load balancing and the change of bunch length target are
+# tracked at once
+fused = (approx == 0) and (not withtp) and (not worker.hasGPU)
+
+
+def last_turn(turn):
+    # Last turn that can be tracked at once from turn
+    last = n_iterations - 1
+    if args['monitor'] > 0:
+        last = min(last, -(-turn // args['monitor']) * args['monitor'])
+    lb_turns = np.concatenate((worker.inter_lb_turns, worker.intra_lb_turns))
+    lb_turns = lb_turns[lb_turns >= turn]
+    if len(lb_turns) > 0:
+        last = min(last, int(lb_turns.min()))
+    if turn < 9042249:
+        last = min(last, 9042249 - 1)
+    return last
+
+
+turn = 0
+while turn < n_iterations:
     # After the first 2/3 of the ramp, regulate down the bunch length
     if turn == 9042249:
         noiseFB.bl_targ = 1.1e-9
 
-    # Update profile
-    if (approx == 0):
-        profile.track()
-        # worker.sync()
-        profile.reduce_histo()
-    elif (approx == 1) and (turn % n_turns_reduce == 0):
-        profile.track()
-        # worker.sync()
-        profile.reduce_histo()
-    elif (approx == 2):
-        profile.track()
-        profile.scale_histo()
-
-    # If we are in a gpu group, with tp
-    if withtp and worker.gpu_id >= 0:
-        if worker.hasGPU:
-            if (approx == 0) or (approx == 2):
-                totVoltage.induced_voltage_sum()
-            elif (approx == 1) and (turn % n_turns_reduce == 0):
-                totVoltage.induced_voltage_sum()
+    if fused:
+        last = last_turn(turn)
+        tracker.track_n_turns(last - turn + 1)
+        turn = last
+    else:
+        # Update profile
+        if (approx == 0):
+            profile.track()
+            profile.reduce_histo_start()
+        elif (approx == 1) and (turn % n_turns_reduce == 0):
+            profile.track()
+            profile.reduce_histo_start()
+        elif (approx == 2):
+            profile.track()
+            profile.scale_histo()
+
+        # If we are in a gpu group, with tp
+        if withtp and worker.gpu_id >= 0:
+            profile.reduce_histo_wait()
+            if worker.hasGPU:
+                if (approx == 0) or (approx == 2):
+                    totVoltage.induced_voltage_sum()
+                elif (approx == 1) and (turn % n_turns_reduce == 0):
+                    totVoltage.induced_voltage_sum()
+            else:
+                tracker.pre_track()
+
+            worker.gpuSync()
+
+            # Here I need to broadcast the calculated stuff
+            totVoltage.induced_voltage = worker.broadcast(
+                totVoltage.induced_voltage)
+            tracker.rf_voltage = worker.broadcast(tracker.rf_voltage, root=1)
+        # else just do the normal task-parallelism
+        elif withtp:
+            profile.reduce_histo_wait()
+            if worker.isFirst:
+                if (approx == 0) or (approx == 2):
+                    totVoltage.induced_voltage_sum()
+                elif (approx == 1) and (turn % n_turns_reduce == 0):
+                    totVoltage.induced_voltage_sum()
+            if worker.isLast:
+                tracker.pre_track()
+
+            worker.intraSync()
+            worker.sendrecv(totVoltage.induced_voltage, tracker.rf_voltage)
         else:
-            tracker.pre_track()
-
-        worker.gpuSync()
-
-        # Here I need to broadcast the calculated stuff
-        totVoltage.induced_voltage = worker.broadcast(
-            totVoltage.induced_voltage)
-        tracker.rf_voltage = worker.broadcast(tracker.rf_voltage, root=1)
-    # else just do the normal task-parallelism
-    elif withtp:
-        if worker.isFirst:
+            # The rf voltage is computed while the histogram is reduced
+            tracker.pre_track(histo_wait=profile.reduce_histo_wait)
             if (approx == 0) or (approx == 2):
                 totVoltage.induced_voltage_sum()
             elif (approx == 1) and (turn % n_turns_reduce == 0):
                 totVoltage.induced_voltage_sum()
-        if worker.isLast:
-            tracker.pre_track()
-
-        worker.intraSync()
-        worker.sendrecv(totVoltage.induced_voltage, tracker.rf_voltage)
-    else:
-        if (approx == 0) or (approx == 2):
-            totVoltage.induced_voltage_sum()
-        elif (approx == 1) and (turn % n_turns_reduce == 0):
-            totVoltage.induced_voltage_sum()
-        tracker.pre_track()
 
-    tracker.track_only()
+        tracker.track_only()
 
     if (args['monitor'] > 0) and (turn % args['monitor'] == 0):
-        beam.statistics()
+        beam.statistics(n_bunches, bunch_spacing_buckets, rf.t_rf[0, turn],
+                        shiftX=rf.phi_rf[0, turn]/rf.omega_rf[0, turn])
         beam.gather_statistics()
         profile.fwhm_multibunch(n_bunches, bunch_spacing_buckets,
                                 rf.t_rf[0, turn], bucket_tolerance=0,
@@ -328,6 +407,7 @@ for turn in range(n_iterations):
             slicesMonitor.track(turn)
 
     worker.DLB(turn, beam)
+    turn += 1
 
 
 beam.gather()
@@ -138,6 +138,7 @@ if worker.isMaster:
 
 worker.initLog(bool(args['log']), args['logdir'])
 worker.initTrace(bool(args['trace']), args['tracefile'])
+worker.initReduction(args['reduction'], bool(args['compacthisto']))
 worker.taskparallelism = withtp
 
 mpiprint(args)
@@ -225,7 +226,7 @@ for bucket in rf_LoCa.buckets:
 
 
 # Beam
-beam = Beam(ring, n_macroparticles, intensity)
+beam = Beam(ring, n_macroparticles, intensity, split=bool(args['splitgen']))
 
 # Profile
 cut_options = CutOptions(cut_left, cut_right, n_slices_total, cuts_unit='rad',
@@ -407,7 +408,8 @@ match_beam_from_distribution(beam, full_tracker, ring,
 mpiprint('dE mean:', np.mean(beam.dE))
 mpiprint('dE std:', np.std(beam.dE))
 
-beam.split(random=False)
+if not args['splitgen']:
+    beam.split(random=False)
 
 # Tracking -------------------------------------------------------------------
 
@@ -453,12 +455,10 @@ for turn in range(n_iterations):
 
     if (approx == 0):
         profile.track()
-        # worker.sync()
-        profile.reduce_histo()
+        profile.reduce_histo_start()
     elif (approx == 1) and (turn % n_turns_reduce == 0):
         profile.track()
-        # worker.sync()
-        profile.reduce_histo()
+        profile.reduce_histo_start()
     elif (approx == 2):
         profile.track()
         profile.scale_histo()
@@ -471,6 +471,7 @@ for turn in range(n_iterations):
 
     # If we are in a gpu group, with tp
     if withtp and worker.gpu_id >= 0:
+        profile.reduce_histo_wait()
         if worker.hasGPU:
             if (approx == 0) or (approx == 2):
                 PS_longitudinal_intensity.induced_voltage_sum()
@@ -488,6 +489,7 @@ for turn in range(n_iterations):
         tracker.rf_voltage = worker.broadcast(tracker.rf_voltage)
     # else just do the normal task-parallelism
     elif withtp:
+        profile.reduce_histo_wait()
         if worker.isFirst:
             if (approx == 0) or (approx == 2):
                 PS_longitudinal_intensity.induced_voltage_sum()
@@ -500,17 +502,19 @@ for turn in range(n_iterations):
         worker.sendrecv(
             PS_longitudinal_intensity.induced_voltage, tracker.rf_voltage)
     else:
+        # The rf voltage is computed while the histogram is reduced
+        tracker.pre_track(histo_wait=profile.reduce_histo_wait)
         if (approx == 0) or (approx == 2):
             PS_longitudinal_intensity.induced_voltage_sum()
         elif (approx == 1) and (turn % n_turns_reduce == 0):
             PS_longitudinal_intensity.induced_voltage_sum()
         # PS_longitudinal_intensity.induced_voltage_sum()
-        tracker.pre_track()
 
     tracker.track_only()
 
     if (args['monitor'] > 0) and (turn % args['monitor'] == 0):
-        beam.statistics()
+        beam.statistics(n_bunches, bunch_spacing_buckets,
+                        rf_params.t_rf[0, turn])
         beam.gather_statistics()
         profile.fwhm_multibunch(n_bunches, bunch_spacing_buckets,
                                 rf_params.t_rf[0, turn], bucket_tolerance=0)
@@ -108,6 +108,7 @@ if worker.isMaster:
 
 worker.initLog(bool(args['log']), args['logdir'])
 worker.initTrace(bool(args['trace']), args['tracefile'])
+worker.initReduction(args['reduction'], bool(args['compacthisto']))
 worker.taskparallelism = withtp
 
 mpiprint(args)
@@ -509,18 +510,17 @@ for turn in range(n_iterations):
     # Update profile
     if (approx == 0):
         profile.track()
-        # worker.sync()
-        profile.reduce_histo()
+        profile.reduce_histo_start()
     elif (approx == 1) and (turn % n_turns_reduce == 0):
         profile.track()
-        # worker.sync()
-        profile.reduce_histo()
+        profile.reduce_histo_start()
     elif (approx == 2):
         profile.track()
         profile.scale_histo()
 
     # If we are in a gpu group, with tp
     if withtp and worker.gpu_id >= 0:
+        profile.reduce_histo_wait()
         if worker.hasGPU:
             if (turn < 8*int(FBtime)):
                 longCavityImpedanceReduction.track()
@@ -539,6 +539,7 @@ for turn in range(n_iterations):
         tracker.rf_voltage = worker.broadcast(tracker.rf_voltage)
     # else just do the normal task-parallelism
     elif withtp:
+        profile.reduce_histo_wait()
         if worker.isFirst:
             if (turn < 8*int(FBtime)):
                 longCavityImpedanceReduction.track()
@@ -554,13 +555,15 @@ for turn in range(n_iterations):
         worker.sendrecv(inducedVoltage.induced_voltage, tracker.rf_voltage)
     else:
         if (turn < 8*int(FBtime)):
+            profile.reduce_histo_wait()
             longCavityImpedanceReduction.track()
             shortCavityImpedanceReduction.track()
+        # The rf voltage is computed while the histogram is reduced
+        tracker.pre_track(histo_wait=profile.reduce_histo_wait)
         if (approx == 0) or (approx == 2):
             inducedVoltage.induced_voltage_sum()
         elif (approx == 1) and (turn % n_turns_reduce == 0):
             inducedVoltage.induced_voltage_sum()
-        tracker.pre_track()
 
     tracker.track_only()
 
@@ -586,7 +589,7 @@ for turn in range(n_iterations):
                     phaseLoop.time_offset -= delta
 
     if (args['monitor'] > 0) and (turn % args['monitor'] == 0):
-        beam.statistics()
+        beam.statistics(n_bunches, bunch_spacing, rf_station.t_rf[0, turn])
         beam.gather_statistics()
         profile.fwhm_multibunch(n_bunches, bunch_spacing,
                                 rf_station.t_rf[0, turn], bucket_tolerance=0)
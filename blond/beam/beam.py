@@ -77,6 +77,10 @@ class Beam(object):
         total number of macroparticles.
     intensity : float
         total intensity of the beam (in number of charge).
+    split : bool
+        MPI only: allocate only the share of the macroparticles of this
+        worker, the one it would get from split(). The distributions then
+        generate the local particles only; default is False.
 
     Attributes
     ----------
@@ -138,15 +142,29 @@ class Beam(object):
     >>> my_beam = Beam(ring, n_macroparticle, intensity)
     """
 
-    def __init__(self, Ring, n_macroparticles, intensity):
+    # Over-allocation of the capacity buffers used by resize()
+    capacity_factor = 1.25
+
+    def __init__(self, Ring, n_macroparticles, intensity, split=False):
 
         self.Particle = Ring.Particle
         self.beta = Ring.beta[0][0]
         self.gamma = Ring.gamma[0][0]
         self.energy = Ring.energy[0][0]
         self.momentum = Ring.momentum[0][0]
-        self.dt = np.zeros([int(n_macroparticles)], dtype=bm.precision.real_t)
-        self.dE = np.zeros([int(n_macroparticles)], dtype=bm.precision.real_t)
+        first_id = 0
+        n_local = int(n_macroparticles)
+        if split:
+            if not bm.mpiMode():
+                raise RuntimeError(
+                    'ERROR: Cannot use this routine unless in MPI Mode')
+            from ..utils.mpi_config import worker
+            counts = worker.split_counts(int(n_macroparticles))
+            first_id = int(np.sum(counts[:worker.rank]))
+            n_local = counts[worker.rank]
+
+        self.dt = np.zeros([n_local], dtype=bm.precision.real_t)
+        self.dE = np.zeros([n_local], dtype=bm.precision.real_t)
 
         self.mean_dt = 0.
         self.sigma_dt = 0.
@@ -159,16 +177,27 @@ class Beam(object):
         self.max_dE = 0.
 
         self.intensity = float(intensity)
-        self.n_macroparticles = int(n_macroparticles)
-        self.ratio = self.intensity/self.n_macroparticles
-        self.id = np.arange(1, self.n_macroparticles + 1, dtype=int)
+        self.n_macroparticles = n_local
+        self.ratio = self.intensity/int(n_macroparticles)
+        self.id = np.arange(first_id + 1, first_id + n_local + 1, dtype=int)
 
         # For MPI
         self.n_total_macroparticles_lost = 0
         self.n_total_macroparticles = n_macroparticles
-        self.is_splitted = False
-        self._sumsq_dt = 0.
-        self._sumsq_dE = 0.
+        self.is_splitted = bool(split)
+        # Local statistics of statistics(), see bm.beam_statistics; no
+        # particles yet, with the min and max left out of gather_statistics
+        big = np.finfo(np.float64).max
+        self._statistics = np.array([0, 0, 0, 0, big, -big, 0, 0, big, -big],
+                                    dtype=np.float64)
+        # Local statistics of every bunch, see bm.bunch_statistics; None
+        # unless statistics() is given the bunches
+        self._bunch_statistics = None
+
+        # Capacity buffers backing dt, dE and id, see resize()
+        self._dt_buffer = None
+        self._dE_buffer = None
+        self._id_buffer = None
     
             
     def use_gpu(self):
@@ -231,37 +260,82 @@ class Beam(object):
                                " eliminated!")
 
 
-    def statistics(self):
+    def statistics(self, n_bunches=None, bunch_spacing_buckets=1,
+                   bucket_size_tau=None, shiftX=0):
         '''
         Calculation of the mean and standard deviation of beam coordinates,
         as well as beam emittance using different definitions.
-        Take no arguments, statistics stored in
+        Statistics stored in
 
         - mean_dt
         - mean_dE
         - sigma_dt
         - sigma_dE
+        - min_dt, max_dt, min_dE, max_dE
+
+        Given n_bunches, also the statistics of every bunch, bunch i being
+        the RF bucket i * bunch_spacing_buckets of length bucket_size_tau,
+        which must then be given, counted from shiftX, as in
+        Profile.fwhm_multibunch; stored in
+
+        - bunch_alive
+        - bunch_mean_dt, bunch_mean_dE
+        - bunch_sigma_dt, bunch_sigma_dE
+        - bunch_min_dt, bunch_max_dt, bunch_min_dE, bunch_max_dE
+        - bunch_epsn_rms_l
         '''
 
-        # Statistics only for particles that are not flagged as lost
-        itemindex = np.where(self.id != 0)[0]
-        # itemindex = bm.where(self.id, 0)
-        self.mean_dt = bm.mean(self.dt[itemindex])
-        self.sigma_dt = bm.std(self.dt[itemindex])
-        self._sumsq_dt = np.dot(self.dt[itemindex], self.dt[itemindex])
-        # self.min_dt = np.min(self.dt[itemindex])
-        # self.max_dt = np.max(self.dt[itemindex])
-
-        self.mean_dE = bm.mean(self.dE[itemindex])
-        self.sigma_dE = bm.std(self.dE[itemindex])
-        self._sumsq_dE = np.dot(self.dE[itemindex], self.dE[itemindex])
+        # Statistics only for particles that are not flagged as lost, in a
+        # single pass; kept for gather_statistics
+        self._statistics = bm.beam_statistics(self.dt, self.dE, self.id)
+        self._set_statistics(self._statistics)
 
-        # self.min_dE = np.min(self.dE[itemindex])
-        # self.max_dE = np.max(self.dE[itemindex])
+        if n_bunches is None:
+            self._bunch_statistics = None
+        else:
+            if bucket_size_tau is None:
+                # BucketSizeError
+                raise RuntimeError("ERROR in Beam.statistics: " +
+                                   "bucket_size_tau is required with " +
+                                   "n_bunches")
+            self._bunch_statistics = bm.bunch_statistics(
+                self.dt, self.dE, self.id, n_bunches, bunch_spacing_buckets,
+                bucket_size_tau, t_offset=shiftX)
+            self._set_bunch_statistics(self._bunch_statistics)
+
+    def _set_statistics(self, stats):
+        # From the statistics of bm.beam_statistics
+        if stats[0] > 0:
+            self.mean_dt, self.mean_dE = stats[2], stats[6]
+            self.sigma_dt = np.sqrt(stats[3] / stats[0])
+            self.sigma_dE = np.sqrt(stats[7] / stats[0])
+            self.min_dt, self.max_dt = stats[4], stats[5]
+            self.min_dE, self.max_dE = stats[8], stats[9]
+        else:
+            self.mean_dt = self.mean_dE = np.nan
+            self.sigma_dt = self.sigma_dE = np.nan
+            self.min_dt = self.max_dt = self.min_dE = self.max_dE = np.nan
 
         # R.m.s. emittance in Gaussian approximation
         self.epsn_rms_l = np.pi*self.sigma_dE*self.sigma_dt  # in eVs
 
+    def _set_bunch_statistics(self, stats):
+        # From the statistics of bm.bunch_statistics, nan for empty bunches
+        alive = stats[:, 0]
+        empty = alive == 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sigma = np.sqrt(stats[:, [3, 7]] / alive[:, None])
+        moments = np.where(empty[:, None], np.nan, stats[:, 2:])
+        sigma[empty] = np.nan
+
+        self.bunch_alive = alive.astype(int)
+        self.bunch_mean_dt, self.bunch_mean_dE = moments[:, 0], moments[:, 4]
+        self.bunch_sigma_dt, self.bunch_sigma_dE = sigma[:, 0], sigma[:, 1]
+        self.bunch_min_dt, self.bunch_max_dt = moments[:, 2], moments[:, 3]
+        self.bunch_min_dE, self.bunch_max_dE = moments[:, 6], moments[:, 7]
+
+        # R.m.s. emittance in Gaussian approximation
+        self.bunch_epsn_rms_l = np.pi*self.bunch_sigma_dE*self.bunch_sigma_dt
 
     def losses_separatrix(self, Ring, RFStation):
         '''Beam losses based on separatrix.
@@ -401,6 +475,50 @@ class Beam(object):
         self.n_macroparticles += other_beam.n_macroparticles
 
 
+    def resize(self, n_macroparticles):
+        '''
+        Method to change the number of local macro-particles, keeping the
+        coordinates of the first min(old, new) ones. The coordinates are
+        views of capacity buffers, over-allocated by capacity_factor, so that
+        shrinking or growing within the capacity (e.g. when the load balancer
+        moves particles between MPI workers) does not copy the beam.
+
+        Parameters
+        ----------
+        n_macroparticles : int
+            New number of local macro-particles
+        '''
+
+        n_macroparticles = int(n_macroparticles)
+        n_keep = min(n_macroparticles, len(self.dt))
+
+        for name in ['dt', 'dE', 'id']:
+            array = getattr(self, name)
+            buffer = getattr(self, '_%s_buffer' % name)
+            if (buffer is None) or (array.base is not buffer) or \
+                    (array.ctypes.data != buffer.ctypes.data) or \
+                    (len(buffer) < n_macroparticles):
+                # Arrays replaced since the last call, or out of capacity
+                capacity = max(int(self.capacity_factor * n_macroparticles),
+                               n_macroparticles, 1)
+                new_buffer = np.empty(capacity, dtype=array.dtype)
+                new_buffer[:n_keep] = array[:n_keep]
+                buffer = new_buffer
+                setattr(self, '_%s_buffer' % name, buffer)
+            setattr(self, name, buffer[:n_macroparticles])
+
+        self.n_macroparticles = n_macroparticles
+
+    def sort_particles(self):
+        '''
+        Sorts the particles with respect to dt, in place, permuting dE and id
+        with dt. The arrays are not reallocated, so views of them stay
+        valid. The particles move little in dt between turns, so the order
+        of the previous call is almost correct and is fixed incrementally.
+        '''
+
+        bm.sort_particles(self.dt, self.dE, self.id)
+
     def __iadd__(self, other):
         '''
         Initialisation of in place addition calls add_beam(other) if other
@@ -419,7 +537,7 @@ class Beam(object):
             return self
 
 
-    def split(self, random=False, fast=False):
+    def split(self, random=False, fast=False, seed=None):
         '''
         MPI ONLY ROUTINE: Splits the beam equally among the workers for
         MPI processing.
@@ -434,6 +552,8 @@ class Beam(object):
             beam so only the particle ids are distributed.
             If false, all the coordinates are distributed by the master to all
             the workers.
+        seed : int
+            Seed of the shuffling, the same seed gives the same split.
         '''
 
         if not bm.mpiMode():
@@ -442,8 +562,12 @@ class Beam(object):
 
         from ..utils.mpi_config import worker
         if worker.isMaster and random:
-            import random
-            random.shuffle(self.id)
+            from ..utils import counter_rng
+            order = counter_rng.permutation(seed, len(self.id))
+            self.id = self.id[order]
+            if not fast:
+                self.dt = self.dt[order]
+                self.dE = self.dE[order]
 
         self.id = worker.scatter(self.id)
 
@@ -504,77 +628,17 @@ class Beam(object):
                 'ERROR: Cannot use this routine unless in MPI Mode')
 
         from ..utils.mpi_config import worker
-        if all:
-
-            self.mean_dt = worker.allreduce(
-                np.array([self.mean_dt]), operator='mean')[0]
-
-            self.mean_dE = worker.allreduce(
-                np.array([self.mean_dE]), operator='mean')[0]
-
-            self.n_total_macroparticles_lost = worker.allreduce(
-                np.array([self.n_macroparticles_lost]), operator='sum')[0]
-
-            # self.n_total_macroparticles_alive = worker.allreduce(
-            # np.array([self.n_macroparticles_alive]), operator='sum')[0]
-
-            self.sigma_dt = worker.allreduce(
-                np.array([self._sumsq_dt]), operator='sum')[0]
-            self.sigma_dt = np.sqrt(
-                self.sigma_dt/(self.n_total_macroparticles -
-                               self.n_total_macroparticles_lost)
-                - self.mean_dt**2)
-
-            self.sigma_dE = worker.allreduce(
-                np.array([self._sumsq_dE]), operator='sum')[0]
-            self.sigma_dE = np.sqrt(
-                self.sigma_dE/(self.n_total_macroparticles -
-                               self.n_total_macroparticles_lost)
-                - self.mean_dE**2)
-
-            # self.sigma_dt = worker.allreduce(
-            #     np.array([self.mean_dt, self.sigma_dt, self.n_macroparticles_alive]),
-            #     operator='std')[0]
-
-            # self.sigma_dE = worker.allreduce(
-            #     np.array([self.mean_dE, self.sigma_dE,
-            #               self.n_macroparticles_alive]),
-            #     operator='std')[0]
 
+        # Counts, means, squared deviations, min and max of every worker,
+        # of the beam and of every bunch, merged in a single reduction
+        if self._bunch_statistics is None:
+            stats = worker.reduce_statistics(self._statistics.copy(), all=all)
         else:
-            self.mean_dt = worker.reduce(
-                np.array([self.mean_dt]), operator='mean')[0]
-
-            self.mean_dE = worker.reduce(
-                np.array([self.mean_dE]), operator='mean')[0]
-
-            self.n_total_macroparticles_lost = worker.reduce(
-                np.array([self.n_macroparticles_lost]), operator='sum')[0]
-
-
-            self.sigma_dt = worker.reduce(
-                np.array([self._sumsq_dt]), operator='sum')[0]
-            self.sigma_dt = np.sqrt(
-                self.sigma_dt/(self.n_total_macroparticles -
-                               self.n_total_macroparticles_lost)
-                - self.mean_dt**2)
-
-            self.sigma_dE = worker.reduce(
-                np.array([self._sumsq_dE]), operator='sum')[0]
-            self.sigma_dE = np.sqrt(
-                self.sigma_dE/(self.n_total_macroparticles -
-                               self.n_total_macroparticles_lost)
-                - self.mean_dE**2)
-
-            # self.sigma_dt = worker.reduce(
-            #     np.array([self.mean_dt, self.sigma_dt,
-            #               self.n_macroparticles_alive]),
-            #     operator='std')[0]
-
-            # self.sigma_dE = worker.reduce(
-            #     np.array([self.mean_dE, self.sigma_dE,
-            #               self.n_macroparticles_alive]),
-            #     operator='std')[0]
+            stats = worker.reduce_statistics(np.concatenate(
+                (self._statistics, self._bunch_statistics.ravel())), all=all)
+            self._set_bunch_statistics(stats[10:].reshape(-1, 10))
+        self.n_total_macroparticles_lost = int(stats[1])
+        self._set_statistics(stats[:10])
 
     def gather_losses(self, all=False):
         '''
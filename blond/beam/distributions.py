@@ -28,6 +28,8 @@ from ..trackers.utilities import is_in_separatrix
 from ..beam.profile import Profile, CutOptions
 from ..trackers.utilities import potential_well_cut, minmax_location
 from ..utils import bmath as bm
+from ..input_parameters.programme_cache import programme_hash
+from ..utils import counter_rng
 
 
 def matched_from_line_density(beam, full_ring_and_RF, line_density_input=None,
@@ -457,7 +459,6 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
         induced_voltage_object = copy.deepcopy(TotalInducedVoltage)
         profile = induced_voltage_object.profile
 
-    dE_trajectory = np.zeros(n_points_potential)
     for i in range(n_iterations):
         old_potential = copy.deepcopy(total_potential)
 
@@ -501,42 +502,16 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
                                           potential_well_low_res)[0]
 
         # Computing the action J by integrating the dE trajectories
-        J_array_dE0 = np.zeros(n_points_grid)
-
-        full_ring_and_RF2 = copy.deepcopy(full_ring_and_RF)
-        for j in range(n_points_grid):
-            # Find left and right time coordinates for a given hamiltonian
-            # value
-            time_indexes = np.where(potential_well_low_res <=
-                                    potential_well_low_res[j])[0]
-            left_time = time_potential_low_res[np.max((0, time_indexes[0]))]
-            right_time = time_potential_low_res[np.min((time_indexes[-1],
-                                                        n_points_grid-1))]
-            # Potential well calculation with high resolution in that frame
-            time_potential_high_res = np.linspace(float(left_time), float(right_time),
-                                                  n_points_potential)
-            full_ring_and_RF2.potential_well_generation(
-                n_points=n_points_potential,
-                time_array=time_potential_high_res,
-                main_harmonic_option=main_harmonic_option)
-            pot_well_high_res = full_ring_and_RF2.potential_well
-
-            if TotalInducedVoltage is not None and i != 0:
-                induced_potential_hires = np.interp(time_potential_high_res,
-                                                    time_potential, induced_potential +
-                                                    extra_potential, left=0, right=0)
-                pot_well_high_res += induced_potential_hires
-                pot_well_high_res -= pot_well_high_res.min()
-
-            # Integration to calculate action
-            dE_trajectory[pot_well_high_res <= potential_well_low_res[j]] = \
-                np.sqrt((potential_well_low_res[j] -
-                         pot_well_high_res[pot_well_high_res <=
-                                           potential_well_low_res[j]]) / eom_factor_dE)
-            dE_trajectory[pot_well_high_res > potential_well_low_res[j]] = 0
-
-            J_array_dE0[j] = 1 / np.pi * np.trapz(dE_trajectory,
-                                                  dx=time_potential_high_res[1] - time_potential_high_res[0])
+        if TotalInducedVoltage is not None and i != 0:
+            induced_potential_action = induced_potential + extra_potential
+        else:
+            induced_potential_action = None
+        J_array_dE0 = action_integrals(full_ring_and_RF, time_potential_low_res,
+                                       potential_well_low_res, eom_factor_dE,
+                                       n_points_potential,
+                                       main_harmonic_option=main_harmonic_option,
+                                       time_potential=time_potential,
+                                       induced_potential=induced_potential_action)
 
         # Sorting the H and J functions to be able to interpolate J(H)
         H_array_dE0 = potential_well_low_res
@@ -591,7 +566,10 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
 
         # Calculating the line density
         line_density_ = np.sum(density_grid, axis=0)
-        line_density_ *= beam.n_macroparticles / np.sum(line_density_)
+        if beam.is_splitted:
+            line_density_ *= beam.n_total_macroparticles / np.sum(line_density_)
+        else:
+            line_density_ *= beam.n_macroparticles / np.sum(line_density_)
 
         # Induced voltage contribution
         if TotalInducedVoltage is not None:
@@ -622,8 +600,6 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
             induced_potential = np.interp(time_potential,
                                           time_potential_low_res, induced_potential_low_res,
                                           left=0, right=0)
-        del full_ring_and_RF2
-        gc.collect()
     # Populating the bunch
     populate_bunch(beam, time_grid, deltaE_grid, density_grid,
                    time_resolution_low, deltaE_coord_array[1] -
@@ -635,6 +611,100 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
         return [time_potential_low_res, line_density_]
 
 
+# Action integrals J(H) already computed, see action_integrals()
+_action_cache = {}
+_action_cache_size = 32
+
+
+def action_integrals(full_ring_and_RF, time_potential_low_res,
+                     potential_well_low_res, eom_factor_dE, n_points_potential,
+                     main_harmonic_option='lowest_freq', time_potential=None,
+                     induced_potential=None, max_points=int(2e5)):
+    '''
+    *Function computing the action J of the trajectories passing at dE = 0
+    through each point of the low resolution potential well. For each point,
+    the turning points are found on the low resolution well, the RF
+    potential is recomputed with n_points_potential points between them and
+    the dE trajectory is integrated. All points are processed together, in
+    blocks of at most max_points samples. The induced_potential, given on
+    time_potential, is added to the RF potential if not None. The result is
+    cached on the inputs, so that the bunches generated in the same bucket
+    reuse it.*
+    '''
+
+    n_points_grid = len(potential_well_low_res)
+    n_points_potential = int(n_points_potential)
+
+    rf_parameters = [(RingAndRFSectionElement.voltage[:, 0],
+                      RingAndRFSectionElement.omega_rf[:, 0],
+                      RingAndRFSectionElement.phi_rf[:, 0],
+                      RingAndRFSectionElement.acceleration_kick[0],
+                      RingAndRFSectionElement.t_rev[0],
+                      RingAndRFSectionElement.eta_0[0],
+                      RingAndRFSectionElement.charge)
+                     for RingAndRFSectionElement in
+                     full_ring_and_RF.RingAndRFSection_list]
+    key = programme_hash(rf_parameters, time_potential_low_res,
+                         potential_well_low_res, eom_factor_dE,
+                         n_points_potential, main_harmonic_option,
+                         time_potential, induced_potential)
+    if key in _action_cache:
+        return _action_cache[key].copy()
+
+    # Left and right time coordinates for each hamiltonian value
+    below = potential_well_low_res[np.newaxis, :] <= \
+        potential_well_low_res[:, np.newaxis]
+    left_time = time_potential_low_res[np.argmax(below, axis=1)]
+    right_time = time_potential_low_res[
+        n_points_grid - 1 - np.argmax(below[:, ::-1], axis=1)]
+    del below
+
+    # The potential well of the full ring is restored afterwards
+    saved_attributes = (full_ring_and_RF.potential_well,
+                        full_ring_and_RF.potential_well_coordinates,
+                        getattr(full_ring_and_RF, 'total_voltage', None))
+
+    J_array_dE0 = np.zeros(n_points_grid)
+    block = max(1, int(max_points) // n_points_potential)
+    for start in range(0, n_points_grid, block):
+        stop = min(start + block, n_points_grid)
+
+        # Potential wells calculation with high resolution in these frames
+        time_potential_high_res = np.linspace(left_time[start:stop],
+                                              right_time[start:stop],
+                                              n_points_potential, axis=-1)
+        full_ring_and_RF.potential_well_generation(
+            n_points=n_points_potential,
+            time_array=time_potential_high_res,
+            main_harmonic_option=main_harmonic_option)
+        pot_well_high_res = full_ring_and_RF.potential_well
+
+        if induced_potential is not None:
+            pot_well_high_res += np.interp(time_potential_high_res,
+                                           time_potential, induced_potential,
+                                           left=0, right=0)
+            pot_well_high_res -= pot_well_high_res.min(axis=1, keepdims=True)
+
+        # Integration to calculate action
+        dE_trajectory = potential_well_low_res[start:stop, np.newaxis] - \
+            pot_well_high_res
+        np.maximum(dE_trajectory, 0, out=dE_trajectory)
+        dE_trajectory = np.sqrt(dE_trajectory / eom_factor_dE)
+
+        J_array_dE0[start:stop] = 1 / np.pi * np.trapz(dE_trajectory, axis=1) * \
+            (time_potential_high_res[:, 1] - time_potential_high_res[:, 0])
+
+    (full_ring_and_RF.potential_well,
+     full_ring_and_RF.potential_well_coordinates,
+     full_ring_and_RF.total_voltage) = saved_attributes
+
+    if len(_action_cache) >= _action_cache_size:
+        _action_cache.pop(next(iter(_action_cache)))
+    _action_cache[key] = J_array_dE0
+
+    return J_array_dE0.copy()
+
+
 def X0_from_bunch_length(bunch_length, bunch_length_fit, X_grid, sorted_X_dE0,
                          n_points_grid, time_potential_low_res,
                          distribution_function_, distribution_type,
@@ -722,12 +792,40 @@ def X0_from_bunch_length(bunch_length, bunch_length_fit, X_grid, sorted_X_dE0,
     return X0
 
 
+def first_particle(beam):
+    '''
+    *Index of the first local particle of a split beam. The local particles
+    have consecutive ids, see Beam(split=True).*
+    '''
+
+    if len(beam.id) > 0 and beam.id[-1] - beam.id[0] + 1 != len(beam.id):
+        # DistributionError
+        raise RuntimeError('ERROR: The ids of the local particles are not ' +
+                           'consecutive, the beam cannot be generated')
+    return int(beam.id[0]) - 1 if len(beam.id) > 0 else 0
+
+
 def populate_bunch(beam, time_grid, deltaE_grid, density_grid, time_step,
                    deltaE_step, seed):
     '''
     *Method to populate the bunch using a random number generator from the
-    particle density in phase space.*
+    particle density in phase space. A split beam is populated in place
+    with its local particles only, drawn from the counter-based generator
+    so that the bunch does not depend on the number of workers.*
     '''
+    if beam.is_splitted:
+        # Only the local particles, from the counter-based generator
+        u = counter_rng.uniforms(seed, first_particle(beam),
+                                 beam.n_macroparticles)
+        cumulative_density = np.cumsum(density_grid.flatten())
+        indexes = np.searchsorted(cumulative_density,
+                                  u[:, 0] * cumulative_density[-1])
+        indexes = np.minimum(indexes, np.size(density_grid) - 1)
+        beam.dt[:] = time_grid.flatten()[indexes] + (u[:, 1] - 0.5) * time_step
+        beam.dE[:] = deltaE_grid.flatten()[indexes] + \
+            (u[:, 2] - 0.5) * deltaE_step
+        return
+
     # Initialise the random number generator
     np.random.seed(seed=seed)
     # Generating particles randomly inside the grid cells according to the
@@ -871,6 +969,32 @@ def bigaussian(Ring, RFStation, Beam, sigma_dt, sigma_dE=None, seed=None,
     Beam.sigma_dt = sigma_dt
     Beam.sigma_dE = sigma_dE
 
+    if Beam.is_splitted:
+        # Only the local particles, from the counter-based generator
+        first = first_particle(Beam)
+        dt, dE = counter_rng.normals(seed, first, Beam.n_macroparticles)
+        Beam.dt[:] = sigma_dt*dt + (phi_s - phi_rf)/omega_rf
+        Beam.dE[:] = sigma_dE*dE
+
+        # Re-insert if necessary, with a new stream for each attempt
+        if reinsertion == True:
+
+            itemindex = np.where(is_in_separatrix(Ring,
+                                                  RFStation, Beam, Beam.dt, Beam.dE) == False)[0]
+            stream = 0
+
+            while itemindex.size != 0:
+
+                stream += 1
+                dt, dE = counter_rng.normals(seed, first,
+                                             Beam.n_macroparticles, stream)
+                Beam.dt[itemindex] = sigma_dt*dt[itemindex] + \
+                    (phi_s - phi_rf)/omega_rf
+                Beam.dE[itemindex] = sigma_dE*dE[itemindex]
+                itemindex = np.where(is_in_separatrix(Ring,
+                                                      RFStation, Beam, Beam.dt, Beam.dE) == False)[0]
+        return
+
     # Generate coordinates
     np.random.seed(seed)
 
@@ -8,6 +8,8 @@ from __future__ import division, print_function, absolute_import
 from builtins import range
 import numpy as np
 import copy
+import multiprocessing
+import sys
 import matplotlib.pyplot as plt
 from scipy.integrate import cumtrapz
 from  ..utils import bmath as bm
@@ -15,7 +17,7 @@ from ..beam.beam import Beam
 from ..beam.distributions import matched_from_distribution_function,\
                            matched_from_line_density, populate_bunch,\
                            distribution_function, potential_well_cut,\
-                           X0_from_bunch_length
+                           X0_from_bunch_length, first_particle
 
 import gc
 
@@ -26,7 +28,8 @@ def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, dist
                                       main_harmonic_option = 'lowest_freq', 
                                       TotalInducedVoltage = None,
                                       n_iterations_input = 1,
-                                      plot_option = False, seed=None):
+                                      plot_option = False, seed=None,
+                                      n_processes=None):
     '''
     *Function to generate a multi-bunch beam using the matched_from_distribution_density
     function for each bunch. The extra parameters to include are the number of 
@@ -35,17 +38,26 @@ def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, dist
     of the matched_from_distribution_density function. It can be inputed as
     a dictionary just like the matched_from_distribution_density function (assuming
     the same parameters for all bunches), or as a list of length n_bunches
-    to have different parameters for each bunch.*
+    to have different parameters for each bunch.
+    Without TotalInducedVoltage, the bunches are independent and are
+    generated by n_processes processes if n_processes > 1. Each bunch has
+    its own seed derived from seed, see bunch_seeds().*
     '''  
 
     
+    # Total number of macroparticles, also for a split beam
+    if beam.is_splitted:
+        n_macroparticles = beam.n_total_macroparticles
+    else:
+        n_macroparticles = beam.n_macroparticles
+
     if intensity_list is None:
         intensity_per_bunch = beam.intensity/n_bunches * np.ones(n_bunches)
-        n_macroparticles_per_bunch = beam.n_macroparticles/n_bunches * np.ones(n_bunches)
+        n_macroparticles_per_bunch = n_macroparticles/n_bunches * np.ones(n_bunches)
     else:
         intensity_per_bunch = np.array(intensity_list)
         if minimum_n_macroparticles is None:
-            n_macroparticles_per_bunch = np.round(beam.n_macroparticles/beam.intensity * intensity_per_bunch)
+            n_macroparticles_per_bunch = np.round(n_macroparticles/beam.intensity * intensity_per_bunch)
         else:
             n_macroparticles_per_bunch = np.round(minimum_n_macroparticles/np.min(intensity_per_bunch) * intensity_per_bunch)
     
@@ -54,7 +66,12 @@ def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, dist
         beam.intensity = np.sum(intensity_per_bunch)
     
     
-    if np.sum(n_macroparticles_per_bunch) != beam.n_macroparticles:
+    if np.sum(n_macroparticles_per_bunch) != n_macroparticles:
+        if beam.is_splitted:
+            #DistributionError
+            raise RuntimeError('ERROR: The number of macroparticles per ' +
+                               'bunch does not match the total number of ' +
+                               'the split beam')
         print('WARNING !! The number of macroparticles per bunch does not match the total number of the beam, the beam.n_macroparticles will be overwritten')
         beam.n_macroparticles = int(np.sum(n_macroparticles_per_bunch))
 
@@ -88,76 +105,77 @@ def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, dist
         TotalInducedVoltageIteration.profile.Beam = beamIteration
         
     
+    seeds = bunch_seeds(seed, n_bunches)
+    if isinstance(distribution_options_list, list):
+        distribution_options_list = [distribution_options_list[indexBunch]
+                                     for indexBunch in range(n_bunches)]
+    elif isinstance(distribution_options_list, dict):
+        distribution_options_list = [distribution_options_list] * n_bunches
+    else:
+        #DistributionError
+        raise RuntimeError('The input distribution_options_list option of the matched_from_distribution_density_multibunch \
+        function should either be a dictionary as requested by the matched_from_distribution_density \
+        function, or a list of dictionaries containing n_bunches elements')
+
+    if TotalInducedVoltage is None:
+        # Independent bunches, placed directly in the beam arrays. A split
+        # beam holds only the particles of this worker
+        bunch_starts = np.append([0], np.cumsum(n_macroparticles_per_bunch))
+        if beam.is_splitted:
+            first = first_particle(beam)
+            n_local = beam.n_macroparticles
+        else:
+            first = 0
+            n_local = int(bunch_starts[-1])
+            if len(beam.dt) != n_local:
+                beam.dt = np.zeros(n_local, dtype=bm.precision.real_t)
+                beam.dE = np.zeros(n_local, dtype=bm.precision.real_t)
+        arguments = (Ring, FullRingAndRF, main_harmonic_option,
+                     n_iterations_input)
+        local_bunches = []
+        tasks = []
+        for indexBunch in range(n_bunches):
+            start = max(first, int(bunch_starts[indexBunch]))
+            stop = min(first + n_local, int(bunch_starts[indexBunch+1]))
+            if stop <= start:
+                continue
+            particle_range = None
+            if beam.is_splitted:
+                particle_range = (start - int(bunch_starts[indexBunch]),
+                                  stop - int(bunch_starts[indexBunch]))
+            local_bunches.append((indexBunch, start, stop))
+            tasks.append((int(n_macroparticles_per_bunch[indexBunch]),
+                          intensity_per_bunch[indexBunch],
+                          distribution_options_list[indexBunch],
+                          seeds[indexBunch], particle_range))
+        for (indexBunch, start, stop), (dt, dE) in zip(local_bunches, map_bunches(
+                _matched_bunch_task, tasks, arguments, n_processes)):
+            beam.dt[start-first:stop-first] = dt + \
+                indexBunch * bunch_spacing_buckets * bucket_size_tau
+            beam.dE[start-first:stop-first] = dE
+        gc.collect()
+        return
+
+    if beam.is_splitted:
+        #DistributionError
+        raise RuntimeError('ERROR: A split beam can only be generated ' +
+                           'without TotalInducedVoltage')
+
     for indexBunch in range(0, n_bunches):
         
         print('Generating bunch no %d' %(indexBunch+1))
         
         bunch = Beam(Ring, int(n_macroparticles_per_bunch[indexBunch]), intensity_per_bunch[indexBunch])
         
-        if isinstance(distribution_options_list, list):
-            distribution_options = distribution_options_list[indexBunch]
-        elif isinstance(distribution_options_list, dict):
-            distribution_options = distribution_options_list
-        else:
-            #DistributionError
-            raise RuntimeError('The input distribution_options_list option of the matched_from_distribution_density_multibunch \
-            function should either be a dictionary as requested by the matched_from_distribution_density \
-            function, or a list of dictionaries containing n_bunches elements')
-        
-        if 'type' in distribution_options:
-            distribution_type = distribution_options['type']
-        else:
-            distribution_type = None
-        
-        if 'exponent' in distribution_options:
-            distribution_exponent = distribution_options['exponent']
-        else:
-            distribution_exponent = None
-        
-        if 'emittance' in distribution_options:
-            emittance = distribution_options['emittance']
-        else:
-            emittance = None
-        
-        if 'bunch_length' in distribution_options:
-            bunch_length = distribution_options['bunch_length']
-        else:
-            bunch_length = None
-        
-        if 'bunch_length_fit' in distribution_options:
-            bunch_length_fit = distribution_options['bunch_length_fit']
-        else:
-            bunch_length_fit = None
-        
-        if 'density_variable' in distribution_options:
-            distribution_variable = distribution_options['density_variable']
-        else:
-            distribution_variable = None            
-        
-        if distribution_options['type'] is 'user_input':
-            distribution_function_input = distribution_options['function']
-        else:
-            distribution_function_input = None
-        
-        if distribution_options['type'] is 'user_input_table':
-            distribution_user_table = {
-              'user_table_action': distribution_options['user_table_action'],
-              'user_table_density': distribution_options['user_table_density']}
-        else:
-            distribution_user_table = None
+        distribution_kwargs = _distribution_kwargs(
+            distribution_options_list[indexBunch])
             
         matched_from_distribution_function(bunch, FullRingAndRF,
-                       distribution_function_input=distribution_function_input,
-                       distribution_user_table=distribution_user_table,
                        main_harmonic_option=main_harmonic_option,
                        TotalInducedVoltage=TotalInducedVoltage,
                        n_iterations=n_iterations_input,
                        extraVoltageDict=extraVoltageDict,
-                       distribution_exponent=distribution_exponent,
-                       distribution_type=distribution_type,
-                       emittance=emittance, bunch_length=bunch_length,
-                       bunch_length_fit=bunch_length_fit,
-                       distribution_variable=distribution_variable, seed=seed)
+                       seed=seeds[indexBunch], **distribution_kwargs)
 
         if indexBunch==0:
             beamIteration.dt = bunch.dt
@@ -380,11 +398,16 @@ def match_beam_from_distribution(beam, FullRingAndRF, GeneralParameters,
                                   main_harmonic_option='lowest_freq',
                                   TotalInducedVoltage=None, n_iterations=1,
                                   n_points_potential=1e4,
-                                  dt_margin_percent=0.40, seed=None,):
+                                  dt_margin_percent=0.40, seed=None,
+                                  n_processes=None):
     '''
     *This function generates n equaly spaced bunches for a stationary 
     distribution and try to match them with intensity effects.*
     
+    *The bunches are matched by n_processes processes if n_processes > 1,
+    each bunch with its own seed derived from seed, see bunch_seeds().
+    They are written in place in beam.dt and beam.dE.*
+    
     *The corresponding distributions are specified by their exponent:*
     
     .. math::
@@ -426,7 +449,10 @@ def match_beam_from_distribution(beam, FullRingAndRF, GeneralParameters,
     normalization_potential = np.sign(eta_0)*charge/t_rev
     
     intensity_per_bunch = beam.intensity/n_bunches
-    n_macro_per_bunch = int(beam.n_macroparticles/n_bunches)
+    if beam.is_splitted:
+        n_macro_per_bunch = int(beam.n_total_macroparticles/n_bunches)
+    else:
+        n_macro_per_bunch = int(beam.n_macroparticles/n_bunches)
     bucket_size_tau = 2*np.pi/(np.min(omega_rf))
 
 #------------------------------------------------------------------------
@@ -447,19 +473,54 @@ def match_beam_from_distribution(beam, FullRingAndRF, GeneralParameters,
     # shifted to plug into the real beam.
     temporary_beam = Beam(GeneralParameters, n_macro_per_bunch, intensity_per_bunch)
 
-    # Bunches placed in all the buckets without intensity effects
-    # Loop the match function to have "different" bunches in each bucket
+    # Particles of each bunch in the beam arrays. A split beam holds only
+    # the particles of this worker, and only its bunches are matched
+    if beam.is_splitted:
+        first = first_particle(beam)
+        n_local = beam.n_macroparticles
+    else:
+        first = 0
+        n_local = n_bunches * n_macro_per_bunch
+        if len(beam.dt) != n_local:
+            beam.dt = np.zeros(n_local, dtype=bm.precision.real_t)
+            beam.dE = np.zeros(n_local, dtype=bm.precision.real_t)
+    local_bunches = []
     for indexBunch in range(n_bunches):
-        match_a_bunch(normalization_DeltaE, temporary_beam,
-                      potential_well_coordinates,
-                      potential_well, seed, distribution_options,
-                      full_ring_and_RF=FullRingAndRF)
-        if indexBunch==0:
-            beam.dt = temporary_beam.dt.astype(dtype=bm.precision.real_t, order='C', copy=False)
-            beam.dE = temporary_beam.dE.astype(dtype=bm.precision.real_t, order='C', copy=False)
-        else:
-            beam.dt = np.append(beam.dt, temporary_beam.dt +(indexBunch *bunch_spacing_buckets *bucket_size_tau))
-            beam.dE = np.append(beam.dE, temporary_beam.dE)
+        start = max(first, indexBunch*n_macro_per_bunch)
+        stop = min(first + n_local, (indexBunch+1)*n_macro_per_bunch)
+        if stop > start:
+            local_bunches.append((indexBunch, start, stop))
+
+    def bunch_tasks(potential_wells):
+        # One task per local bunch, with the part of the bunch to generate
+        # for a split beam
+        tasks = []
+        for indexBunch, start, stop in local_bunches:
+            particle_range = None
+            if beam.is_splitted:
+                particle_range = (start - indexBunch*n_macro_per_bunch,
+                                  stop - indexBunch*n_macro_per_bunch)
+            tasks.append((potential_wells[indexBunch], seeds[indexBunch],
+                          particle_range))
+        return tasks
+
+    def track_profile():
+        profile.track()
+        if beam.is_splitted:
+            profile.reduce_histo()
+
+    # Bunches placed in all the buckets without intensity effects
+    # Each bunch has its own seed to have "different" bunches in each bucket
+    seeds = bunch_seeds(seed, n_bunches)
+    arguments = (normalization_DeltaE, temporary_beam,
+                 potential_well_coordinates, distribution_options,
+                 FullRingAndRF)
+    tasks = bunch_tasks([potential_well] * n_bunches)
+    for (indexBunch, start, stop), (dt, dE) in zip(local_bunches, map_bunches(
+            _match_a_bunch_task, tasks, arguments, n_processes)):
+        beam.dt[start-first:stop-first] = \
+            dt + (indexBunch *bunch_spacing_buckets *bucket_size_tau)
+        beam.dE[start-first:stop-first] = dE
     gc.collect()    
     print(str(n_bunches)+' stationary bunches without intensity generated')
 #------------------------------------------------------------------------
@@ -470,41 +531,36 @@ def match_beam_from_distribution(beam, FullRingAndRF, GeneralParameters,
         for it in range(n_iterations):
             conv = 0.
             # Compute the induced voltage/potential for all the beam
-            profile.track()
+            track_profile()
             TotalInducedVoltage.induced_voltage_sum()
             
             induced_voltage_coordinates = TotalInducedVoltage.time_array
             induced_voltage = TotalInducedVoltage.induced_voltage
             induced_potential = - normalization_potential * cumtrapz(induced_voltage, dx=induced_voltage_coordinates[1] - induced_voltage_coordinates[0], initial=0)
 
-            for indexBunch in range(n_bunches):
+            # Recompute the phase space distribution of each bunch for the
+            # new perturbed potential (containing induced_potential_bunch)
+            potential_wells = {}
+            for indexBunch, start, stop in local_bunches:
                 # Extract the induced potential for the specific bucket
                 induced_potential_bunch = np.interp(potential_well_coordinates\
                 + indexBunch*bunch_spacing_buckets*bucket_size_tau,\
                 induced_voltage_coordinates, induced_potential)
+                potential_wells[indexBunch] = \
+                    potential_well+induced_potential_bunch
 
-                # Recompute the phase space distribution for the new
-                # perturbed potential (containing induced_potential_bunch)
-                match_a_bunch(normalization_DeltaE, temporary_beam,
-                              potential_well_coordinates,
-                              potential_well+induced_potential_bunch, seed,
-                              distribution_options,
-                              full_ring_and_RF=FullRingAndRF)
-
-                dt = temporary_beam.dt
-                dE = temporary_beam.dE
-                
+            tasks = bunch_tasks(potential_wells)
+            for (indexBunch, start, stop), (dt, dE) in zip(local_bunches, map_bunches(
+                    _match_a_bunch_task, tasks, arguments, n_processes)):
                 # Compute RMS emittance to observe convergence
                 conv += np.pi*np.std(dt)*np.std(dE)
                 
-                length_dt = len(dt)
-                length_dE = len(dE)
-                beam.dt[indexBunch*length_dt:(indexBunch+1)*length_dt] = dt+(indexBunch *bunch_spacing_buckets *bucket_size_tau)
-                beam.dE[indexBunch*length_dE:(indexBunch+1)*length_dE] = dE
+                beam.dt[start-first:stop-first] = dt+(indexBunch *bunch_spacing_buckets *bucket_size_tau)
+                beam.dE[start-first:stop-first] = dE
 
  
             print('iteration ' + str(it) + ', average RMS emittance (4sigma) = ' + str(4*conv/n_bunches))
-            profile.track()
+            track_profile()
             TotalInducedVoltage.induced_voltage_sum()
 
 
@@ -515,13 +571,17 @@ def match_beam_from_distribution_multibatch(beam, FullRingAndRF, GeneralParamete
                                   main_harmonic_option='lowest_freq',
                                   TotalInducedVoltage=None, n_iterations=1,
                                   n_points_potential=1e4,
-                                  dt_margin_percent=0.40, seed=None):
+                                  dt_margin_percent=0.40, seed=None,
+                                  n_processes=None):
     '''
     *This function generates n equaly spaced bunches for a stationary 
     distribution and try to match them with intensity effects.*
     
     *Then it copies the batch n_batch times with spacing batch_spacing_buckets*
     
+    *The bunches are matched by n_processes processes if n_processes > 1,
+    see match_beam_from_distribution().*
+    
     *The corresponding distributions are specified by their exponent:*
     
     .. math::
@@ -571,6 +631,11 @@ def match_beam_from_distribution_multibatch(beam, FullRingAndRF, GeneralParamete
 #    normalization_DeltaE = np.abs(eta_0) / (2.*beta**2*E)
 #    normalization_potential = np.sign(eta_0)*charge/t_rev
     
+    if beam.is_splitted:
+        #DistributionError
+        raise RuntimeError('ERROR: A split beam cannot be generated by ' +
+                           'match_beam_from_distribution_multibatch')
+
     intensity_per_bunch = beam.intensity/n_bunches/n_batch
     n_macro_per_bunch = int(beam.n_macroparticles/n_bunches/n_batch)
     bucket_size_tau = 2*np.pi/(np.min(omega_rf))
@@ -581,7 +646,8 @@ def match_beam_from_distribution_multibatch(beam, FullRingAndRF, GeneralParamete
     match_beam_from_distribution(temporary_batch, FullRingAndRF, GeneralParameters,
                                   distribution_options, n_bunches,bunch_spacing_buckets,
                                   TotalInducedVoltage=None, n_iterations=n_iterations,
-                                  n_points_potential=n_points_potential)
+                                  n_points_potential=n_points_potential,
+                                  seed=seed, n_processes=n_processes)
                                   
 #    matched_from_distribution_density_multibunch(temporary_batch, GeneralParameters, FullRingAndRF, distribution_options,
 #                                          n_bunches, bunch_spacing_buckets,
@@ -643,6 +709,11 @@ def match_beam_from_distribution_multibatch(beam, FullRingAndRF, GeneralParamete
             potential_well = potential_well - np.min(potential_well)   
             
             temporary_beam = Beam(GeneralParameters, n_macro_per_bunch, intensity_per_bunch)
+            arguments = (normalization_DeltaE, temporary_beam,
+                         potential_well_coordinates, distribution_options,
+                         FullRingAndRF)
+            seeds = bunch_seeds(seed, n_batch*n_bunches)
+            tasks = []
             for indexBatch in range(n_batch):
                 for indexBunch in range(n_bunches):
                     # Extract the induced potential for the specific bucket
@@ -650,25 +721,23 @@ def match_beam_from_distribution_multibatch(beam, FullRingAndRF, GeneralParamete
                     + indexBunch*bunch_spacing_buckets*bucket_size_tau\
                     + indexBatch*(batch_spacing_buckets + (n_bunches-1)*bunch_spacing_buckets)*bucket_size_tau,\
                     induced_voltage_coordinates, induced_potential)
-    
-                    # Recompute the phase space distribution for the new
-                    # perturbed potential (containing induced_potential_bunch)
-                    match_a_bunch(normalization_DeltaE, temporary_beam,
-                                  potential_well_coordinates,
-                                  potential_well+induced_potential_bunch, seed,
-                                  distribution_options,
-                                  full_ring_and_RF=FullRingAndRF)
-    
-                    dt = temporary_beam.dt
-                    dE = temporary_beam.dE
+                    tasks.append((potential_well+induced_potential_bunch,
+                                  seeds[indexBunch+n_bunches*indexBatch],
+                                  None))
+    
+            # Recompute the phase space distribution for the new
+            # perturbed potential (containing induced_potential_bunch)
+            for indexTask, (dt, dE) in enumerate(map_bunches(
+                    _match_a_bunch_task, tasks, arguments, n_processes)):
+                indexBatch, indexBunch = divmod(indexTask, n_bunches)
                     
-                    # Compute RMS emittance to observe convergence
-                    conv += np.pi*np.std(dt)*np.std(dE)
+                # Compute RMS emittance to observe convergence
+                conv += np.pi*np.std(dt)*np.std(dE)
                     
-                    length_dt = len(dt)
-                    length_dE = len(dE)
-                    beam.dt[(indexBunch+n_bunches*indexBatch)*length_dt:(indexBunch+n_bunches*indexBatch+1)*length_dt] = dt+(indexBunch *bunch_spacing_buckets *bucket_size_tau) + indexBatch*(batch_spacing_buckets + (n_bunches-1)*bunch_spacing_buckets)*bucket_size_tau
-                    beam.dE[(indexBunch+n_bunches*indexBatch)*length_dE:(indexBunch+n_bunches*indexBatch+1)*length_dE] = dE
+                length_dt = len(dt)
+                length_dE = len(dE)
+                beam.dt[(indexBunch+n_bunches*indexBatch)*length_dt:(indexBunch+n_bunches*indexBatch+1)*length_dt] = dt+(indexBunch *bunch_spacing_buckets *bucket_size_tau) + indexBatch*(batch_spacing_buckets + (n_bunches-1)*bunch_spacing_buckets)*bucket_size_tau
+                beam.dE[(indexBunch+n_bunches*indexBatch)*length_dE:(indexBunch+n_bunches*indexBatch+1)*length_dE] = dE
 
  
             print('iteration ' + str(it) + ', average RMS emittance (4sigma) = ' + str(4*conv/n_bunches))
@@ -781,3 +850,132 @@ def match_a_bunch(normalization_DeltaE, beam, potential_well_coordinates,\
     populate_bunch(beam, time_grid, deltaE_grid, distribution, time_resolution,
                    energy_resolution, seed)
 
+
+
+def bunch_seeds(seed, n_bunches):
+    '''
+    *Seeds of the random generator for each bunch. They only depend on seed,
+    so that the bunches do not depend on the order or on the process in
+    which they are generated. With seed None, the bunches are not
+    reproducible.*
+    '''
+
+    if seed is None:
+        return [None] * n_bunches
+    return [int(bunch_seed) for bunch_seed in
+            np.random.SeedSequence(seed).generate_state(n_bunches)]
+
+
+# Arguments common to all the bunches of a map_bunches() call
+_bunch_arguments = None
+
+
+def _set_bunch_arguments(arguments):
+
+    global _bunch_arguments
+    _bunch_arguments = arguments
+
+
+def map_bunches(task_function, tasks, arguments, n_processes=None):
+    '''
+    *Generator returning task_function(task) for each task, in order.
+    The arguments common to all the tasks are sent once to each process.
+    With n_processes > 1, the tasks are run by a pool of n_processes
+    processes, otherwise in the calling process.*
+    '''
+
+    if n_processes is None or n_processes <= 1:
+        _set_bunch_arguments(arguments)
+        try:
+            for task in tasks:
+                yield task_function(task)
+        finally:
+            _set_bunch_arguments(None)
+    else:
+        with multiprocessing.Pool(n_processes,
+                                  initializer=_set_bunch_arguments,
+                                  initargs=(arguments,)) as pool:
+            for result in pool.imap(task_function, tasks):
+                yield result
+
+
+def _interned(value):
+
+    # The options are compared with 'is', which fails for strings copied
+    # to another process
+    if isinstance(value, str):
+        return sys.intern(value)
+    elif isinstance(value, dict):
+        return {key: _interned(item) for key, item in value.items()}
+    return value
+
+
+def _distribution_kwargs(distribution_options):
+
+    distribution_kwargs = {}
+    for option, keyword in [('type', 'distribution_type'),
+                            ('exponent', 'distribution_exponent'),
+                            ('emittance', 'emittance'),
+                            ('bunch_length', 'bunch_length'),
+                            ('bunch_length_fit', 'bunch_length_fit'),
+                            ('density_variable', 'distribution_variable')]:
+        distribution_kwargs[keyword] = distribution_options.get(option)
+
+    if distribution_options['type'] is 'user_input':
+        distribution_kwargs['distribution_function_input'] = \
+            distribution_options['function']
+
+    if distribution_options['type'] is 'user_input_table':
+        distribution_kwargs['distribution_user_table'] = {
+            'user_table_action': distribution_options['user_table_action'],
+            'user_table_density': distribution_options['user_table_density']}
+
+    return distribution_kwargs
+
+
+def _bunch_part(bunch, particle_range):
+
+    # Copy of a bunch holding only its particles start to stop-1, as a
+    # split beam
+    start, stop = particle_range
+    bunch = copy.copy(bunch)
+    bunch.id = np.arange(start + 1, stop + 1, dtype=int)
+    bunch.dt = np.zeros(stop - start, dtype=bm.precision.real_t)
+    bunch.dE = np.zeros(stop - start, dtype=bm.precision.real_t)
+    bunch.n_macroparticles = stop - start
+    bunch.is_splitted = True
+    return bunch
+
+
+def _matched_bunch_task(task):
+
+    n_macroparticles, intensity, distribution_options, seed, particle_range = \
+        task
+    Ring, FullRingAndRF, main_harmonic_option, n_iterations = \
+        _bunch_arguments
+
+    bunch = Beam(Ring, n_macroparticles, intensity)
+    if particle_range is not None:
+        bunch = _bunch_part(bunch, particle_range)
+    matched_from_distribution_function(bunch, FullRingAndRF,
+                                       main_harmonic_option=_interned(
+                                           main_harmonic_option),
+                                       n_iterations=n_iterations, seed=seed,
+                                       **_distribution_kwargs(
+                                           _interned(distribution_options)))
+    return bunch.dt, bunch.dE
+
+
+def _match_a_bunch_task(task):
+
+    potential_well, seed, particle_range = task
+    (normalization_DeltaE, beam, potential_well_coordinates,
+     distribution_options, full_ring_and_RF) = _bunch_arguments
+
+    if particle_range is not None:
+        beam = _bunch_part(beam, particle_range)
+
+    match_a_bunch(normalization_DeltaE, beam, potential_well_coordinates,
+                  potential_well, seed, _interned(distribution_options),
+                  full_ring_and_RF=full_ring_and_RF)
+    return beam.dt, beam.dE
@@ -469,10 +469,18 @@ class Profile(object):
             delattr(Profile, "dev_beam_spectrum_freq") 
 
     def set_slices_parameters(self):
+        n_slices_old = getattr(self, 'n_slices', 0)
         self.n_slices, self.cut_left, self.cut_right, self.n_sigma, \
             self.edges, self.bin_centers, self.bin_size = \
             self.cut_options.get_slices_parameters()
 
+        # Reserve the scratch buffers of the histogram and of the
+        # interpolated kick for the new number of slices
+        if (self.n_slices != n_slices_old) and (not bm.gpuMode()):
+            bm.workspace_resize(n_slices_old, self.n_slices)
+            bm.workspace_resize(2*(n_slices_old-1), 2*(self.n_slices-1),
+                                threads=1)
+
     def track(self):
         """
         Track method in order to update the slicing along with the tracker.
@@ -501,6 +509,10 @@ class Profile(object):
         if self.Beam.is_splitted:
             worker.sync()
 
+            if worker.compact_histo:
+                worker.allreduce_histo(self.n_macroparticles)
+                return
+
             with timing.timed_region('serial:conversion'):
                 # with mpiprof.traced_region('serial:conversion'):
                 self.n_macroparticles = self.n_macroparticles.astype(
@@ -513,6 +525,53 @@ class Profile(object):
                 self.n_macroparticles = self.n_macroparticles.astype(dtype=bm.precision.real_t, order='C', copy=False)
 
 
+    def reduce_histo_start(self, dtype=np.uint32):
+        """
+        Non-blocking version of reduce_histo(), without the barrier. The
+        histogram is reduced in the background while the caller does work
+        that does not depend on it (e.g. the RF voltage calculation);
+        reduce_histo_wait() must be called before n_macroparticles is used.
+        With the compact histogram encoding, the reduction is done on the
+        spot.
+        """
+        if not bm.mpiMode():
+            raise RuntimeError(
+                'ERROR: Cannot use this routine unless in MPI Mode')
+
+        from ..utils.mpi_config import worker
+        if self.Beam.is_splitted:
+            if worker.compact_histo:
+                worker.allreduce_histo(self.n_macroparticles)
+                return
+
+            with timing.timed_region('serial:conversion'):
+                if (getattr(self, '_histo_buffer', None) is None) or \
+                        (len(self._histo_buffer) != len(self.n_macroparticles)) or \
+                        (self._histo_buffer.dtype != dtype):
+                    self._histo_buffer = np.empty(len(self.n_macroparticles),
+                                                  dtype=dtype)
+                np.copyto(self._histo_buffer, self.n_macroparticles,
+                          casting='unsafe')
+
+            self._histo_request = worker.iallreduce(self._histo_buffer,
+                                                    operator='custom_sum')
+
+    @timing.timeit(key='comm:reduce_histo_wait')
+    def reduce_histo_wait(self):
+        """
+        Completes the reduction started by reduce_histo_start(); does
+        nothing if no reduction is in flight.
+        """
+        request = getattr(self, '_histo_request', None)
+        if request is None:
+            return
+        request.Wait()
+        self._histo_request = None
+
+        with timing.timed_region('serial:conversion'):
+            np.copyto(self.n_macroparticles, self._histo_buffer,
+                      casting='unsafe')
+
     @timing.timeit(key='serial:scale_histo')
     # @mpiprof.traceit(key='serial:scale_histo')
     def scale_histo(self):
@@ -0,0 +1,161 @@
+/*
+Copyright 2016 CERN. This software is distributed under the
+terms of the GNU General Public Licence version 3 (GPL Version 3),
+copied verbatim in the file LICENCE.md.
+In applying this licence, CERN does not waive the privileges and immunities
+granted to it by virtue of its status as an Intergovernmental Organization or
+submit itself to any jurisdiction.
+Project website: http://blond.web.cern.ch/
+*/
+
+// Histogram and interpolated kick of a beam sliced in windows of n_slices
+// bins, placed on a common grid of bins of bin_size starting at cut_left.
+// Window w covers the bins [window_offsets[w], window_offsets[w] + n_slices)
+// of the grid; the offsets are sorted and the windows do not overlap.
+// Author: Konstantinos Iliakis
+
+#include <string.h>
+#include <math.h>
+#include <algorithm>
+#include "../cpp_routines/common.h"
+#include "../cpp_routines/workspace.h"
+
+
+// Index of the bin of the windows containing the grid bin, -1 if none
+static inline int sparse_bin(const int bin, const int * __restrict__ window_offsets,
+                             const int n_windows, const int n_slices)
+{
+    const int w = (int) (std::upper_bound(window_offsets, window_offsets + n_windows, bin)
+                         - window_offsets) - 1;
+    if (w < 0 || bin - window_offsets[w] >= n_slices) return -1;
+    return w * n_slices + bin - window_offsets[w];
+}
+
+
+template <typename T>
+static void sparse_profile_histogram_t(const T * __restrict__ input,
+                                       T * __restrict__ output,
+                                       const T cut_left, const T bin_size,
+                                       const int * __restrict__ window_offsets,
+                                       const int n_windows, const int n_slices,
+                                       const int n_macroparticles)
+{
+    const int n_bins = n_windows * n_slices;
+    const T inv_bin_width = 1 / bin_size;
+    const int grid_bins = window_offsets[n_windows - 1] + n_slices;
+
+    // thread_private histograms, taken from the workspace pool
+    const int max_threads = omp_get_max_threads();
+    T *histo_buffer = (T *) workspace_acquire(max_threads * n_bins * sizeof(T));
+
+    #pragma omp parallel
+    {
+        const int id = omp_get_thread_num();
+        const int threads = omp_get_num_threads();
+        T *histo = histo_buffer + (size_t) n_bins * id;
+        memset(histo, 0, n_bins * sizeof(T));
+
+        #pragma omp for
+        for (int i = 0; i < n_macroparticles; i++) {
+            const T fbin = floor((input[i] - cut_left) * inv_bin_width);
+            if (fbin < 0 || fbin >= grid_bins) continue;
+            const int bin = sparse_bin((int) fbin, window_offsets, n_windows, n_slices);
+            if (bin >= 0) histo[bin] += 1;
+        }
+
+        // Reduce to a single histogram
+        #pragma omp for
+        for (int i = 0; i < n_bins; i++) {
+            output[i] = 0;
+            for (int t = 0; t < threads; t++)
+                output[i] += histo_buffer[(size_t) n_bins * t + i];
+        }
+    }
+
+    workspace_return(histo_buffer);
+}
+
+
+// The voltage is interpolated linearly between the bin centres of a window;
+// particles outside the windows, or beyond the last bin centre of their
+// window, are not kicked (as in linear_interp_kick)
+template <typename T>
+static void sparse_linear_interp_kick_t(const T * __restrict__ beam_dt,
+                                        T * __restrict__ beam_dE,
+                                        const T * __restrict__ voltage_array,
+                                        const T cut_left, const T bin_size,
+                                        const int * __restrict__ window_offsets,
+                                        const int n_windows, const int n_slices,
+                                        const T charge,
+                                        const int n_macroparticles,
+                                        const T acc_kick)
+{
+    const T inv_bin_width = 1 / bin_size;
+    const T first_center = cut_left + bin_size / 2;
+    const int grid_bins = window_offsets[n_windows - 1] + n_slices;
+
+    #pragma omp parallel for
+    for (int i = 0; i < n_macroparticles; i++) {
+        const T x = (beam_dt[i] - first_center) * inv_bin_width;
+        const T fbin = floor(x);
+        if (fbin < 0 || fbin >= grid_bins) continue;
+        const int w = (int) (std::upper_bound(window_offsets, window_offsets + n_windows,
+                                              (int) fbin) - window_offsets) - 1;
+        if (w < 0) continue;
+        const int bin = (int) fbin - window_offsets[w];
+        if (bin >= n_slices - 1) continue;
+        const T *voltage = voltage_array + (size_t) w * n_slices + bin;
+        beam_dE[i] += charge * (voltage[0] + (voltage[1] - voltage[0]) * (x - fbin))
+                      + acc_kick;
+    }
+}
+
+
+extern "C" void sparse_profile_histogram(const double * __restrict__ input,
+        double * __restrict__ output, const double cut_left, const double bin_size,
+        const int * __restrict__ window_offsets, const int n_windows,
+        const int n_slices, const int n_macroparticles)
+{
+    sparse_profile_histogram_t<double>(input, output, cut_left, bin_size,
+                                       window_offsets, n_windows, n_slices,
+                                       n_macroparticles);
+}
+
+
+extern "C" void sparse_profile_histogramf(const float * __restrict__ input,
+        float * __restrict__ output, const float cut_left, const float bin_size,
+        const int * __restrict__ window_offsets, const int n_windows,
+        const int n_slices, const int n_macroparticles)
+{
+    sparse_profile_histogram_t<float>(input, output, cut_left, bin_size,
+                                      window_offsets, n_windows, n_slices,
+                                      n_macroparticles);
+}
+
+
+extern "C" void sparse_linear_interp_kick(const double * __restrict__ beam_dt,
+        double * __restrict__ beam_dE, const double * __restrict__ voltage_array,
+        const double cut_left, const double bin_size,
+        const int * __restrict__ window_offsets, const int n_windows,
+        const int n_slices, const double charge, const int n_macroparticles,
+        const double acc_kick)
+{
+    sparse_linear_interp_kick_t<double>(beam_dt, beam_dE, voltage_array,
+                                        cut_left, bin_size, window_offsets,
+                                        n_windows, n_slices, charge,
+                                        n_macroparticles, acc_kick);
+}
+
+
+extern "C" void sparse_linear_interp_kickf(const float * __restrict__ beam_dt,
+        float * __restrict__ beam_dE, const float * __restrict__ voltage_array,
+        const float cut_left, const float bin_size,
+        const int * __restrict__ window_offsets, const int n_windows,
+        const int n_slices, const float charge, const int n_macroparticles,
+        const float acc_kick)
+{
+    sparse_linear_interp_kick_t<float>(beam_dt, beam_dE, voltage_array,
+                                       cut_left, bin_size, window_offsets,
+                                       n_windows, n_slices, charge,
+                                       n_macroparticles, acc_kick);
+}
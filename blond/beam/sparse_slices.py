@@ -23,6 +23,11 @@ from .. import libblond
 from ..utils import bmath as bm
 from ..beam.profile import Profile, CutOptions
 
+try:
+    from pyprof import timing
+except ImportError:
+    from ..utils import profile_mock as timing
+
 
 
 class SparseSlices(object):
@@ -128,3 +133,152 @@ class SparseSlices(object):
         
         for i in range(self.n_filled_buckets):
             self.slices_array[i].track()
+
+
+class SparseProfile(object):
+    '''
+    *Profile of a beam made of bunches separated by large empty gaps. Only
+    the windows around the bunches are sliced: all windows have the same
+    length and number of slices, and lie on a common grid of bins starting at
+    the first window, so that the windows are the non-empty parts of an
+    equivalent dense Profile from the first to the last window.*
+
+    *The profile of all windows is stored window after window in
+    n_macroparticles (and bin_centers), which can be used as the ones of
+    Profile, e.g. in RingAndRFTracker and TotalInducedVoltage
+    (with InducedVoltageSparse for the impedances).*
+
+    Parameters
+    ----------
+    Beam : object
+        Beam object
+    window_starts : float array
+        Left edges of the windows [s], in increasing order; they are rounded
+        to the grid of bins of the first window
+    window_length : float
+        Length of every window [s]
+    window_slices : int
+        Number of slices per window
+    direct_slicing : bool
+        Slice the beam at initialisation; default is False
+
+    Attributes
+    ----------
+    n_windows : int
+        Number of windows
+    n_slices : int
+        Total number of slices, n_windows * window_slices
+    bin_size : float
+        Length of a slice [s]
+    window_offsets : int array
+        Index of the first bin of every window in the grid of bins starting
+        at cut_left
+    cut_left_array, cut_right_array : float array
+        Edges of every window [s]
+    n_macroparticles_array : float array
+        Profile of every window, of shape [n_windows, window_slices]
+    bin_centers_array : float array
+        Bin centres of every window, of shape [n_windows, window_slices]
+    '''
+
+    def __init__(self, Beam, window_starts, window_length, window_slices,
+                 direct_slicing=False):
+
+        #: *Import (reference) Beam*
+        self.Beam = Beam
+
+        self.window_slices = int(window_slices)
+        self.bin_size = window_length / self.window_slices
+
+        window_starts = np.array(window_starts, dtype=float, ndmin=1)
+        self.cut_left = window_starts[0]
+        self.window_offsets = np.rint((window_starts - self.cut_left) /
+                                      self.bin_size).astype(np.int32)
+        if np.any(np.diff(self.window_offsets) < self.window_slices):
+            # WindowError
+            raise RuntimeError("ERROR in SparseProfile: the windows should " +
+                               "be in increasing order and not overlap")
+
+        self.n_windows = len(self.window_offsets)
+        self.n_slices = self.n_windows * self.window_slices
+
+        self.cut_left_array = self.cut_left + \
+            self.window_offsets * self.bin_size
+        self.cut_right_array = self.cut_left_array + \
+            self.window_slices * self.bin_size
+        self.cut_right = self.cut_right_array[-1]
+
+        self.bin_centers_array = np.ascontiguousarray(
+            self.cut_left_array[:, None] + self.bin_size *
+            (np.arange(self.window_slices) + 0.5),
+            dtype=bm.precision.real_t)
+        self.n_macroparticles_array = np.zeros(
+            (self.n_windows, self.window_slices), dtype=bm.precision.real_t)
+
+        # Flat views, window after window
+        self.bin_centers = self.bin_centers_array.reshape(-1)
+        self.n_macroparticles = self.n_macroparticles_array.reshape(-1)
+
+        self.beam_spectrum = np.array([], dtype=bm.precision.real_t)
+        self.operations = [self._slice_sparse]
+
+        if direct_slicing:
+            self.track()
+
+    def track(self):
+        '''
+        *Track method in order to update the slicing along with the tracker.*
+        '''
+
+        for op in self.operations:
+            op()
+
+    @timing.timeit(key='comp:histo')
+    def _slice_sparse(self):
+        '''
+        *Histogram of the windows, computed in a single pass over the
+        particles.*
+        '''
+
+        bm.sparse_profile_histogram(self.Beam.dt, self.n_macroparticles_array,
+                                    self.cut_left, self.bin_size,
+                                    self.window_offsets)
+
+    def reduce_histo(self, dtype=np.uint32):
+        '''
+        *Sums the profiles of the MPI workers, see Profile.reduce_histo.*
+        '''
+
+        if not bm.mpiMode():
+            raise RuntimeError(
+                'ERROR: Cannot use this routine unless in MPI Mode')
+
+        from ..utils.mpi_config import worker
+        if self.Beam.is_splitted:
+            worker.sync()
+            if worker.compact_histo:
+                worker.allreduce_histo(self.n_macroparticles)
+                return
+            histo = self.n_macroparticles.astype(np.uint32, order='C')
+            worker.allreduce(histo, dtype=np.uint32, operator='custom_sum')
+            self.n_macroparticles[:] = histo
+
+    def linear_interp_kick(self, dt, dE, voltage, charge, acceleration_kick):
+        '''
+        *Kick of the voltage given on the bins of the windows (e.g. the RF
+        and induced voltage), interpolated linearly inside every window.
+        Particles outside the windows are not kicked.*
+        '''
+
+        bm.sparse_linear_interp_kick(
+            dt, dE, voltage.reshape(self.n_windows, self.window_slices),
+            self.cut_left, self.bin_size, self.window_offsets, charge,
+            acceleration_kick)
+
+    def beam_spectrum_generation(self, n_sampling_fft):
+        '''
+        *Spectrum of every window, of shape [n_windows, n_sampling_fft//2+1].*
+        '''
+
+        self.beam_spectrum = np.fft.rfft(self.n_macroparticles_array,
+                                         n_sampling_fft, axis=1)
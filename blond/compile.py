@@ -39,8 +39,9 @@ parser.add_argument('-p', '--parallel',
                     ' Default: Serial code')
 
 parser.add_argument('-b', '--boost', type=str, nargs='?', const='',
-                    help='Use boost library to speedup synchrotron radiation'
-                    ' routines. If the installation path of boost differs'
+                    help='Add the boost library to the include path (the'
+                    ' synchrotron radiation routines no longer need it).'
+                    ' If the installation path of boost differs'
                     ' from the default, you have to pass it as an argument.'
                     ' Default: Boost will not be used')
 
@@ -89,15 +90,21 @@ cpp_files = [
     os.path.join(basepath, 'cpp_routines/drift.cpp'),
     os.path.join(basepath, 'cpp_routines/linear_interp_kick.cpp'),
     os.path.join(basepath, 'cpp_routines/histogram.cpp'),
+    os.path.join(basepath, 'cpp_routines/fused_tracking.cpp'),
     os.path.join(basepath, 'cpp_routines/music_track.cpp'),
     os.path.join(basepath, 'cpp_routines/blondmath.cpp'),
     os.path.join(basepath, 'cpp_routines/fast_resonator.cpp'),
     os.path.join(basepath, 'cpp_routines/beam_phase.cpp'),
     os.path.join(basepath, 'cpp_routines/fft.cpp'),
     os.path.join(basepath, 'cpp_routines/common.cpp'),
+    os.path.join(basepath, 'cpp_routines/workspace.cpp'),
+    os.path.join(basepath, 'cpp_routines/sort_particles.cpp'),
+    os.path.join(basepath, 'cpp_routines/random.cpp'),
+    os.path.join(basepath, 'cpp_routines/beam_statistics.cpp'),
     os.path.join(basepath, 'toolbox/tomoscope.cpp'),
     os.path.join(basepath, 'synchrotron_radiation/synchrotron_radiation.cpp'),
     os.path.join(basepath, 'beam/sparse_histogram.cpp'),
+    os.path.join(basepath, 'beam/sparse_profile.cpp'),
 ]
 
 nvccflags = ['nvcc', '--cubin', '-arch', 'sm_xx', '-O3', '--use_fast_math', '-maxrregcount', '32']
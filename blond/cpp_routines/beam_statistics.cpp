@@ -0,0 +1,261 @@
+/*
+Copyright 2016 CERN. This software is distributed under the
+terms of the GNU General Public Licence version 3 (GPL Version 3),
+copied verbatim in the file LICENCE.md.
+In applying this licence, CERN does not waive the privileges and immunities
+granted to it by virtue of its status as an Intergovernmental Organization or
+submit itself to any jurisdiction.
+Project website: http://blond.web.cern.ch/
+*/
+
+// Optimised C++ routines that calculate the statistics of the particles
+// that are not lost (id != 0), of the whole beam in a single pass over it
+// or of every bunch
+// Author: Konstantinos Iliakis
+
+#include <cfloat>
+#include <algorithm>
+#include "common.h"
+#include "workspace.h"
+#include "beam_statistics.h"
+
+// Number of particles of a block; its two passes run in cache
+#define STATS_BLOCK 512
+
+
+// Statistics of one coordinate over one block of particles: the mean comes
+// from the first pass and the squared deviations from the second, which
+// is exact; the blocks are then merged pairwise (Chan et al.)
+template <typename T>
+static void block_moments(const T *__restrict__ x,
+                          const long *__restrict__ id, const int n,
+                          const double count, moments_t &m)
+{
+    double sum = 0, x_min = DBL_MAX, x_max = -DBL_MAX;
+    for (int i = 0; i < n; i++) {
+        const double alive = id[i] != 0;
+        sum += alive * x[i];
+        x_min = std::min(x_min, id[i] != 0 ? (double) x[i] : DBL_MAX);
+        x_max = std::max(x_max, id[i] != 0 ? (double) x[i] : -DBL_MAX);
+    }
+    const double mean = sum / count;
+    double m2 = 0;
+    for (int i = 0; i < n; i++) {
+        const double d = (id[i] != 0) * (x[i] - mean);
+        m2 += d * d;
+    }
+    const moments_t block = {count, mean, m2, x_min, x_max};
+    moments_merge(m, block);
+}
+
+
+template <typename T>
+static void beam_statistics_kernel(const T *__restrict__ dt,
+                                   const T *__restrict__ dE,
+                                   const long *__restrict__ id,
+                                   const int n_macroparticles,
+                                   double *__restrict__ result)
+{
+    // Statistics of dt and dE of every thread, merged in the order of the
+    // threads so that the result does not depend on the scheduling
+    const int max_threads = omp_get_max_threads();
+    moments_t *moments = (moments_t *) workspace_acquire(
+                             2 * max_threads * sizeof(moments_t));
+    int threads = 1;
+
+    #pragma omp parallel
+    {
+        const int tid = omp_get_thread_num();
+        #pragma omp single
+        threads = omp_get_num_threads();
+        moments_t m_dt = MOMENTS_EMPTY, m_dE = MOMENTS_EMPTY;
+
+        #pragma omp for schedule(static)
+        for (int start = 0; start < n_macroparticles; start += STATS_BLOCK) {
+            const int len = std::min(STATS_BLOCK, n_macroparticles - start);
+            double count = 0;
+            for (int i = start; i < start + len; i++)
+                count += id[i] != 0;
+            if (count == 0) continue;
+            block_moments(dt + start, id + start, len, count, m_dt);
+            block_moments(dE + start, id + start, len, count, m_dE);
+        }
+        moments[2 * tid] = m_dt;
+        moments[2 * tid + 1] = m_dE;
+    }
+
+    moments_t m_dt = MOMENTS_EMPTY, m_dE = MOMENTS_EMPTY;
+    for (int t = 0; t < threads; t++) {
+        moments_merge(m_dt, moments[2 * t]);
+        moments_merge(m_dE, moments[2 * t + 1]);
+    }
+    workspace_return(moments);
+
+    result[0] = m_dt.n;
+    result[1] = n_macroparticles - m_dt.n;
+    moments_store(m_dt, result + 2);
+    moments_store(m_dE, result + 6);
+}
+
+
+// Bunch of a particle, -1 if its RF bucket is not the first of the
+// bunch_spacing_buckets buckets of a bunch; t is the time in bunch spacings
+// from the first bunch, which avoids integer divisions
+static inline int bunch_index(const double t, const int bunch_spacing_buckets,
+                              const int n_bunches)
+{
+    if (!(t >= 0 && t < n_bunches)) return -1;
+    const int bunch = (int) t;
+    return (t - bunch) * bunch_spacing_buckets < 1 ? bunch : -1;
+}
+
+
+// Statistics of every bunch in two passes over the beam, the particles of a
+// bunch being anywhere in it: the counts, sums, min and max, then the
+// squared deviations from the means. Every thread accumulates into its own
+// rows, laid out as the result, which are added in the order of the threads
+template <typename T>
+static void bunch_statistics_kernel(const T *__restrict__ dt,
+                                    const T *__restrict__ dE,
+                                    const long *__restrict__ id,
+                                    const int n_macroparticles,
+                                    const double t_offset,
+                                    const double bucket_length,
+                                    const int bunch_spacing_buckets,
+                                    const int n_bunches,
+                                    double *__restrict__ result)
+{
+    const int max_threads = omp_get_max_threads();
+    const int size = 10 * n_bunches;
+    double *acc = (double *) workspace_acquire(
+                      max_threads * size * sizeof(double));
+    const double inv_spacing = 1. / (bucket_length * bunch_spacing_buckets);
+    const double empty[10] = {0, 0, 0, 0, DBL_MAX, -DBL_MAX,
+                              0, 0, DBL_MAX, -DBL_MAX};
+    int threads = 1;
+
+    #pragma omp parallel
+    {
+        const int tid = omp_get_thread_num();
+        #pragma omp single
+        threads = omp_get_num_threads();
+        double *a = acc + tid * size;
+        for (int k = 0; k < size; k++)
+            a[k] = empty[k % 10];
+
+        #pragma omp for schedule(static)
+        for (int i = 0; i < n_macroparticles; i++) {
+            const int bunch = bunch_index((dt[i] - t_offset) * inv_spacing,
+                                          bunch_spacing_buckets, n_bunches);
+            if (bunch < 0) continue;
+            double *ab = a + 10 * bunch;
+            if (id[i] == 0) {
+                ab[1] += 1;
+                continue;
+            }
+            ab[0] += 1;
+            ab[2] += dt[i];
+            ab[4] = std::min(ab[4], (double) dt[i]);
+            ab[5] = std::max(ab[5], (double) dt[i]);
+            ab[6] += dE[i];
+            ab[8] = std::min(ab[8], (double) dE[i]);
+            ab[9] = std::max(ab[9], (double) dE[i]);
+        }
+
+        // The counts, means, min and max of all the threads
+        #pragma omp single
+        for (int b = 0; b < n_bunches; b++) {
+            double *out = result + 10 * b;
+            for (int k = 0; k < 10; k++)
+                out[k] = empty[k];
+            for (int t = 0; t < threads; t++) {
+                const double *ab = acc + t * size + 10 * b;
+                for (int k : {0, 1, 2, 6})
+                    out[k] += ab[k];
+                for (int k : {4, 8})
+                    out[k] = std::min(out[k], ab[k]);
+                for (int k : {5, 9})
+                    out[k] = std::max(out[k], ab[k]);
+            }
+            // The min and max of an empty bunch stay at +-DBL_MAX, so that
+            // they drop out of the reduction over the workers
+            if (out[0] > 0) {
+                out[2] /= out[0];
+                out[6] /= out[0];
+            }
+        }
+
+        #pragma omp for schedule(static)
+        for (int i = 0; i < n_macroparticles; i++) {
+            const int bunch = bunch_index((dt[i] - t_offset) * inv_spacing,
+                                          bunch_spacing_buckets, n_bunches);
+            if (bunch < 0 || id[i] == 0) continue;
+            const double d_dt = dt[i] - result[10 * bunch + 2];
+            const double d_dE = dE[i] - result[10 * bunch + 6];
+            a[10 * bunch + 3] += d_dt * d_dt;
+            a[10 * bunch + 7] += d_dE * d_dE;
+        }
+    }
+
+    for (int b = 0; b < n_bunches; b++)
+        for (int t = 0; t < threads; t++) {
+            result[10 * b + 3] += acc[t * size + 10 * b + 3];
+            result[10 * b + 7] += acc[t * size + 10 * b + 7];
+        }
+    workspace_return(acc);
+}
+
+
+// result: alive particles, lost particles, then mean, sum of the squared
+// deviations from the mean, min and max of dt, then of dE
+extern "C" void beam_statistics(const double *__restrict__ dt,
+                                const double *__restrict__ dE,
+                                const long *__restrict__ id,
+                                const int n_macroparticles,
+                                double *__restrict__ result)
+{
+    beam_statistics_kernel(dt, dE, id, n_macroparticles, result);
+}
+
+
+extern "C" void beam_statisticsf(const float *__restrict__ dt,
+                                 const float *__restrict__ dE,
+                                 const long *__restrict__ id,
+                                 const int n_macroparticles,
+                                 double *__restrict__ result)
+{
+    beam_statistics_kernel(dt, dE, id, n_macroparticles, result);
+}
+
+
+// result: the ten statistics of beam_statistics for every bunch
+extern "C" void bunch_statistics(const double *__restrict__ dt,
+                                 const double *__restrict__ dE,
+                                 const long *__restrict__ id,
+                                 const int n_macroparticles,
+                                 const double t_offset,
+                                 const double bucket_length,
+                                 const int bunch_spacing_buckets,
+                                 const int n_bunches,
+                                 double *__restrict__ result)
+{
+    bunch_statistics_kernel(dt, dE, id, n_macroparticles, t_offset,
+                            bucket_length, bunch_spacing_buckets, n_bunches,
+                            result);
+}
+
+
+extern "C" void bunch_statisticsf(const float *__restrict__ dt,
+                                  const float *__restrict__ dE,
+                                  const long *__restrict__ id,
+                                  const int n_macroparticles,
+                                  const double t_offset,
+                                  const double bucket_length,
+                                  const int bunch_spacing_buckets,
+                                  const int n_bunches,
+                                  double *__restrict__ result)
+{
+    bunch_statistics_kernel(dt, dE, id, n_macroparticles, t_offset,
+                            bucket_length, bunch_spacing_buckets, n_bunches,
+                            result);
+}
@@ -0,0 +1,80 @@
+/*
+ * beam_statistics.h
+ *
+ *  Statistics of the particles that are not lost, computed in a single pass
+ *  and merged pairwise (Chan et al.), so that partial results of threads,
+ *  blocks or MPI workers combine without loss of precision.
+ */
+
+#ifndef INCLUDE_BEAM_STATISTICS_H_
+#define INCLUDE_BEAM_STATISTICS_H_
+
+#include <cfloat>
+#include <algorithm>
+
+// Number of values, mean, sum of the squared deviations from the mean,
+// min and max
+struct moments_t {
+    double n, mean, m2, min, max;
+};
+
+#define MOMENTS_EMPTY {0., 0., 0., DBL_MAX, -DBL_MAX}
+
+// Adds the values of b to a
+static inline void moments_merge(moments_t &a, const moments_t &b)
+{
+    if (b.n == 0) return;
+    if (a.n == 0) {
+        a = b;
+        return;
+    }
+    const double n = a.n + b.n;
+    const double delta = b.mean - a.mean;
+    a.mean += delta * b.n / n;
+    a.m2 += b.m2 + delta * delta * a.n * b.n / n;
+    a.min = std::min(a.min, b.min);
+    a.max = std::max(a.max, b.max);
+    a.n = n;
+}
+
+// mean, m2, min, max
+static inline void moments_store(const moments_t &m, double *out)
+{
+    out[0] = m.mean;
+    out[1] = m.m2;
+    out[2] = m.min;
+    out[3] = m.max;
+}
+
+extern "C" {
+    void beam_statistics(const double *__restrict__ dt,
+                         const double *__restrict__ dE,
+                         const long *__restrict__ id,
+                         const int n_macroparticles,
+                         double *__restrict__ result);
+    void beam_statisticsf(const float *__restrict__ dt,
+                          const float *__restrict__ dE,
+                          const long *__restrict__ id,
+                          const int n_macroparticles,
+                          double *__restrict__ result);
+    void bunch_statistics(const double *__restrict__ dt,
+                          const double *__restrict__ dE,
+                          const long *__restrict__ id,
+                          const int n_macroparticles,
+                          const double t_offset,
+                          const double bucket_length,
+                          const int bunch_spacing_buckets,
+                          const int n_bunches,
+                          double *__restrict__ result);
+    void bunch_statisticsf(const float *__restrict__ dt,
+                           const float *__restrict__ dE,
+                           const long *__restrict__ id,
+                           const int n_macroparticles,
+                           const double t_offset,
+                           const double bucket_length,
+                           const int bunch_spacing_buckets,
+                           const int n_bunches,
+                           double *__restrict__ result);
+}
+
+#endif /* INCLUDE_BEAM_STATISTICS_H_ */
@@ -0,0 +1,314 @@
+/*
+Copyright 2016 CERN. This software is distributed under the
+terms of the GNU General Public Licence version 3 (GPL Version 3),
+copied verbatim in the file LICENCE.md.
+In applying this licence, CERN does not waive the privileges and immunities
+granted to it by virtue of its status as an Intergovernmental Organization or
+submit itself to any jurisdiction.
+Project website: http://blond.web.cern.ch/
+*/
+
+// Optimised C++ routine that tracks the beam for several turns in a single
+// call. Every turn does: histogram, induced voltage, RF voltage, kick, drift.
+// The turn programmes are read in place from the (n_rf, stride) arrays.
+// The histogram can be taken at the start of every turn or after every
+// drift, and the RF and induced voltages can be given by the caller instead,
+// when they are computed in Python between single-turn calls.
+// Author: Konstantinos Iliakis
+
+#include <string.h>
+#include <stdlib.h>
+#include "common.h"
+#include "workspace.h"
+
+extern "C" {
+    void histogram(const double *input, double *output, const double cut_left,
+                   const double cut_right, const int n_slices,
+                   const int n_macroparticles);
+    void histogramf(const float *input, float *output, const float cut_left,
+                    const float cut_right, const int n_slices,
+                    const int n_macroparticles);
+    void rf_volt_comp(const double *voltage, const double *omega_RF,
+                      const double *phi_RF, const double *bin_centers,
+                      const int n_rf, const int n_bins, double *rf_voltage);
+    void rf_volt_compf(const float *voltage, const float *omega_RF,
+                       const float *phi_RF, const float *bin_centers,
+                       const int n_rf, const int n_bins, float *rf_voltage);
+    void kick(const double *beam_dt, double *beam_dE, const int n_rf,
+              const double *voltage, const double *omega_RF,
+              const double *phi_RF, const int n_macroparticles,
+              const double acc_kick);
+    void kickf(const float *beam_dt, float *beam_dE, const int n_rf,
+               const float *voltage, const float *omega_RF,
+               const float *phi_RF, const int n_macroparticles,
+               const float acc_kick);
+    void linear_interp_kick(double *beam_dt, double *beam_dE,
+                            const double *voltage_array,
+                            const double *bin_centers, const double charge,
+                            const int n_slices, const int n_macroparticles,
+                            const double acc_kick);
+    void linear_interp_kickf(float *beam_dt, float *beam_dE,
+                             const float *voltage_array,
+                             const float *bin_centers, const float charge,
+                             const int n_slices, const int n_macroparticles,
+                             const float acc_kick);
+    void drift(double *beam_dt, const double *beam_dE, const char *solver,
+               const double T0, const double length_ratio,
+               const double alpha_order, const double eta_zero,
+               const double eta_one, const double eta_two,
+               const double alpha_zero, const double alpha_one,
+               const double alpha_two, const double beta,
+               const double energy, const int n_macroparticles);
+    void driftf(float *beam_dt, const float *beam_dE, const char *solver,
+                const float T0, const float length_ratio,
+                const float alpha_order, const float eta_zero,
+                const float eta_one, const float eta_two,
+                const float alpha_zero, const float alpha_one,
+                const float alpha_two, const float beta,
+                const float energy, const int n_macroparticles);
+}
+
+// Overloads to pick the double or single precision kernel in the template
+static inline void _histogram(const double *in, double *out, double l,
+                              double r, int n_s, int n_p)
+{ histogram(in, out, l, r, n_s, n_p); }
+static inline void _histogram(const float *in, float *out, float l,
+                              float r, int n_s, int n_p)
+{ histogramf(in, out, l, r, n_s, n_p); }
+
+static inline void _rf_volt_comp(const double *v, const double *w,
+                                 const double *p, const double *b,
+                                 int n_rf, int n_s, double *out)
+{ rf_volt_comp(v, w, p, b, n_rf, n_s, out); }
+static inline void _rf_volt_comp(const float *v, const float *w,
+                                 const float *p, const float *b,
+                                 int n_rf, int n_s, float *out)
+{ rf_volt_compf(v, w, p, b, n_rf, n_s, out); }
+
+static inline void _kick(const double *dt, double *dE, int n_rf,
+                         const double *v, const double *w, const double *p,
+                         int n_p, double acc)
+{ kick(dt, dE, n_rf, v, w, p, n_p, acc); }
+static inline void _kick(const float *dt, float *dE, int n_rf,
+                         const float *v, const float *w, const float *p,
+                         int n_p, float acc)
+{ kickf(dt, dE, n_rf, v, w, p, n_p, acc); }
+
+static inline void _linear_interp_kick(double *dt, double *dE,
+                                       const double *v, const double *b,
+                                       double q, int n_s, int n_p, double acc)
+{ linear_interp_kick(dt, dE, v, b, q, n_s, n_p, acc); }
+static inline void _linear_interp_kick(float *dt, float *dE,
+                                       const float *v, const float *b,
+                                       float q, int n_s, int n_p, float acc)
+{ linear_interp_kickf(dt, dE, v, b, q, n_s, n_p, acc); }
+
+static inline void _drift(double *dt, const double *dE, const char *solver,
+                          double T0, double lr, double ao, double e0,
+                          double e1, double e2, double a0, double a1,
+                          double a2, double beta, double energy, int n_p)
+{ drift(dt, dE, solver, T0, lr, ao, e0, e1, e2, a0, a1, a2, beta, energy, n_p); }
+static inline void _drift(float *dt, const float *dE, const char *solver,
+                          float T0, float lr, float ao, float e0,
+                          float e1, float e2, float a0, float a1,
+                          float a2, float beta, float energy, int n_p)
+{ driftf(dt, dE, solver, T0, lr, ao, e0, e1, e2, a0, a1, a2, beta, energy, n_p); }
+
+
+// When the histogram is taken
+enum { SLICE_NONE = 0, SLICE_BEFORE_KICK = 1, SLICE_AFTER_DRIFT = 2 };
+
+
+// Induced voltage as the direct convolution of the profile with a wake
+// kernel of length 2 * n_slices - 1, centred at index n_slices - 1.
+template <typename T>
+static void induced_voltage_direct(const T *__restrict__ profile,
+                                   const T *__restrict__ wake,
+                                   const int n_slices, const T factor,
+                                   T *__restrict__ induced_voltage)
+{
+    #pragma omp parallel for
+    for (int k = 0; k < n_slices; k++) {
+        const T *w = wake + k + n_slices - 1;
+        T sum = 0;
+        for (int j = 0; j < n_slices; j++)
+            sum += profile[j] * w[-j];
+        induced_voltage[k] = factor * sum;
+    }
+}
+
+
+template <typename T>
+static void track_n_turns_t(T *__restrict__ beam_dt,
+                            T *__restrict__ beam_dE,
+                            const int n_macroparticles,
+                            const int start_turn, const int n_turns,
+                            const int n_rf, const int stride,
+                            const T *__restrict__ voltage,
+                            const T *__restrict__ omega_rf,
+                            const T *__restrict__ phi_rf,
+                            const T *__restrict__ acc_kick,
+                            const T *__restrict__ t_rev,
+                            const T *__restrict__ eta_0,
+                            const T *__restrict__ eta_1,
+                            const T *__restrict__ eta_2,
+                            const T *__restrict__ alpha_0,
+                            const T *__restrict__ alpha_1,
+                            const T *__restrict__ alpha_2,
+                            const T *__restrict__ beta,
+                            const T *__restrict__ energy,
+                            const char *__restrict__ solver,
+                            const T length_ratio, const T alpha_order,
+                            const T charge, const int interpolation,
+                            const int slicing, const int rf_voltage_given,
+                            const int n_slices, const T cut_left,
+                            const T cut_right,
+                            const T *__restrict__ bin_centers,
+                            T *__restrict__ profile,
+                            T *__restrict__ rf_voltage,
+                            const T *__restrict__ wake,
+                            const T induced_factor,
+                            T *__restrict__ induced_voltage)
+{
+    T *v_turn = (T *) workspace_acquire(3 * n_rf * sizeof(T));
+    T *w_turn = v_turn + n_rf;
+    T *p_turn = w_turn + n_rf;
+    T *total_voltage = NULL;
+    if (interpolation)
+        total_voltage = (T *) workspace_acquire(n_slices * sizeof(T));
+
+    for (int turn = start_turn; turn < start_turn + n_turns; turn++) {
+        for (int h = 0; h < n_rf; h++) {
+            v_turn[h] = voltage[h * stride + turn];
+            w_turn[h] = omega_rf[h * stride + turn];
+            p_turn[h] = phi_rf[h * stride + turn];
+        }
+
+        if (profile && slicing == SLICE_BEFORE_KICK)
+            _histogram(beam_dt, profile, cut_left, cut_right, n_slices,
+                       n_macroparticles);
+
+        if (interpolation) {
+            if (!rf_voltage_given) {
+                memset(rf_voltage, 0, n_slices * sizeof(T));
+                _rf_volt_comp(v_turn, w_turn, p_turn, bin_centers, n_rf,
+                              n_slices, rf_voltage);
+            }
+            // Without a wake, the induced voltage is the one given
+            if (wake)
+                induced_voltage_direct(profile, wake, n_slices,
+                                       induced_factor, induced_voltage);
+            if (induced_voltage) {
+                for (int i = 0; i < n_slices; i++)
+                    total_voltage[i] = rf_voltage[i] + induced_voltage[i];
+            } else {
+                memcpy(total_voltage, rf_voltage, n_slices * sizeof(T));
+            }
+            _linear_interp_kick(beam_dt, beam_dE, total_voltage, bin_centers,
+                                charge, n_slices, n_macroparticles,
+                                acc_kick[turn]);
+        } else {
+            for (int h = 0; h < n_rf; h++)
+                v_turn[h] *= charge;
+            _kick(beam_dt, beam_dE, n_rf, v_turn, w_turn, p_turn,
+                  n_macroparticles, acc_kick[turn]);
+        }
+
+        _drift(beam_dt, beam_dE, solver, t_rev[turn + 1], length_ratio,
+               alpha_order, eta_0[turn + 1], eta_1[turn + 1], eta_2[turn + 1],
+               alpha_0[turn + 1], alpha_1[turn + 1], alpha_2[turn + 1],
+               beta[turn + 1], energy[turn + 1], n_macroparticles);
+
+        if (profile && slicing == SLICE_AFTER_DRIFT)
+            _histogram(beam_dt, profile, cut_left, cut_right, n_slices,
+                       n_macroparticles);
+    }
+
+    workspace_return(v_turn);
+    if (total_voltage)
+        workspace_return(total_voltage);
+}
+
+
+extern "C" void track_n_turns(double *__restrict__ beam_dt,
+                              double *__restrict__ beam_dE,
+                              const int n_macroparticles,
+                              const int start_turn, const int n_turns,
+                              const int n_rf, const int stride,
+                              const double *__restrict__ voltage,
+                              const double *__restrict__ omega_rf,
+                              const double *__restrict__ phi_rf,
+                              const double *__restrict__ acc_kick,
+                              const double *__restrict__ t_rev,
+                              const double *__restrict__ eta_0,
+                              const double *__restrict__ eta_1,
+                              const double *__restrict__ eta_2,
+                              const double *__restrict__ alpha_0,
+                              const double *__restrict__ alpha_1,
+                              const double *__restrict__ alpha_2,
+                              const double *__restrict__ beta,
+                              const double *__restrict__ energy,
+                              const char *__restrict__ solver,
+                              const double length_ratio,
+                              const double alpha_order,
+                              const double charge, const int interpolation,
+                              const int slicing, const int rf_voltage_given,
+                              const int n_slices, const double cut_left,
+                              const double cut_right,
+                              const double *__restrict__ bin_centers,
+                              double *__restrict__ profile,
+                              double *__restrict__ rf_voltage,
+                              const double *__restrict__ wake,
+                              const double induced_factor,
+                              double *__restrict__ induced_voltage)
+{
+    track_n_turns_t(beam_dt, beam_dE, n_macroparticles, start_turn, n_turns,
+                    n_rf, stride, voltage, omega_rf, phi_rf, acc_kick, t_rev,
+                    eta_0, eta_1, eta_2, alpha_0, alpha_1, alpha_2, beta,
+                    energy, solver, length_ratio, alpha_order, charge,
+                    interpolation, slicing, rf_voltage_given, n_slices,
+                    cut_left, cut_right, bin_centers, profile, rf_voltage,
+                    wake, induced_factor, induced_voltage);
+}
+
+
+extern "C" void track_n_turnsf(float *__restrict__ beam_dt,
+                               float *__restrict__ beam_dE,
+                               const int n_macroparticles,
+                               const int start_turn, const int n_turns,
+                               const int n_rf, const int stride,
+                               const float *__restrict__ voltage,
+                               const float *__restrict__ omega_rf,
+                               const float *__restrict__ phi_rf,
+                               const float *__restrict__ acc_kick,
+                               const float *__restrict__ t_rev,
+                               const float *__restrict__ eta_0,
+                               const float *__restrict__ eta_1,
+                               const float *__restrict__ eta_2,
+                               const float *__restrict__ alpha_0,
+                               const float *__restrict__ alpha_1,
+                               const float *__restrict__ alpha_2,
+                               const float *__restrict__ beta,
+                               const float *__restrict__ energy,
+                               const char *__restrict__ solver,
+                               const float length_ratio,
+                               const float alpha_order,
+                               const float charge, const int interpolation,
+                               const int slicing, const int rf_voltage_given,
+                               const int n_slices, const float cut_left,
+                               const float cut_right,
+                               const float *__restrict__ bin_centers,
+                               float *__restrict__ profile,
+                               float *__restrict__ rf_voltage,
+                               const float *__restrict__ wake,
+                               const float induced_factor,
+                               float *__restrict__ induced_voltage)
+{
+    track_n_turns_t(beam_dt, beam_dE, n_macroparticles, start_turn, n_turns,
+                    n_rf, stride, voltage, omega_rf, phi_rf, acc_kick, t_rev,
+                    eta_0, eta_1, eta_2, alpha_0, alpha_1, alpha_2, beta,
+                    energy, solver, length_ratio, alpha_order, charge,
+                    interpolation, slicing, rf_voltage_given, n_slices,
+                    cut_left, cut_right, bin_centers, profile, rf_voltage,
+                    wake, induced_factor, induced_voltage);
+}
@@ -15,6 +15,7 @@
 #include <stdlib.h>     // mmalloc()
 #include <math.h>
 #include "common.h"
+#include "workspace.h"
 
 
 extern "C" void histogram(const double *__restrict__ input,
@@ -26,26 +27,17 @@ extern "C" void histogram(const double *__restrict__ input,
     const int STEP = 16;
     const double inv_bin_width = n_slices / (cut_right - cut_left);
 
-    // allocate memory for the thread_private histogram
-    // double **histo = (double **) malloc(omp_get_max_threads() * sizeof(double *));
-    // histo[0] = (double *) malloc (omp_get_max_threads() * n_slices * sizeof(double));
-    // for (int i = 0; i < omp_get_max_threads(); i++)
-    //     histo[i] = (*histo + n_slices * i);
-
-    static double **histo = nullptr;
-
-    if (!histo) {
-        histo = (double **) malloc(omp_get_max_threads() * sizeof(double *));
-        histo[0] = (double *) malloc (omp_get_max_threads() * n_slices * sizeof(double));
-        for (int i = 0; i < omp_get_max_threads(); i++)
-            histo[i] = (*histo + n_slices * i);
-    }
+    // thread_private histograms, taken from the workspace pool
+    const int max_threads = omp_get_max_threads();
+    double *histo_buffer = (double *) workspace_acquire(
+                               max_threads * n_slices * sizeof(double));
 
     #pragma omp parallel
     {
         const int id = omp_get_thread_num();
         const int threads = omp_get_num_threads();
-        memset(histo[id], 0., n_slices * sizeof(double));
+        double *histo = histo_buffer + n_slices * id;
+        memset(histo, 0., n_slices * sizeof(double));
         float fbin[STEP];
         #pragma omp for
         for (int i = 0; i < n_macroparticles; i += STEP) {
@@ -61,7 +53,7 @@ extern "C" void histogram(const double *__restrict__ input,
             for (int j = 0; j < loop_count; j++) {
                 const int bin  = (int) fbin[j];
                 if (bin < 0 || bin >= n_slices) continue;
-                histo[id][bin] += 1.;
+                histo[bin] += 1.;
             }
         }
 
@@ -70,13 +62,11 @@ extern "C" void histogram(const double *__restrict__ input,
         for (int i = 0; i < n_slices; i++) {
             output[i] = 0.;
             for (int t = 0; t < threads; t++)
-                output[i] += histo[t][i];
+                output[i] += histo_buffer[n_slices * t + i];
         }
     }
 
-    // free memory
-    // free(histo[0]);
-    // free(histo);
+    workspace_return(histo_buffer);
 }
 
 extern "C" void smooth_histogram(const double *__restrict__ input,
@@ -132,21 +122,17 @@ extern "C" void histogramf(const float *__restrict__ input,
     const int STEP = 16;
     const float inv_bin_width = n_slices / (cut_right - cut_left);
 
-    // allocate memory for the thread_private histogram
-    static float **histo = nullptr;
-
-    if (!histo) {
-        histo = (float **) malloc(omp_get_max_threads() * sizeof(float *));
-        histo[0] = (float *) malloc (omp_get_max_threads() * n_slices * sizeof(float));
-        for (int i = 0; i < omp_get_max_threads(); i++)
-            histo[i] = (*histo + n_slices * i);
-    }
+    // thread_private histograms, taken from the workspace pool
+    const int max_threads = omp_get_max_threads();
+    float *histo_buffer = (float *) workspace_acquire(
+                              max_threads * n_slices * sizeof(float));
 
     #pragma omp parallel
     {
         const int id = omp_get_thread_num();
         const int threads = omp_get_num_threads();
-        memset(histo[id], 0., n_slices * sizeof(float));
+        float *histo = histo_buffer + n_slices * id;
+        memset(histo, 0., n_slices * sizeof(float));
         float fbin[STEP];
         #pragma omp for
         for (int i = 0; i < n_macroparticles; i += STEP) {
@@ -162,7 +148,7 @@ extern "C" void histogramf(const float *__restrict__ input,
             for (int j = 0; j < loop_count; j++) {
                 const int bin  = (int) fbin[j];
                 if (bin < 0 || bin >= n_slices) continue;
-                histo[id][bin] += 1.;
+                histo[bin] += 1.;
             }
         }
 
@@ -171,13 +157,11 @@ extern "C" void histogramf(const float *__restrict__ input,
         for (int i = 0; i < n_slices; i++) {
             output[i] = 0.;
             for (int t = 0; t < threads; t++)
-                output[i] += histo[t][i];
+                output[i] += histo_buffer[n_slices * t + i];
         }
     }
 
-    // free memory
-    // free(histo[0]);
-    // free(histo);
+    workspace_return(histo_buffer);
 }
 
 extern "C" void smooth_histogramf(const float *__restrict__ input,
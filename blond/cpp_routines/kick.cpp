@@ -12,6 +12,7 @@ Project website: http://blond.web.cern.ch/
 // Author: Danilo Quartullo, Helga Timko, Alexandre Lasheen
 
 #include "sin.h"
+#include "cos.h"
 #include "common.h"
 
 using namespace vdt;
@@ -97,3 +98,110 @@ extern "C" void rf_volt_compf(const float * __restrict__ voltage,
     }
 }
 
+
+// RF voltage from the phasors exp(i*(omega_RF*t + phi_RF)) of the RF systems
+// on a uniform bin grid, stored per system in phasor_re/phasor_im.
+// With reset the phasors are computed from scratch; otherwise they are rotated
+// by exp(i*(domega_RF*t + dphi_RF)), the change of frequency and phase since
+// the last call. The rotation is advanced from bin to bin and restarted from
+// an exact value at the beginning of every block of bins.
+extern "C" void rf_volt_phasor(const double * __restrict__ voltage,
+                               const double * __restrict__ omega_RF,
+                               const double * __restrict__ phi_RF,
+                               const double * __restrict__ domega_RF,
+                               const double * __restrict__ dphi_RF,
+                               const double bin_start,
+                               const double bin_width,
+                               const int n_rf,
+                               const int n_bins,
+                               const bool reset,
+                               double * __restrict__ phasor_re,
+                               double * __restrict__ phasor_im,
+                               double * __restrict__ rf_voltage)
+{
+    const int block = 64;
+    const int n_blocks = (n_bins + block - 1) / block;
+
+    for (int j = 0; j < n_rf; j++) {
+        double * __restrict__ re = phasor_re + (size_t) j * n_bins;
+        double * __restrict__ im = phasor_im + (size_t) j * n_bins;
+        const double omega = reset ? omega_RF[j] : domega_RF[j];
+        const double phi = reset ? phi_RF[j] : dphi_RF[j];
+        const double step_re = fast_cos(omega * bin_width);
+        const double step_im = fast_sin(omega * bin_width);
+
+        #pragma omp parallel for
+        for (int b = 0; b < n_blocks; b++) {
+            const int lo = b * block;
+            const int hi = lo + block < n_bins ? lo + block : n_bins;
+            const double phase = omega * (bin_start + lo * bin_width) + phi;
+            double rot_re = fast_cos(phase);
+            double rot_im = fast_sin(phase);
+            for (int i = lo; i < hi; i++) {
+                if (reset) {
+                    re[i] = rot_re;
+                    im[i] = rot_im;
+                } else {
+                    const double tmp = re[i] * rot_re - im[i] * rot_im;
+                    im[i] = re[i] * rot_im + im[i] * rot_re;
+                    re[i] = tmp;
+                }
+                rf_voltage[i] += voltage[j] * im[i];
+                const double tmp = rot_re * step_re - rot_im * step_im;
+                rot_im = rot_re * step_im + rot_im * step_re;
+                rot_re = tmp;
+            }
+        }
+    }
+}
+
+
+extern "C" void rf_volt_phasorf(const float * __restrict__ voltage,
+                                const float * __restrict__ omega_RF,
+                                const float * __restrict__ phi_RF,
+                                const float * __restrict__ domega_RF,
+                                const float * __restrict__ dphi_RF,
+                                const float bin_start,
+                                const float bin_width,
+                                const int n_rf,
+                                const int n_bins,
+                                const bool reset,
+                                float * __restrict__ phasor_re,
+                                float * __restrict__ phasor_im,
+                                float * __restrict__ rf_voltage)
+{
+    const int block = 64;
+    const int n_blocks = (n_bins + block - 1) / block;
+
+    for (int j = 0; j < n_rf; j++) {
+        float * __restrict__ re = phasor_re + (size_t) j * n_bins;
+        float * __restrict__ im = phasor_im + (size_t) j * n_bins;
+        const float omega = reset ? omega_RF[j] : domega_RF[j];
+        const float phi = reset ? phi_RF[j] : dphi_RF[j];
+        const float step_re = fast_cosf(omega * bin_width);
+        const float step_im = fast_sinf(omega * bin_width);
+
+        #pragma omp parallel for
+        for (int b = 0; b < n_blocks; b++) {
+            const int lo = b * block;
+            const int hi = lo + block < n_bins ? lo + block : n_bins;
+            const float phase = omega * (bin_start + lo * bin_width) + phi;
+            float rot_re = fast_cosf(phase);
+            float rot_im = fast_sinf(phase);
+            for (int i = lo; i < hi; i++) {
+                if (reset) {
+                    re[i] = rot_re;
+                    im[i] = rot_im;
+                } else {
+                    const float tmp = re[i] * rot_re - im[i] * rot_im;
+                    im[i] = re[i] * rot_im + im[i] * rot_re;
+                    re[i] = tmp;
+                }
+                rf_voltage[i] += voltage[j] * im[i];
+                const float tmp = rot_re * step_re - rot_im * step_im;
+                rot_im = rot_re * step_im + rot_im * step_re;
+                rot_re = tmp;
+            }
+        }
+    }
+}
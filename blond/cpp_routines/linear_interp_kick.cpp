@@ -17,6 +17,7 @@ Project website: http://blond.web.cern.ch/
 #include <cmath>
 
 #include "common.h"
+#include "workspace.h"
 
 extern "C" void linear_interp_kick(double * __restrict__ beam_dt,
                                    double * __restrict__ beam_dE,
@@ -34,8 +35,8 @@ extern "C" void linear_interp_kick(double * __restrict__ beam_dt,
                                  / (bin_centers[n_slices - 1]
                                     - bin_centers[0]);
 
-    double *voltageKick = (double *) malloc ((n_slices - 1) * sizeof(double));
-    double *factor = (double *) malloc ((n_slices - 1) * sizeof(double));
+    double *voltageKick = (double *) workspace_acquire(2 * (n_slices - 1) * sizeof(double));
+    double *factor = voltageKick + (n_slices - 1);
 
     #pragma omp parallel
     {
@@ -66,8 +67,7 @@ extern "C" void linear_interp_kick(double * __restrict__ beam_dt,
 
         }
     }
-    free(voltageKick);
-    free(factor);
+    workspace_return(voltageKick);
 }
 
 // Optimised C++ routine that interpolates the induced voltage
@@ -122,8 +122,8 @@ extern "C" void linear_interp_kick_n_drift(double * __restrict__ beam_dt,
                                     - bin_centers[0]);
     const double coeff = T0 * length_ratio * eta_zero / (beta * beta * energy);
 
-    double *voltageKick = (double *) malloc ((n_slices - 1) * sizeof(double));
-    double *factor = (double *) malloc ((n_slices - 1) * sizeof(double));
+    double *voltageKick = (double *) workspace_acquire(2 * (n_slices - 1) * sizeof(double));
+    double *factor = voltageKick + (n_slices - 1);
 
     #pragma omp parallel
     {
@@ -158,8 +158,7 @@ extern "C" void linear_interp_kick_n_drift(double * __restrict__ beam_dt,
 
         }
     }
-    free(voltageKick);
-    free(factor);
+    workspace_return(voltageKick);
 }
 
 
@@ -179,8 +178,8 @@ extern "C" void linear_interp_kickf(float * __restrict__ beam_dt,
                                 / (bin_centers[n_slices - 1]
                                    - bin_centers[0]);
 
-    float *voltageKick = (float *) malloc ((n_slices - 1) * sizeof(float));
-    float *factor = (float *) malloc ((n_slices - 1) * sizeof(float));
+    float *voltageKick = (float *) workspace_acquire(2 * (n_slices - 1) * sizeof(float));
+    float *factor = voltageKick + (n_slices - 1);
 
     #pragma omp parallel
     {
@@ -211,8 +210,7 @@ extern "C" void linear_interp_kickf(float * __restrict__ beam_dt,
 
         }
     }
-    free(voltageKick);
-    free(factor);
+    workspace_return(voltageKick);
 }
 
 // Optimised C++ routine that interpolates the induced voltage
@@ -267,8 +265,8 @@ extern "C" void linear_interp_kick_n_driftf(float * __restrict__ beam_dt,
                                    - bin_centers[0]);
     const float coeff = T0 * length_ratio * eta_zero / (beta * beta * energy);
 
-    float *voltageKick = (float *) malloc ((n_slices - 1) * sizeof(float));
-    float *factor = (float *) malloc ((n_slices - 1) * sizeof(float));
+    float *voltageKick = (float *) workspace_acquire(2 * (n_slices - 1) * sizeof(float));
+    float *factor = voltageKick + (n_slices - 1);
 
     #pragma omp parallel
     {
@@ -303,8 +301,7 @@ extern "C" void linear_interp_kick_n_driftf(float * __restrict__ beam_dt,
 
         }
     }
-    free(voltageKick);
-    free(factor);
+    workspace_return(voltageKick);
 }
 
 
@@ -17,12 +17,7 @@ Project website: http://blond.web.cern.ch/
 #include "exp.h"
 
 #include "common.h"
-
-#ifdef PARALLEL
-#include <parallel/algorithm>
-#else
-#include <algorithm>
-#endif
+#include "sort_particles.h"
 
 #include <cmath>
 #include <chrono>
@@ -32,15 +27,137 @@ Project website: http://blond.web.cern.ch/
 using namespace vdt;
 
 
-// Definition of struct particle
-struct particle {
-    double de;
-    double dt;
-    bool operator<(const particle &o) const
+// The MuSiC steps from particle lo to particle hi, from the resonator state
+// (first, second) at particle lo; on output, the state at particle hi.
+template <typename T>
+static inline void music_steps(const T *__restrict__ beam_dt,
+                               T *__restrict__ beam_dE,
+                               T *__restrict__ induced_voltage,
+                               const int lo, const int hi,
+                               T &first, T &second,
+                               const T alpha, const T omega_bar, const T cnst,
+                               const T coeff1, const T coeff2,
+                               const T coeff3, const T coeff4)
+{
+    T input_first_component = first;
+    T input_second_component = second;
+    for (int i = lo; i < hi; i++) {
+        const T time_difference = beam_dt[i + 1] - beam_dt[i];
+        const T exp_term = fast_exp(-alpha * time_difference);
+        const T cos_term = fast_cos(omega_bar * time_difference);
+        const T sin_term = fast_sin(omega_bar * time_difference);
+
+        const T product_first_component =
+            exp_term * ((cos_term + coeff1 * sin_term)
+                        * input_first_component + coeff2 * sin_term
+                        * input_second_component);
+
+        const T product_second_component =
+            exp_term * (coeff3 * sin_term * input_first_component
+                        + (cos_term + coeff4 * sin_term)
+                        * input_second_component);
+
+        induced_voltage[i + 1] = cnst * (0.5 + product_first_component);
+        beam_dE[i + 1] += induced_voltage[i + 1];
+        input_first_component = product_first_component + 1;
+        input_second_component = product_second_component;
+    }
+    first = input_first_component;
+    second = input_second_component;
+}
+
+
+// The MuSiC step from particle i to particle i+1 is the affine map
+//     s_{i+1} = M_i s_i + (1, 0)
+// of the 2-component resonator state s, with M_i depending only on
+// dt[i+1] - dt[i]. Affine maps compose associatively, so the recurrence is
+// computed as a blocked parallel scan: every thread composes the maps of its
+// block of particles, the composed maps propagate the state to the start of
+// every block, and every thread then recomputes the states of its block.
+// The scan evaluates every step twice, so short beams or a single thread
+// take the sequential steps instead.
+// On input, first and second are the state at particle 0; on output, the
+// state after the last particle.
+template <typename T>
+static void music_scan(const T *__restrict__ beam_dt,
+                       T *__restrict__ beam_dE,
+                       T *__restrict__ induced_voltage,
+                       const int n_macroparticles,
+                       T &first, T &second,
+                       const T alpha, const T omega_bar, const T cnst,
+                       const T coeff1, const T coeff2,
+                       const T coeff3, const T coeff4)
+{
+    const int n_steps = n_macroparticles - 1;
+    if (n_steps <= 0) return;
+
+    const int max_threads = omp_get_max_threads();
+    if ((n_steps < 16384) || (max_threads == 1)) {
+        music_steps(beam_dt, beam_dE, induced_voltage, 0, n_steps, first,
+                    second, alpha, omega_bar, cnst, coeff1, coeff2, coeff3,
+                    coeff4);
+        return;
+    }
+
+    // Composed map (a00, a01, a10, a11, c0, c1) and start state of every block
+    std::vector<T> maps(6 * max_threads);
+    std::vector<T> starts(2 * max_threads);
+
+    #pragma omp parallel
     {
-        return dt < o.dt;
+        const int id = omp_get_thread_num();
+        const int threads = omp_get_num_threads();
+        const int lo = (int) ((long) n_steps * id / threads);
+        const int hi = (int) ((long) n_steps * (id + 1) / threads);
+
+        // Local composition of the maps of the block
+        T a00 = 1, a01 = 0, a10 = 0, a11 = 1, c0 = 0, c1 = 0;
+        for (int i = lo; i < hi; i++) {
+            const T time_difference = beam_dt[i + 1] - beam_dt[i];
+            const T exp_term = fast_exp(-alpha * time_difference);
+            const T cos_term = fast_cos(omega_bar * time_difference);
+            const T sin_term = fast_sin(omega_bar * time_difference);
+            const T m00 = exp_term * (cos_term + coeff1 * sin_term);
+            const T m01 = exp_term * coeff2 * sin_term;
+            const T m10 = exp_term * coeff3 * sin_term;
+            const T m11 = exp_term * (cos_term + coeff4 * sin_term);
+
+            const T n00 = m00 * a00 + m01 * a10;
+            const T n01 = m00 * a01 + m01 * a11;
+            const T n10 = m10 * a00 + m11 * a10;
+            const T n11 = m10 * a01 + m11 * a11;
+            const T nc0 = m00 * c0 + m01 * c1 + 1;
+            const T nc1 = m10 * c0 + m11 * c1;
+            a00 = n00; a01 = n01; a10 = n10; a11 = n11; c0 = nc0; c1 = nc1;
+        }
+        T *map = &maps[6 * id];
+        map[0] = a00; map[1] = a01; map[2] = a10; map[3] = a11;
+        map[4] = c0; map[5] = c1;
+
+        #pragma omp barrier
+
+        // Carry propagation of the state from block to block
+        #pragma omp single
+        {
+            T s0 = first, s1 = second;
+            for (int t = 0; t < threads; t++) {
+                const T *m = &maps[6 * t];
+                starts[2 * t] = s0;
+                starts[2 * t + 1] = s1;
+                const T n0 = m[0] * s0 + m[1] * s1 + m[4];
+                const T n1 = m[2] * s0 + m[3] * s1 + m[5];
+                s0 = n0; s1 = n1;
+            }
+            first = s0;
+            second = s1;
+        }
+
+        // Fix-up: the states of the block from its start state
+        T s0 = starts[2 * id], s1 = starts[2 * id + 1];
+        music_steps(beam_dt, beam_dE, induced_voltage, lo, hi, s0, s1,
+                    alpha, omega_bar, cnst, coeff1, coeff2, coeff3, coeff4);
     }
-};
+}
 
 
 extern "C" void music_track(double *__restrict__ beam_dt,
@@ -84,45 +201,17 @@ extern "C" void music_track(double *__restrict__ beam_dt,
     */
 
 
-    // Particle sorting with respect to dt
-    std::vector<particle> particles; particles.reserve(n_macroparticles);
-    for (int i = 0; i < n_macroparticles; i++)
-        particles.push_back({beam_dE[i], beam_dt[i]});
-#ifdef PARALLEL
-    __gnu_parallel::sort(particles.begin(), particles.end());
-#else
-    std::sort(particles.begin(), particles.end());
-#endif
-    for (int i = 0; i < n_macroparticles; i++) {
-        beam_dE[i] = particles[i].de;
-        beam_dt[i] = particles[i].dt;
-    }
+    // Particle sorting with respect to dt, starting from the order of
+    // the previous turn
+    sort_particles(beam_dt, beam_dE, NULL, n_macroparticles);
 
     // MuSiC algorithm
     beam_dE[0] += induced_voltage[0];
     double input_first_component = 1;
     double input_second_component = 0;
-    for (int i = 0; i < n_macroparticles - 1; i++) {
-        const double time_difference = beam_dt[i + 1] - beam_dt[i];
-        const double exp_term = fast_exp(-alpha * time_difference);
-        const double cos_term = fast_cos(omega_bar * time_difference);
-        const double sin_term = fast_sin(omega_bar * time_difference);
-
-        const double product_first_component =
-            exp_term * ((cos_term + coeff1 * sin_term)
-                        * input_first_component + coeff2 * sin_term
-                        * input_second_component);
-
-        const double product_second_component =
-            exp_term * (coeff3 * sin_term * input_first_component
-                        + (cos_term + coeff4 * sin_term)
-                        * input_second_component);
-
-        induced_voltage[i + 1] = cnst * (0.5 + product_first_component);
-        beam_dE[i + 1] += induced_voltage[i + 1];
-        input_first_component = product_first_component + 1;
-        input_second_component = product_second_component;
-    }
+    music_scan(beam_dt, beam_dE, induced_voltage, n_macroparticles,
+               input_first_component, input_second_component, alpha,
+               omega_bar, cnst, coeff1, coeff2, coeff3, coeff4);
 
     array_parameters[0] = input_first_component;
     array_parameters[1] = input_second_component;
@@ -150,19 +239,9 @@ extern "C" void music_track_multiturn(double *__restrict__ beam_dt,
     */
 
 
-    // Particle sorting with respect to dt
-    std::vector<particle> particles; particles.reserve(n_macroparticles);
-    for (int i = 0; i < n_macroparticles; i++)
-        particles.push_back({beam_dE[i], beam_dt[i]});
-#ifdef PARALLEL
-    __gnu_parallel::sort(particles.begin(), particles.end());
-#else
-    std::sort(particles.begin(), particles.end());
-#endif
-    for (int i = 0; i < n_macroparticles; i++) {
-        beam_dE[i] = particles[i].de;
-        beam_dt[i] = particles[i].dt;
-    }
+    // Particle sorting with respect to dt, starting from the order of
+    // the previous turn
+    sort_particles(beam_dt, beam_dE, NULL, n_macroparticles);
 
     // First computation of MuSiC relative to the voltage coming from the
     // previous turn
@@ -187,27 +266,9 @@ extern "C" void music_track_multiturn(double *__restrict__ beam_dt,
     double input_second_component = product_second_component;
 
     // MuSiC algorithm for the current turn
-    for (int i = 0; i < n_macroparticles - 1; i++) {
-        const double time_difference = beam_dt[i + 1] - beam_dt[i];
-        const double exp_term = fast_exp(-alpha * time_difference);
-        const double cos_term = fast_cos(omega_bar * time_difference);
-        const double sin_term = fast_sin(omega_bar * time_difference);
-
-        const double product_first_component =
-            exp_term * ((cos_term + coeff1 * sin_term)
-                        * input_first_component + coeff2 * sin_term
-                        * input_second_component);
-
-        const double product_second_component =
-            exp_term * (coeff3 * sin_term * input_first_component
-                        + (cos_term + coeff4 * sin_term)
-                        * input_second_component);
-
-        induced_voltage[i + 1] = cnst * (0.5 + product_first_component);
-        beam_dE[i + 1] += induced_voltage[i + 1];
-        input_first_component = product_first_component + 1;
-        input_second_component = product_second_component;
-    }
+    music_scan(beam_dt, beam_dE, induced_voltage, n_macroparticles,
+               input_first_component, input_second_component, alpha,
+               omega_bar, cnst, coeff1, coeff2, coeff3, coeff4);
 
     array_parameters[0] = input_first_component;
     array_parameters[1] = input_second_component;
@@ -215,17 +276,6 @@ extern "C" void music_track_multiturn(double *__restrict__ beam_dt,
 }
 
 
-// Definition of struct particle
-struct particlef {
-    float de;
-    float dt;
-    bool operator<(const particle &o) const
-    {
-        return dt < o.dt;
-    }
-};
-
-
 extern "C" void music_trackf(float *__restrict__ beam_dt,
                              float *__restrict__ beam_dE,
                              float *__restrict__ induced_voltage,
@@ -267,45 +317,17 @@ extern "C" void music_trackf(float *__restrict__ beam_dt,
     */
 
 
-    // Particle sorting with respect to dt
-    std::vector<particle> particles; particles.reserve(n_macroparticles);
-    for (int i = 0; i < n_macroparticles; i++)
-        particles.push_back({beam_dE[i], beam_dt[i]});
-#ifdef PARALLEL
-    __gnu_parallel::sort(particles.begin(), particles.end());
-#else
-    std::sort(particles.begin(), particles.end());
-#endif
-    for (int i = 0; i < n_macroparticles; i++) {
-        beam_dE[i] = particles[i].de;
-        beam_dt[i] = particles[i].dt;
-    }
+    // Particle sorting with respect to dt, starting from the order of
+    // the previous turn
+    sort_particlesf(beam_dt, beam_dE, NULL, n_macroparticles);
 
     // MuSiC algorithm
     beam_dE[0] += induced_voltage[0];
     float input_first_component = 1;
     float input_second_component = 0;
-    for (int i = 0; i < n_macroparticles - 1; i++) {
-        const float time_difference = beam_dt[i + 1] - beam_dt[i];
-        const float exp_term = fast_exp(-alpha * time_difference);
-        const float cos_term = fast_cos(omega_bar * time_difference);
-        const float sin_term = fast_sin(omega_bar * time_difference);
-
-        const float product_first_component =
-            exp_term * ((cos_term + coeff1 * sin_term)
-                        * input_first_component + coeff2 * sin_term
-                        * input_second_component);
-
-        const float product_second_component =
-            exp_term * (coeff3 * sin_term * input_first_component
-                        + (cos_term + coeff4 * sin_term)
-                        * input_second_component);
-
-        induced_voltage[i + 1] = cnst * (0.5 + product_first_component);
-        beam_dE[i + 1] += induced_voltage[i + 1];
-        input_first_component = product_first_component + 1;
-        input_second_component = product_second_component;
-    }
+    music_scan(beam_dt, beam_dE, induced_voltage, n_macroparticles,
+               input_first_component, input_second_component, alpha,
+               omega_bar, cnst, coeff1, coeff2, coeff3, coeff4);
 
     array_parameters[0] = input_first_component;
     array_parameters[1] = input_second_component;
@@ -333,19 +355,9 @@ extern "C" void music_track_multiturnf(float *__restrict__ beam_dt,
     */
 
 
-    // Particle sorting with respect to dt
-    std::vector<particle> particles; particles.reserve(n_macroparticles);
-    for (int i = 0; i < n_macroparticles; i++)
-        particles.push_back({beam_dE[i], beam_dt[i]});
-#ifdef PARALLEL
-    __gnu_parallel::sort(particles.begin(), particles.end());
-#else
-    std::sort(particles.begin(), particles.end());
-#endif
-    for (int i = 0; i < n_macroparticles; i++) {
-        beam_dE[i] = particles[i].de;
-        beam_dt[i] = particles[i].dt;
-    }
+    // Particle sorting with respect to dt, starting from the order of
+    // the previous turn
+    sort_particlesf(beam_dt, beam_dE, NULL, n_macroparticles);
 
     // First computation of MuSiC relative to the voltage coming from the
     // previous turn
@@ -370,27 +382,9 @@ extern "C" void music_track_multiturnf(float *__restrict__ beam_dt,
     float input_second_component = product_second_component;
 
     // MuSiC algorithm for the current turn
-    for (int i = 0; i < n_macroparticles - 1; i++) {
-        const float time_difference = beam_dt[i + 1] - beam_dt[i];
-        const float exp_term = fast_exp(-alpha * time_difference);
-        const float cos_term = fast_cos(omega_bar * time_difference);
-        const float sin_term = fast_sin(omega_bar * time_difference);
-
-        const float product_first_component =
-            exp_term * ((cos_term + coeff1 * sin_term)
-                        * input_first_component + coeff2 * sin_term
-                        * input_second_component);
-
-        const float product_second_component =
-            exp_term * (coeff3 * sin_term * input_first_component
-                        + (cos_term + coeff4 * sin_term)
-                        * input_second_component);
-
-        induced_voltage[i + 1] = cnst * (0.5 + product_first_component);
-        beam_dE[i + 1] += induced_voltage[i + 1];
-        input_first_component = product_first_component + 1;
-        input_second_component = product_second_component;
-    }
+    music_scan(beam_dt, beam_dE, induced_voltage, n_macroparticles,
+               input_first_component, input_second_component, alpha,
+               omega_bar, cnst, coeff1, coeff2, coeff3, coeff4);
 
     array_parameters[0] = input_first_component;
     array_parameters[1] = input_second_component;
@@ -0,0 +1,97 @@
+/*
+ * philox.h
+ *
+ *  Counter-based random numbers (Philox4x64-10), shared by all the kernels
+ *  that need random numbers. A block of four 64-bit numbers only depends on
+ *  the key (the seed) and on the counter, made of the particle index, the
+ *  stream and the turn, so it can be computed by any thread or MPI worker
+ *  with the same result. The blocks are identical to the ones of
+ *  numpy.random.Philox(key=seed, counter=index + (stream << 64) +
+ *  (turn << 128)).
+ */
+
+#ifndef INCLUDE_PHILOX_H_
+#define INCLUDE_PHILOX_H_
+
+#include <stdint.h>
+#include <math.h>
+
+struct philox_key_t {
+    uint64_t k0;
+    uint64_t k1;
+};
+
+
+static inline uint64_t philox_mulhilo(const uint64_t a, const uint64_t b,
+                                      uint64_t *hi)
+{
+    const unsigned __int128 product = (unsigned __int128) a * b;
+    *hi = (uint64_t) (product >> 64);
+    return (uint64_t) product;
+}
+
+
+// The block of the counter (index, stream, turn); numpy advances the counter
+// before generating, hence the + 1 on the first word
+static inline void philox_block(const philox_key_t key, const uint64_t index,
+                                const uint64_t stream, const uint64_t turn,
+                                uint64_t out[4])
+{
+    uint64_t c0 = index + 1;
+    uint64_t c1 = stream + (c0 == 0);
+    uint64_t c2 = turn + (c0 == 0 && c1 == 0);
+    uint64_t c3 = (c0 == 0 && c1 == 0 && c2 == 0);
+    uint64_t k0 = key.k0, k1 = key.k1;
+
+    for (int round = 0; round < 10; round++) {
+        uint64_t hi0, hi1;
+        const uint64_t lo0 = philox_mulhilo(0xD2E7470EE14C6C93ULL, c0, &hi0);
+        const uint64_t lo1 = philox_mulhilo(0xCA5A826395121157ULL, c2, &hi1);
+        c0 = hi1 ^ c1 ^ k0;
+        c1 = lo1;
+        c2 = hi0 ^ c3 ^ k1;
+        c3 = lo0;
+        k0 += 0x9E3779B97F4A7C15ULL;
+        k1 += 0xBB67AE8584CAA73BULL;
+    }
+    out[0] = c0;
+    out[1] = c1;
+    out[2] = c2;
+    out[3] = c3;
+}
+
+
+// Uniform number in (0, 1) from the 53 upper bits
+static inline double philox_uniform(const uint64_t x)
+{
+    return ((x >> 11) + 0.5) * (1.0 / 9007199254740992.0);
+}
+
+
+// Two independent standard normal numbers of a particle (Box-Muller)
+static inline void philox_normals(const philox_key_t key,
+                                  const uint64_t index,
+                                  const uint64_t stream, const uint64_t turn,
+                                  double *n0, double *n1)
+{
+    uint64_t block[4];
+    philox_block(key, index, stream, turn, block);
+    const double radius = sqrt(-2 * log(philox_uniform(block[0])));
+    const double angle = 2 * M_PI * philox_uniform(block[1]);
+    *n0 = radius * cos(angle);
+    *n1 = radius * sin(angle);
+}
+
+extern "C" {
+    void random_uniform(const uint64_t key0, const uint64_t key1,
+                        const uint64_t stream, const uint64_t turn,
+                        const uint64_t first, const int n,
+                        double *__restrict__ out);
+    void random_normal(const uint64_t key0, const uint64_t key1,
+                       const uint64_t stream, const uint64_t turn,
+                       const uint64_t first, const int n,
+                       double *__restrict__ out0,
+                       double *__restrict__ out1);
+}
+
+#endif /* INCLUDE_PHILOX_H_ */
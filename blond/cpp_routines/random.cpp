@@ -0,0 +1,50 @@
+/*
+Copyright 2016 CERN. This software is distributed under the
+terms of the GNU General Public Licence version 3 (GPL Version 3),
+copied verbatim in the file LICENCE.md.
+In applying this licence, CERN does not waive the privileges and immunities
+granted to it by virtue of its status as an Intergovernmental Organization or
+submit itself to any jurisdiction.
+Project website: http://blond.web.cern.ch/
+*/
+
+// Vectorised fills of counter-based random numbers. The numbers of a
+// particle do not depend on the thread computing them, so the results are
+// the same for any number of threads.
+// Author: Konstantinos Iliakis
+
+#include "common.h"
+#include "philox.h"
+
+
+// Four uniform numbers in (0, 1) per particle, out has 4 * n elements
+extern "C" void random_uniform(const uint64_t key0, const uint64_t key1,
+                               const uint64_t stream, const uint64_t turn,
+                               const uint64_t first, const int n,
+                               double *__restrict__ out)
+{
+    const philox_key_t key = {key0, key1};
+
+    #pragma omp parallel for
+    for (int i = 0; i < n; i++) {
+        uint64_t block[4];
+        philox_block(key, first + i, stream, turn, block);
+        for (int j = 0; j < 4; j++)
+            out[4 * i + j] = philox_uniform(block[j]);
+    }
+}
+
+
+// Two independent standard normal numbers per particle
+extern "C" void random_normal(const uint64_t key0, const uint64_t key1,
+                              const uint64_t stream, const uint64_t turn,
+                              const uint64_t first, const int n,
+                              double *__restrict__ out0,
+                              double *__restrict__ out1)
+{
+    const philox_key_t key = {key0, key1};
+
+    #pragma omp parallel for
+    for (int i = 0; i < n; i++)
+        philox_normals(key, first + i, stream, turn, &out0[i], &out1[i]);
+}
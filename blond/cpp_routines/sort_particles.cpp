@@ -0,0 +1,131 @@
+/*
+Copyright 2016 CERN. This software is distributed under the
+terms of the GNU General Public Licence version 3 (GPL Version 3),
+copied verbatim in the file LICENCE.md.
+In applying this licence, CERN does not waive the privileges and immunities
+granted to it by virtue of its status as an Intergovernmental Organization or
+submit itself to any jurisdiction.
+Project website: http://blond.web.cern.ch/
+*/
+
+// Sorting of the particles with respect to dt, in place. The particles move
+// little in dt from one turn to the next, so the order of the previous turn
+// is almost correct: nearly sorted arrays are fixed with an insertion sort,
+// and a full sort of a permutation is done only when that gets expensive.
+// Author: Konstantinos Iliakis
+
+#include <string.h>
+#include <numeric>
+#include "common.h"
+#include "workspace.h"
+#include "sort_particles.h"
+
+#ifdef PARALLEL
+#include <parallel/algorithm>
+#else
+#include <algorithm>
+#endif
+
+// An insertion sort is tried when at most 1 / MAX_DESCENT_RATIO of the
+// neighbours are in the wrong order, and abandoned after MAX_MOVES_RATIO
+// moves per particle
+#define MAX_DESCENT_RATIO 16
+#define MAX_MOVES_RATIO 16
+
+
+template <typename T>
+static bool insertion_sort(T *__restrict__ dt, T *__restrict__ dE,
+                           long *__restrict__ id, const int n)
+{
+    const long max_moves = (long) MAX_MOVES_RATIO * n;
+    long moves = 0;
+    for (int i = 1; i < n; i++) {
+        if (!(dt[i] < dt[i - 1])) continue;
+        const T dt_i = dt[i];
+        const T dE_i = dE[i];
+        const long id_i = id ? id[i] : 0;
+        int j = i;
+        while (j > 0 && dt_i < dt[j - 1]) {
+            dt[j] = dt[j - 1];
+            dE[j] = dE[j - 1];
+            if (id) id[j] = id[j - 1];
+            j--;
+        }
+        dt[j] = dt_i;
+        dE[j] = dE_i;
+        if (id) id[j] = id_i;
+        moves += i - j;
+        if (moves > max_moves) return false;
+    }
+    return true;
+}
+
+
+template <typename A>
+static void permute(A *__restrict__ array, const int *__restrict__ order,
+                    A *__restrict__ buffer, const int n)
+{
+    #pragma omp parallel for
+    for (int i = 0; i < n; i++)
+        buffer[i] = array[order[i]];
+    memcpy(array, buffer, n * sizeof(A));
+}
+
+
+template <typename T>
+static void sort_particles_t(T *__restrict__ dt, T *__restrict__ dE,
+                             long *__restrict__ id, const int n)
+{
+    int descents = 0;
+    #pragma omp parallel for reduction(+:descents)
+    for (int i = 1; i < n; i++)
+        descents += dt[i] < dt[i - 1];
+
+    if (descents == 0)
+        return;
+    if (descents <= n / MAX_DESCENT_RATIO && insertion_sort(dt, dE, id, n))
+        return;
+
+    // Full sort of the permutation, then gather the coordinates
+    int *order = (int *) workspace_acquire(n * sizeof(int));
+    std::iota(order, order + n, 0);
+    auto compare = [dt](const int a, const int b) { return dt[a] < dt[b]; };
+#ifdef PARALLEL
+    __gnu_parallel::sort(order, order + n, compare);
+#else
+    std::sort(order, order + n, compare);
+#endif
+
+    void *buffer = workspace_acquire(n * sizeof(long));
+    permute(dt, order, (T *) buffer, n);
+    permute(dE, order, (T *) buffer, n);
+    if (id) permute(id, order, (long *) buffer, n);
+
+    workspace_return(buffer);
+    workspace_return(order);
+}
+
+
+extern "C" {
+
+    /*
+    Sorts the particles with respect to dt, in place. dE and id (if not
+    NULL) are permuted with dt, so that id keeps track of the particles.
+    */
+    void sort_particles(double *__restrict__ beam_dt,
+                        double *__restrict__ beam_dE,
+                        long *__restrict__ beam_id,
+                        const int n_macroparticles)
+    {
+        sort_particles_t(beam_dt, beam_dE, beam_id, n_macroparticles);
+    }
+
+    void sort_particlesf(float *__restrict__ beam_dt,
+                         float *__restrict__ beam_dE,
+                         long *__restrict__ beam_id,
+                         const int n_macroparticles)
+    {
+        sort_particles_t(beam_dt, beam_dE, beam_id, n_macroparticles);
+    }
+
+}
@@ -0,0 +1,22 @@
+/*
+ * sort_particles.h
+ *
+ *  In-place sorting of the particles with respect to dt, for the routines
+ *  that need a time-ordered beam.
+ */
+
+#ifndef INCLUDE_SORT_PARTICLES_H_
+#define INCLUDE_SORT_PARTICLES_H_
+
+extern "C" {
+    void sort_particles(double *__restrict__ beam_dt,
+                        double *__restrict__ beam_dE,
+                        long *__restrict__ beam_id,
+                        const int n_macroparticles);
+    void sort_particlesf(float *__restrict__ beam_dt,
+                         float *__restrict__ beam_dE,
+                         long *__restrict__ beam_id,
+                         const int n_macroparticles);
+}
+
+#endif /* INCLUDE_SORT_PARTICLES_H_ */
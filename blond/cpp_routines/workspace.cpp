@@ -0,0 +1,125 @@
+/*
+Copyright 2016 CERN. This software is distributed under the
+terms of the GNU General Public Licence version 3 (GPL Version 3),
+copied verbatim in the file LICENCE.md.
+In applying this licence, CERN does not waive the privileges and immunities
+granted to it by virtue of its status as an Intergovernmental Organization or
+submit itself to any jurisdiction.
+Project website: http://blond.web.cern.ch/
+*/
+
+// Pool of scratch buffers shared by the histogram and kick routines.
+// The pool is protected by a mutex, so independent callers (several
+// Profile objects, different slice counts, Python threads) never share a
+// buffer. The buffers stay in the pool until explicitly released.
+// Author: Konstantinos Iliakis
+
+#include <stdlib.h>
+#include <map>
+#include <mutex>
+#include "common.h"
+#include "workspace.h"
+
+static std::mutex pool_mutex;
+// free buffers, keyed by size in bytes
+static std::multimap<size_t, void *> free_buffers;
+// buffers handed out by workspace_acquire and their size in bytes
+static std::map<void *, size_t> used_buffers;
+
+
+static size_t workspace_n_bytes(const int n, const int size, const int threads)
+{
+    // threads <= 0 means one slot per OpenMP thread
+    const int n_threads = threads > 0 ? threads : omp_get_max_threads();
+    return (size_t) n * (size_t) size * (size_t) n_threads;
+}
+
+
+void *workspace_acquire(const size_t n_bytes)
+{
+    std::lock_guard<std::mutex> lock(pool_mutex);
+    void *buffer;
+    auto it = free_buffers.find(n_bytes);
+    if (it != free_buffers.end()) {
+        buffer = it->second;
+        free_buffers.erase(it);
+    } else {
+        buffer = malloc(n_bytes > 0 ? n_bytes : 1);
+    }
+    used_buffers[buffer] = n_bytes;
+    return buffer;
+}
+
+
+void workspace_return(void *buffer)
+{
+    std::lock_guard<std::mutex> lock(pool_mutex);
+    auto it = used_buffers.find(buffer);
+    if (it == used_buffers.end()) return;
+    free_buffers.insert(std::make_pair(it->second, buffer));
+    used_buffers.erase(it);
+}
+
+
+// Reserve a free buffer of n elements of size bytes per thread
+extern "C" void workspace_allocate(const int n, const int size,
+                                   const int threads)
+{
+    const size_t n_bytes = workspace_n_bytes(n, size, threads);
+    std::lock_guard<std::mutex> lock(pool_mutex);
+    if (free_buffers.find(n_bytes) == free_buffers.end())
+        free_buffers.insert(std::make_pair(n_bytes, malloc(n_bytes > 0 ? n_bytes : 1)));
+}
+
+
+// Release the free buffers of n elements; n <= 0 releases all free buffers
+extern "C" void workspace_release(const int n, const int size,
+                                  const int threads)
+{
+    std::lock_guard<std::mutex> lock(pool_mutex);
+    if (n <= 0) {
+        for (auto &it : free_buffers)
+            free(it.second);
+        free_buffers.clear();
+        return;
+    }
+    const size_t n_bytes = workspace_n_bytes(n, size, threads);
+    auto range = free_buffers.equal_range(n_bytes);
+    for (auto it = range.first; it != range.second; ++it)
+        free(it->second);
+    free_buffers.erase(range.first, range.second);
+}
+
+
+// Replace a reservation of old_n elements with one of new_n elements
+extern "C" void workspace_resize(const int old_n, const int new_n,
+                                 const int size, const int threads)
+{
+    if (old_n == new_n) {
+        workspace_allocate(new_n, size, threads);
+        return;
+    }
+    if (old_n > 0) {
+        const size_t n_bytes = workspace_n_bytes(old_n, size, threads);
+        std::lock_guard<std::mutex> lock(pool_mutex);
+        auto it = free_buffers.find(n_bytes);
+        if (it != free_buffers.end()) {
+            free(it->second);
+            free_buffers.erase(it);
+        }
+    }
+    workspace_allocate(new_n, size, threads);
+}
+
+
+// Total bytes held by the pool, free and in use
+extern "C" long workspace_bytes()
+{
+    std::lock_guard<std::mutex> lock(pool_mutex);
+    size_t total = 0;
+    for (auto &it : free_buffers)
+        total += it.first;
+    for (auto &it : used_buffers)
+        total += it.second;
+    return (long) total;
+}
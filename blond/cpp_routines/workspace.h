@@ -0,0 +1,28 @@
+/*
+ * workspace.h
+ *
+ *  Pool of reusable scratch buffers for the libblond routines.
+ *  Buffers are keyed by their size in bytes; a routine acquires a buffer
+ *  for the duration of a call and returns it to the pool afterwards.
+ */
+
+#ifndef INCLUDE_WORKSPACE_H_
+#define INCLUDE_WORKSPACE_H_
+
+#include <stddef.h>
+
+// Get a buffer of exactly n_bytes, from the pool if one is free
+void *workspace_acquire(const size_t n_bytes);
+
+// Give back to the pool a buffer taken with workspace_acquire
+void workspace_return(void *buffer);
+
+extern "C" {
+    void workspace_allocate(const int n, const int size, const int threads);
+    void workspace_resize(const int old_n, const int new_n, const int size,
+                          const int threads);
+    void workspace_release(const int n, const int size, const int threads);
+    long workspace_bytes();
+}
+
+#endif /* INCLUDE_WORKSPACE_H_ */
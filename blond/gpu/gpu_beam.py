@@ -121,7 +121,8 @@ class gpu_Beam(Beam):
         self.id_obj.invalidate_cpu()
 
 
-    def statistics(self):
+    def statistics(self, n_bunches=None, bunch_spacing_buckets=1,
+                   bucket_size_tau=None, shiftX=0):
         ones_sum = sum_non_zeros(self.dev_id).get()
         # print(self.dev_id.dtype)
         self.ones_sum = ones_sum
@@ -133,4 +134,26 @@ class gpu_Beam(Beam):
 
         self.epsn_rms_l = np.pi*self.sigma_dE*self.sigma_dt  # in eVs
 
+        # As bm.beam_statistics, for gather_statistics; min and max are not
+        # computed
+        self._statistics = np.array(
+            [ones_sum, self.n_macroparticles - ones_sum,
+             self.mean_dt, self.sigma_dt**2 * ones_sum, np.nan, np.nan,
+             self.mean_dE, self.sigma_dE**2 * ones_sum, np.nan, np.nan],
+            dtype=np.float64)
+
+        # The statistics of every bunch are computed on the host copy
+        if n_bunches is None:
+            self._bunch_statistics = None
+        else:
+            if bucket_size_tau is None:
+                # BucketSizeError
+                raise RuntimeError("ERROR in Beam.statistics: " +
+                                   "bucket_size_tau is required with " +
+                                   "n_bunches")
+            self._bunch_statistics = bm.bunch_statistics(
+                self.dt, self.dE, self.id, n_bunches, bunch_spacing_buckets,
+                bucket_size_tau, t_offset=shiftX)
+            self._set_bunch_statistics(self._bunch_statistics)
+
 
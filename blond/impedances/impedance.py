@@ -21,6 +21,7 @@ import numpy as np
 from scipy.constants import e
 from ..toolbox.next_regular import next_regular
 from ..utils import bmath as bm
+from ..beam.sparse_slices import SparseProfile
 
 try:
     from pyprof import timing
@@ -59,6 +60,12 @@ class TotalInducedVoltage(object):
         Array to store the computed induced voltage [V]
     time_array : float array
     Time array corresponding to induced_voltage [s]
+    fused_impedances : dict
+        Sum of the impedances of the one-turn InducedVoltageTime and
+        InducedVoltageFreq objects, per number of points of the FFT. The
+        induced_voltage of these objects is not computed by
+        induced_voltage_sum and is set to None; their
+        induced_voltage_generation() computes it on demand
     """
 
 
@@ -83,6 +90,9 @@ class TotalInducedVoltage(object):
         
         self.time_array = self.profile.bin_centers
 
+        # Impedances summed per n_fft and the buffers of the FFTs
+        self.fuse_impedances()
+
 
     
     def use_gpu(self):
@@ -109,7 +119,44 @@ class TotalInducedVoltage(object):
         for induced_voltage_object in self.induced_voltage_list:
             induced_voltage_object.process()
 
-    
+        self.fuse_impedances()
+
+    def fuse_impedances(self):
+        """
+        Sums the impedances of the one-turn InducedVoltageTime and
+        InducedVoltageFreq objects sharing the same n_fft, so that their
+        induced voltage is computed with one multiplication and one inverse
+        FFT per turn. The induced_voltage of the fused objects is set to None
+        until their induced_voltage_generation() is called. The other objects
+        (multi-turn wake, inductive impedance, resonators) are computed
+        separately. To be run when the impedances change.
+        """
+
+        self.fused_impedances = {}
+        self._fused_objects = []
+        self._fused_buffers = {}
+        self._separate_objects = []
+        for obj in self.induced_voltage_list:
+            if (type(obj) in [InducedVoltageTime, InducedVoltageFreq]) \
+                    and (not obj.multi_turn_wake):
+                if obj.n_fft in self.fused_impedances:
+                    self.fused_impedances[obj.n_fft] = \
+                        self.fused_impedances[obj.n_fft] + obj.total_impedance
+                else:
+                    self.fused_impedances[obj.n_fft] = obj.total_impedance
+                # Not updated by induced_voltage_sum, rather than stale
+                obj.induced_voltage = None
+                self._fused_objects.append(obj)
+            else:
+                self._separate_objects.append(obj)
+
+        for n_fft in self.fused_impedances:
+            self.fused_impedances[n_fft] = np.ascontiguousarray(
+                self.fused_impedances[n_fft], dtype=bm.precision.complex_t)
+            self._fused_buffers[n_fft] = (
+                np.empty(n_fft//2 + 1, dtype=bm.precision.complex_t),
+                np.empty(2*(n_fft//2), dtype=bm.precision.real_t))
+
     def induced_voltage_sum(self):
         """
         Method to sum all the induced voltages in one single array.
@@ -117,7 +164,11 @@ class TotalInducedVoltage(object):
         # For MPI, to avoid calulating beam spectrum multiple times
         beam_spectrum_dict = {}
         temp_induced_voltage = 0
-        for induced_voltage_object in self.induced_voltage_list:
+        for n_fft, impedance in self.fused_impedances.items():
+            temp_induced_voltage += \
+                self._fused_induced_voltage(n_fft, impedance,
+                                            beam_spectrum_dict)
+        for induced_voltage_object in self._separate_objects:
             induced_voltage_object.induced_voltage_generation(
                 beam_spectrum_dict)
             temp_induced_voltage += \
@@ -126,6 +177,23 @@ class TotalInducedVoltage(object):
         self.induced_voltage = temp_induced_voltage.astype(
             dtype=bm.precision.real_t, order='C', copy=False)
 
+    def _fused_induced_voltage(self, n_fft, impedance, beam_spectrum_dict):
+        # Induced voltage of the impedances summed for n_fft, computed in the
+        # buffers of fuse_impedances
+        spectrum, voltage = self._fused_buffers[n_fft]
+        if n_fft not in beam_spectrum_dict:
+            self.profile.beam_spectrum_generation(n_fft)
+            beam_spectrum_dict[n_fft] = self.profile.beam_spectrum
+
+        with timing.timed_region('serial:indVolt1Turn'):
+            np.multiply(impedance, beam_spectrum_dict[n_fft], out=spectrum)
+            if bm.fftwMode():
+                bm.irfft(spectrum, len(voltage), result=voltage)
+            else:
+                voltage = bm.irfft(spectrum)
+            return - (self.beam.Particle.charge * e * self.beam.ratio *
+                      voltage[:self.profile.n_slices])
+
     # Can be faster than the normal induced voltage sum
     def induced_voltage_sum_packed(self):
         """
@@ -161,7 +229,11 @@ class TotalInducedVoltage(object):
         self.induced_voltage_sum()
 
         with timing.timed_region('comp:LIKick'):    
-            if (bm.gpuMode()):
+            if isinstance(self.profile, SparseProfile):
+                self.profile.linear_interp_kick(
+                    self.beam.dt, self.beam.dE, self.induced_voltage,
+                    self.beam.Particle.charge, 0.0)
+            elif (bm.gpuMode()):
                 bm.linear_interp_kick(dev_voltage=self.dev_induced_voltage,
                                   dev_bin_centers=self.profile.dev_bin_centers,
                                   charge=self.beam.Particle.charge,
@@ -565,6 +637,146 @@ class InducedVoltageTime(_InducedVoltage):
             
 
 
+class InducedVoltageSparse(_InducedVoltage):
+    r"""
+    Induced voltage of a SparseProfile derived from the sum of several wakes,
+    computed block by block: the induced voltage in a window is the sum of
+    the convolutions of the profiles of the same and of the previous windows
+    with the part of the wake at their distance. The empty gaps between the
+    windows are never transformed.
+
+    Parameters
+    ----------
+    Beam : object
+        Beam object
+    Profile : object
+        SparseProfile object
+    wake_source_list : list
+        Wake sources list (e.g. list of Resonator objects)
+    wake_length : float, optional
+        Wake length [s]; by default from the first to the last window.
+        Windows further apart than the wake length are not coupled
+    wake_tolerance : float, optional
+        The wake is cut after the last point where it is above
+        wake_tolerance times its maximum, so that only the windows within
+        its reach are coupled; 0 keeps the whole wake length. Default is
+        1e-10
+
+    Attributes
+    ----------
+    wake_source_list : list
+        Wake sources list (e.g. list of Resonator objects)
+    n_fft : int
+        Number of points of the FFT of every window
+    lag_impedances : complex array
+        Pseudo-impedance of the part of the wake coupling two windows, for
+        every distance between the windows, of shape [n_lags, n_fft//2+1]
+    """
+
+    def __init__(self, Beam, Profile, wake_source_list, wake_length=None,
+                 wake_tolerance=1e-10):
+
+        # Wake sources list (e.g. list of Resonator objects)
+        self.wake_source_list = wake_source_list
+
+        # Relative level below which the end of the wake is cut
+        self.wake_tolerance = wake_tolerance
+
+        # Call the __init__ method of the parent class [calls process()]
+        _InducedVoltage.__init__(self, Beam, Profile, wake_length=wake_length)
+
+    def process(self):
+        """
+        Reprocess the wake contributions. To be run when profile changes
+        """
+
+        n_slices = self.profile.window_slices
+        offsets = self.profile.window_offsets.astype(int)
+        n_windows = len(offsets)
+
+        if self.wake_length_input is None:
+            self.n_induced_voltage = offsets[-1] + n_slices
+        else:
+            self.n_induced_voltage = int(np.ceil(self.wake_length_input /
+                                                 self.profile.bin_size))
+
+        # Reach of the wake, from the wake at every distance up to its length
+        if self.wake_tolerance > 0:
+            time = np.arange(self.n_induced_voltage) * self.profile.bin_size
+            wake = np.zeros(self.n_induced_voltage, dtype=float)
+            for wake_object in self.wake_source_list:
+                wake_object.wake_calc(time)
+                wake += wake_object.wake
+            above = np.nonzero(np.abs(wake) > self.wake_tolerance *
+                               np.max(np.abs(wake)))[0]
+            if len(above) > 0:
+                self.n_induced_voltage = above[-1] + 1
+        self.wake_length = self.n_induced_voltage * self.profile.bin_size
+
+        # Linear convolution of a window with 2*n_slices-1 wake points
+        self.n_fft = next_regular(2 * n_slices - 1)
+
+        # Pairs of (target, source) windows coupled by the wake, sorted by
+        # target, and their distance in bins
+        target, source = np.nonzero(np.tril(np.ones((n_windows, n_windows),
+                                                    dtype=bool)))
+        lag = offsets[target] - offsets[source]
+        coupled = lag - (n_slices - 1) < self.n_induced_voltage
+        self._target = target[coupled]
+        self._source = source[coupled]
+        lags, self._lag_index = np.unique(lag[coupled], return_inverse=True)
+        self._target_start = np.searchsorted(self._target,
+                                             np.arange(n_windows))
+
+        # Wake at the distances lag-(n_slices-1) ... lag+(n_slices-1) bins
+        distance = lags[:, None] + np.arange(-(n_slices - 1), n_slices)
+        inside = (distance >= 0) & (distance < self.n_induced_voltage)
+        time = distance[inside] * self.profile.bin_size
+        wake = np.zeros(distance.shape, dtype=float)
+        for wake_object in self.wake_source_list:
+            wake_object.wake_calc(time)
+            wake[inside] += wake_object.wake
+
+        self.lag_impedances = np.fft.rfft(wake, self.n_fft, axis=1)
+
+        # Impedance of every coupled pair and the buffers of the spectra
+        self._pair_impedances = self.lag_impedances[self._lag_index]
+        self._pair_spectrum = np.empty(self._pair_impedances.shape,
+                                       dtype=complex)
+        self._window_spectrum = np.empty((n_windows, self.n_fft//2 + 1),
+                                         dtype=complex)
+
+        self.multi_turn_wake = False
+        self.induced_voltage_generation = self.induced_voltage_1turn
+
+    def induced_voltage_1turn(self, beam_spectrum_dict={}):
+        """
+        Method to calculate the induced voltage in all windows at the current
+        turn.
+        """
+        if self.n_fft not in beam_spectrum_dict:
+            self.profile.beam_spectrum_generation(self.n_fft)
+            beam_spectrum_dict[self.n_fft] = self.profile.beam_spectrum
+
+        beam_spectrum = beam_spectrum_dict[self.n_fft]
+        n_slices = self.profile.window_slices
+
+        with timing.timed_region('serial:indVoltSparse'):
+            np.take(beam_spectrum, self._source, axis=0,
+                    out=self._pair_spectrum)
+            np.multiply(self._pair_spectrum, self._pair_impedances,
+                        out=self._pair_spectrum)
+            np.add.reduceat(self._pair_spectrum, self._target_start, axis=0,
+                            out=self._window_spectrum)
+            induced_voltage = np.fft.irfft(self._window_spectrum, self.n_fft,
+                                           axis=1)[:, n_slices-1:2*n_slices-1]
+            induced_voltage = - (self.beam.Particle.charge * e *
+                                 self.beam.ratio * induced_voltage)
+
+        self.induced_voltage = induced_voltage.reshape(-1).astype(
+            dtype=bm.precision.real_t, order='C', copy=False)
+
+
 class InducedVoltageFreq(_InducedVoltage):
     r"""
     Induced voltage derived from the sum of several impedances
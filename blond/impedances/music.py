@@ -141,10 +141,8 @@ class Music(object):
         >>> music_cpp.track_cpp()
 
         """
-        bm.music_track(self.beam.dt, self.beam.dE, self.induced_voltage,
-                       self.array_parameters, self.alpha, self.omega_bar,
-                       self.const, self.coeff1, self.coeff2, self.coeff3,
-                       self.coeff4)
+        self.beam.sort_particles()
+        bm.music_track(self)
 
     def track_cpp_multi_turn(self):
         r"""
@@ -164,10 +162,8 @@ class Music(object):
         >>>     music_cpp.track_cpp_multi_turn()
 
         """
-        bm.music_track_multiturn(self.beam.dt, self.beam.dE, self.induced_voltage,
-                                 self.array_parameters, self.alpha, self.omega_bar,
-                                 self.const, self.coeff1, self.coeff2, self.coeff3,
-                                 self.coeff4)
+        self.beam.sort_particles()
+        bm.music_track_multiturn(self)
 
     def track_py(self):
         r"""
@@ -185,9 +181,7 @@ class Music(object):
 
         """
 
-        indices_sorted = np.argsort(self.beam.dt)
-        self.beam.dt = self.beam.dt[indices_sorted]
-        self.beam.dE = self.beam.dE[indices_sorted]
+        self.beam.sort_particles()
         self.beam.dE[0] += self.induced_voltage[0]
         self.input_first_component = 1
         self.input_second_component = 0
@@ -234,9 +228,7 @@ class Music(object):
 
         """
 
-        indices_sorted = np.argsort(self.beam.dt)
-        self.beam.dt = self.beam.dt[indices_sorted]
-        self.beam.dE = self.beam.dE[indices_sorted]
+        self.beam.sort_particles()
         time_difference_0 = self.beam.dt[0] + self.t_rev - self.last_dt
         exp_term = np.exp(-self.alpha * time_difference_0)
         cos_term = np.cos(self.omega_bar * time_difference_0)
@@ -283,9 +275,7 @@ class Music(object):
 
         """
 
-        indices_sorted = np.argsort(self.beam.dt)
-        self.beam.dt = self.beam.dt[indices_sorted]
-        self.beam.dE = self.beam.dE[indices_sorted]
+        self.beam.sort_particles()
         self.beam.dE[0] += self.induced_voltage[0]
         self.induced_voltage[1:] = 0
 
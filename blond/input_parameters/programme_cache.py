@@ -0,0 +1,103 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**On-disk cache of the preprocessed turn programmes**
+
+:Authors: **Konstantinos Iliakis**
+'''
+
+from __future__ import division
+from builtins import str
+import hashlib
+import os
+import numpy as np
+
+
+def programme_hash(*items):
+    r"""Function returning a hash of the items (numbers, strings, arrays and
+    nested tuples/lists of them) the preprocessed programme depends on.
+
+    """
+
+    sha = hashlib.sha1()
+
+    def update(item):
+        if isinstance(item, (tuple, list)):
+            sha.update(('%s%d(' % (type(item).__name__, len(item))).encode())
+            for sub_item in item:
+                update(sub_item)
+            sha.update(b')')
+        elif isinstance(item, np.ndarray):
+            item = np.ascontiguousarray(item)
+            sha.update(('array%s%s' % (item.dtype.str,
+                                       item.shape)).encode())
+            sha.update(item.tobytes())
+        else:
+            sha.update(('%s:%r;' % (type(item).__name__, item)).encode())
+
+    for item in items:
+        update(item)
+
+    return sha.hexdigest()
+
+
+def cacheable(input_data, n_rows):
+    r"""Function checking whether the input data is worth caching: programmes
+    given as (time, data) or turn by turn, but not single values per row.
+
+    """
+
+    if isinstance(input_data, tuple):
+        return True
+    elif isinstance(input_data, (np.ndarray, list)):
+        try:
+            return np.asarray(input_data).size > n_rows
+        except ValueError:
+            return False
+    return False
+
+
+def load_programme(cache_dir, name, key, compute):
+    r"""Function returning the programme stored in cache_dir under the given
+    name and key, memory-mapped read-only. If not found, the programme is
+    computed with compute() and stored first. The file is written under a
+    temporary name and renamed, so that several processes can fill the cache
+    at the same time.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory of the cache, created if needed
+    name : str
+        Prefix of the file name
+    key : str
+        Hash of the inputs of the programme, see programme_hash()
+    compute : function
+        Function without arguments returning the programme
+
+    Returns
+    -------
+    float array
+        Read-only memory map of the programme
+
+    """
+
+    file_name = os.path.join(cache_dir, '%s_%s.npy' % (name, key))
+
+    if not os.path.isfile(file_name):
+        output_data = np.asarray(compute())
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_name = '%s.%d.tmp' % (file_name, os.getpid())
+        with open(tmp_name, 'wb') as tmp_file:
+            np.save(tmp_file, output_data)
+        os.replace(tmp_name, file_name)
+
+    return np.load(file_name, mmap_mode='r')
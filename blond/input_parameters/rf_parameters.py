@@ -15,11 +15,13 @@
 
 from __future__ import division, print_function
 from builtins import str, range, object
+import copy
 import numpy as np
 from scipy.constants import c
 from scipy.integrate import cumtrapz
 from ..beam.beam import Proton
 from ..input_parameters.rf_parameters_options import RFStationOptions
+from ..input_parameters.turn_window import TurnWindow, windowed_reshape
 from ..utils import bmath as bm
 
 
@@ -258,51 +260,15 @@ class RFStation(object):
             setattr(self, "eta_%s" % i, dummy[self.section_index])
             dummy = getattr(Ring, 'alpha_' + str(i))
             setattr(self, "alpha_%s" % i, dummy[self.section_index])
-        self.sign_eta_0 = np.sign(self.eta_0)
 
-        # Reshape input rf programs
-        # Reshape design harmonic
-        self.harmonic = RFStationOptions.reshape_data(harmonic,
-                                                      self.n_turns,
-                                                      self.n_rf,
-                                                      Ring.cycle_time,
-                                                      Ring.RingOptions.t_start)
-        self.harmonic = self.harmonic.astype(bm.precision.real_t, order='C', copy=False)
-
-        # Reshape design voltage
-        self.voltage = RFStationOptions.reshape_data(voltage,
-                                                     self.n_turns,
-                                                     self.n_rf,
-                                                     Ring.cycle_time,
-                                                     Ring.RingOptions.t_start)
-        self.voltage = self.voltage.astype(bm.precision.real_t, order='C', copy=False)
-        # Checking if the RFStation is empty
-        if np.sum(self.voltage) == 0:
-            self.empty = True
+        # Programmes computed on demand, in windows of turns
+        self.window = Ring.window
+        if self.window is not None:
+            self.windowed_programmes(Ring, harmonic, voltage, phi_rf_d,
+                                     omega_rf, RFStationOptions)
         else:
-            self.empty = False
-
-        # Reshape design phase
-        self.phi_rf_d = RFStationOptions.reshape_data(phi_rf_d,
-                                                      self.n_turns,
-                                                      self.n_rf,
-                                                      Ring.cycle_time,
-                                                      Ring.RingOptions.t_start)
-
-        # Calculating design rf angular frequency
-        if omega_rf is None:
-            self.omega_rf_d = 2.*np.pi*self.beta*c*self.harmonic / \
-                (self.ring_circumference)
-        else:
-            self.omega_rf_d = RFStationOptions.reshape_data(
-                omega_rf,
-                self.n_turns,
-                self.n_rf,
-                Ring.cycle_time,
-                Ring.RingOptions.t_start)
-        self.omega_rf_d = self.omega_rf_d.astype(bm.precision.real_t, order='C', copy=False)
-        # print("omega_rf_d[0]: {}".format(self.omega_rf_d[0]))
-
+            self.reshape_programmes(Ring, harmonic, voltage, phi_rf_d,
+                                    omega_rf, RFStationOptions)
 
         # Reshape phase noise
         if phi_noise is not None:
@@ -339,7 +305,8 @@ class RFStation(object):
                     system = system[0]
                     
                 pMod.calc_modulation()
-                pMod.calc_delta_omega((Ring.cycle_time, self.omega_rf_d[system]))
+                pMod.calc_delta_omega((Ring.cycle_time,
+                                       np.asarray(self.omega_rf_d[system])))
                 dPhiInput, dOmegaInput =  pMod.extend_to_n_rf(self.harmonic[:,0])
                 dPhi += RFStationOptions.reshape_data(dPhiInput,
                                                      self.n_turns,
@@ -362,10 +329,61 @@ class RFStation(object):
             self.dev_phi_modulation = None
 
 
+        # Accumulated phase offset of the rf programs used for tracking
+        self.dphi_rf = np.zeros(self.n_rf).astype(bm.precision.real_t)
+
+    def reshape_programmes(self, Ring, harmonic, voltage, phi_rf_d, omega_rf,
+                           RFStationOptions):
+        """ Function to reshape the rf programmes for all the turns and to
+        compute the programmes derived from them.
+        """
+
+        self.sign_eta_0 = np.sign(self.eta_0)
+
+        # Reshape design harmonic
+        self.harmonic = RFStationOptions.reshape_data(harmonic,
+                                                      self.n_turns,
+                                                      self.n_rf,
+                                                      Ring.cycle_time,
+                                                      Ring.RingOptions.t_start)
+        self.harmonic = self.harmonic.astype(bm.precision.real_t, order='C', copy=False)
+
+        # Reshape design voltage
+        self.voltage = RFStationOptions.reshape_data(voltage,
+                                                     self.n_turns,
+                                                     self.n_rf,
+                                                     Ring.cycle_time,
+                                                     Ring.RingOptions.t_start)
+        self.voltage = self.voltage.astype(bm.precision.real_t, order='C', copy=False)
+        # Checking if the RFStation is empty
+        if np.sum(self.voltage) == 0:
+            self.empty = True
+        else:
+            self.empty = False
+
+        # Reshape design phase
+        self.phi_rf_d = RFStationOptions.reshape_data(phi_rf_d,
+                                                      self.n_turns,
+                                                      self.n_rf,
+                                                      Ring.cycle_time,
+                                                      Ring.RingOptions.t_start)
+
+        # Calculating design rf angular frequency
+        if omega_rf is None:
+            self.omega_rf_d = 2.*np.pi*self.beta*c*self.harmonic / \
+                (self.ring_circumference)
+        else:
+            self.omega_rf_d = RFStationOptions.reshape_data(
+                omega_rf,
+                self.n_turns,
+                self.n_rf,
+                Ring.cycle_time,
+                Ring.RingOptions.t_start)
+        self.omega_rf_d = self.omega_rf_d.astype(bm.precision.real_t, order='C', copy=False)
+
         # Copy of the desing rf programs in the one used for tracking
         # and that can be changed by feedbacks
         self.phi_rf = np.array(self.phi_rf_d).astype(bm.precision.real_t)
-        self.dphi_rf = np.zeros(self.n_rf).astype(bm.precision.real_t)
         self.omega_rf = np.array(self.omega_rf_d).astype(bm.precision.real_t)
         self.t_rf = 2*np.pi / self.omega_rf
 
@@ -374,6 +392,101 @@ class RFStation(object):
         self.Q_s = calculate_Q_s(self, self.Particle)
         self.omega_s0 = self.Q_s*Ring.omega_rev
 
+    def windowed_programmes(self, Ring, harmonic, voltage, phi_rf_d,
+                            omega_rf, RFStationOptions):
+        """ Function to replace the rf programmes and the programmes derived
+        from them by TurnWindow objects, computed on demand for Ring.window
+        turns at a time.
+        """
+
+        n_points = self.n_turns + 1
+        self._ring = Ring
+        self._window_cache = {}
+
+        self._generators = {}
+        for name, data in [('harmonic', harmonic), ('voltage', voltage),
+                           ('phi_rf_d', phi_rf_d), ('omega_rf_d', omega_rf)]:
+            if data is not None:
+                self._generators[name] = windowed_reshape(
+                    RFStationOptions.reshape_data, data, self.n_turns,
+                    self.n_rf, Ring.cycle_time, Ring.RingOptions.t_start)
+
+        # Checking if the RFStation is empty
+        total_voltage = 0
+        for start in range(0, n_points, self.window):
+            stop = min(start + self.window, n_points)
+            total_voltage += np.sum(self._generators['voltage'](start, stop))
+        if total_voltage == 0:
+            self.empty = True
+        else:
+            self.empty = False
+
+        def window_generator(name):
+            return lambda start, stop: \
+                getattr(self.programme_window(start, stop), name)
+
+        for name in ['harmonic', 'voltage', 'phi_rf_d', 'omega_rf_d',
+                     'phi_rf', 'omega_rf', 't_rf']:
+            setattr(self, name, TurnWindow(window_generator(name),
+                                           (self.n_rf, n_points),
+                                           self.window))
+        for name in ['sign_eta_0', 'phi_s', 'Q_s', 'omega_s0']:
+            setattr(self, name, TurnWindow(window_generator(name),
+                                           (n_points, ), self.window))
+
+    def programme_window(self, start, stop):
+        """ Function returning a copy of the RFStation object of which the
+        rf programmes and the programmes derived from them cover only the
+        turns [start, stop). The last windows are kept in a small cache.
+        """
+
+        if (start, stop) in self._window_cache:
+            return self._window_cache[(start, stop)]
+
+        # The synchronous phase of a turn depends on the next turn
+        n_points = self.n_turns + 1
+        stop_ext = min(stop + 1, n_points)
+        start_ext = max(0, min(start, stop_ext - 2))
+        ring = self._ring.programme_window(start_ext, stop_ext)
+
+        window = copy.copy(self)
+        for name in ['beta', 'energy', 'delta_E', 'eta_0', 'eta_1', 'eta_2']:
+            setattr(window, name, getattr(ring, name)[self.section_index])
+        window.sign_eta_0 = np.sign(window.eta_0)
+
+        for name in ['harmonic', 'voltage', 'phi_rf_d']:
+            setattr(window, name, self._generators[name](
+                start_ext, stop_ext).astype(bm.precision.real_t, order='C',
+                                            copy=False))
+        if 'omega_rf_d' in self._generators:
+            window.omega_rf_d = self._generators['omega_rf_d'](
+                start_ext, stop_ext)
+        else:
+            window.omega_rf_d = 2.*np.pi*window.beta*c*window.harmonic / \
+                (self.ring_circumference)
+        window.omega_rf_d = window.omega_rf_d.astype(bm.precision.real_t,
+                                                     order='C', copy=False)
+
+        window.phi_rf = np.array(window.phi_rf_d).astype(bm.precision.real_t)
+        window.omega_rf = np.array(
+            window.omega_rf_d).astype(bm.precision.real_t)
+        window.t_rf = 2*np.pi / window.omega_rf
+
+        window.phi_s = calculate_phi_s(window, self.Particle)
+        window.Q_s = calculate_Q_s(window, self.Particle)
+        window.omega_s0 = window.Q_s*ring.omega_rev
+
+        # Back to the turns [start, stop)
+        turns = slice(start - start_ext, stop - start_ext)
+        for name in ['harmonic', 'voltage', 'phi_rf_d', 'omega_rf_d',
+                     'phi_rf', 'omega_rf', 't_rf', 'sign_eta_0', 'phi_s',
+                     'Q_s', 'omega_s0']:
+            setattr(window, name, getattr(window, name)[..., turns])
+
+        if len(self._window_cache) >= 4:
+            self._window_cache.pop(next(iter(self._window_cache)))
+        self._window_cache[(start, stop)] = window
+        return window
 
     def use_gpu(self):
         from ..gpu.cpu_gpu_array import CGA
@@ -20,6 +20,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.interpolate import splrep, splev
 from ..plots.plot import fig_folder
+from ..input_parameters.programme_cache import programme_hash, load_programme, \
+    cacheable
 from ..utils import bmath as bm
 
 
@@ -43,11 +45,16 @@ class RFStationOptions(object):
         will have figures with different indices
     sampling : int
         Decimation value for plotting; default is 1
+    cache_dir : str
+        Directory where the rf programmes given as (time, data) or turn by
+        turn are stored as .npy files, keyed by a hash of the inputs, and
+        from where they are loaded memory-mapped on the next runs; default is
+        None (no cache)
 
     """
 
     def __init__(self, interpolation='linear', smoothing=0, plot=False,
-                 figdir='fig', figname=['data'], sampling=1):
+                 figdir='fig', figname=['data'], sampling=1, cache_dir=None):
 
         if interpolation in ['linear', 'cubic']:
             self.interpolation = str(interpolation)
@@ -76,6 +83,8 @@ class RFStationOptions(object):
             raise RuntimeError("ERROR: sampling value in PreprocessRamp" +
                                " not recognised. Aborting...")
 
+        self.cache_dir = cache_dir if cache_dir is None else str(cache_dir)
+
     def reshape_data(self, input_data, n_turns, n_rf, interp_time,
                      t_start=0):
         r"""Checks whether the user input is consistent with the expectation
@@ -111,6 +120,27 @@ class RFStationOptions(object):
 
         """
 
+        # Programmes interpolated or given turn by turn are read from the
+        # cache
+        if (self.cache_dir is not None) and (not self.plot) and \
+                cacheable(input_data, n_rf):
+            key = programme_hash(
+                'RFStation', bm.precision.real_t.__name__, input_data,
+                n_turns, n_rf, interp_time, t_start, self.interpolation,
+                self.smoothing)
+            return load_programme(
+                self.cache_dir, 'rf', key,
+                lambda: self._reshape_data(input_data, n_turns, n_rf,
+                                           interp_time, t_start))
+
+        return self._reshape_data(input_data, n_turns, n_rf, interp_time,
+                                  t_start)
+
+    def _reshape_data(self, input_data, n_turns, n_rf, interp_time,
+                      t_start=0):
+        r"""Reshapes the input data, see reshape_data().
+        """
+
         # TO BE IMPLEMENTED: if you pass a filename the function reads the file
         # and reshape the data
         if isinstance(input_data, str):
@@ -14,10 +14,12 @@
 
 from __future__ import division
 from builtins import str, range, object
+import copy
 import numpy as np
 import warnings
 from scipy.constants import c
 from ..input_parameters.ring_options import RingOptions
+from ..input_parameters.turn_window import TurnWindow, windowed_reshape
 from ..utils import bmath as bm
 
 class Ring(object):
@@ -235,16 +237,16 @@ class Ring(object):
                           "program.")
 
         # Derived from momentum
-        self.beta = np.sqrt(1/(1 + (self.Particle.mass/self.momentum)**2))
-        self.gamma = np.sqrt(1 + (self.momentum/self.Particle.mass)**2)
-        self.energy = np.sqrt(self.momentum**2 + self.Particle.mass**2)
-        self.kin_energy = np.sqrt(self.momentum**2 + self.Particle.mass**2) - \
-            self.Particle.mass
-        self.delta_E = np.diff(self.energy, axis=1)
-        self.t_rev = np.dot(self.ring_length, 1/(self.beta*c))
-        self.cycle_time = np.cumsum(self.t_rev)  # Always starts with zero
-        self.f_rev = 1/self.t_rev
-        self.omega_rev = 2*np.pi*self.f_rev
+        self.window = RingOptions.window
+        if self.window is None:
+            self.momentum_programmes()
+            self.cycle_time = np.cumsum(self.t_rev)  # Always starts with zero
+        else:
+            # The revolution period of all the turns at once, as in
+            # momentum_programmes, so that cycle_time matches bit for bit
+            beta = np.sqrt(1/(1 + (self.Particle.mass/self.momentum)**2))
+            self.cycle_time = np.cumsum(np.dot(self.ring_length,
+                                               1/(beta*c)))
 
         # Momentum compaction, checks, and derived slippage factors
         if RingOptions.t_start is None:
@@ -252,6 +254,10 @@ class Ring(object):
         else:
             interp_time = self.cycle_time+RingOptions.t_start
 
+        if self.window is not None:
+            self.windowed_programmes(alpha_0, alpha_1, alpha_2, interp_time)
+            return
+
         self.alpha_0 = RingOptions.reshape_data(
             alpha_0, self.n_turns, self.n_sections,
             interp_time=interp_time)
@@ -284,6 +290,90 @@ class Ring(object):
         # Slippage factor derived from alpha, beta, gamma
         self.eta_generation()
 
+    def momentum_programmes(self):
+        """ Function to calculate the programmes derived from the momentum
+        program: beta, gamma, energy, kinetic energy, energy gain per turn and
+        revolution period, frequency and angular frequency.
+        """
+
+        self.beta = np.sqrt(1/(1 + (self.Particle.mass/self.momentum)**2))
+        self.gamma = np.sqrt(1 + (self.momentum/self.Particle.mass)**2)
+        self.energy = np.sqrt(self.momentum**2 + self.Particle.mass**2)
+        self.kin_energy = np.sqrt(self.momentum**2 + self.Particle.mass**2) - \
+            self.Particle.mass
+        self.delta_E = np.diff(self.energy, axis=1)
+        self.t_rev = np.dot(self.ring_length, 1/(self.beta*c))
+        self.f_rev = 1/self.t_rev
+        self.omega_rev = 2*np.pi*self.f_rev
+
+    def windowed_programmes(self, alpha_0, alpha_1, alpha_2, interp_time):
+        """ Function to replace the programmes derived from the momentum and
+        the momentum compaction programmes by TurnWindow objects, computed on
+        demand for RingOptions.window turns at a time. The momentum and
+        cycle_time programmes are kept for all the turns.
+        """
+
+        n_points = self.n_turns + 1
+        self._window_cache = {}
+
+        self._alpha_generators = []
+        for alpha in [alpha_0, alpha_1, alpha_2]:
+            if alpha is None:
+                self._alpha_generators.append(
+                    lambda start, stop: np.zeros((self.n_sections,
+                                                  stop-start),
+                                                 dtype=bm.precision.real_t))
+            else:
+                self._alpha_generators.append(windowed_reshape(
+                    self.RingOptions.reshape_data, alpha, self.n_turns,
+                    self.n_sections, interp_time))
+        self.alpha_order = 0
+        if alpha_1 is not None:
+            self.alpha_order = 1
+        if alpha_2 is not None:
+            self.alpha_order = 2
+
+        def window_generator(name):
+            return lambda start, stop: \
+                getattr(self.programme_window(start, stop), name)
+
+        for name in ['beta', 'gamma', 'energy', 'kin_energy', 'alpha_0',
+                     'alpha_1', 'alpha_2', 'eta_0', 'eta_1', 'eta_2']:
+            setattr(self, name, TurnWindow(
+                window_generator(name), (self.n_sections, n_points),
+                self.window))
+        for name in ['t_rev', 'f_rev', 'omega_rev']:
+            setattr(self, name, TurnWindow(window_generator(name),
+                                           (n_points, ), self.window))
+        self.delta_E = TurnWindow(
+            lambda start, stop:
+            self.programme_window(start, stop+1).delta_E,
+            (self.n_sections, n_points-1), self.window)
+
+    def programme_window(self, start, stop):
+        """ Function returning a copy of the Ring object of which the
+        programmes cover only the turns [start, stop). The last windows are
+        kept in a small cache.
+        """
+
+        if (start, stop) in self._window_cache:
+            return self._window_cache[(start, stop)]
+
+        window = copy.copy(self)
+        window.n_turns = stop - start - 1
+        window.momentum = self.momentum[:, start:stop]
+        window.cycle_time = self.cycle_time[start:stop]
+        window.momentum_programmes()
+        for i in range(3):
+            setattr(window, 'alpha_%s' % i,
+                    self._alpha_generators[i](start, stop))
+        window.eta_generation()
+
+        if len(self._window_cache) >= 4:
+            self._window_cache.pop(next(iter(self._window_cache)))
+        self._window_cache[(start, stop)] = window
+        return window
+
     def eta_generation(self):
         """ Function to generate the slippage factors (zeroth, first, and
         second orders, see [1]_) from the momentum compaction and the
@@ -21,6 +21,8 @@ import matplotlib.pyplot as plt
 from scipy.constants import c
 from scipy.interpolate import splrep, splev
 from ..plots.plot import fig_folder
+from ..input_parameters.programme_cache import programme_hash, load_programme, \
+    cacheable
 from ..utils import bmath as bm
 
 class RingOptions(object):
@@ -54,11 +56,21 @@ class RingOptions(object):
         Figure name to save optional plot; default is 'preprocess_ramp'
     sampling : int
         Decimation value for plotting; default is 1
+    window : int
+        Number of turns of the derived programmes (beta, energy, t_rev,
+        eta, RF voltage, ...) kept in memory. The programmes are computed on
+        demand in windows of turns; default is None (all turns precomputed)
+    cache_dir : str
+        Directory where the programmes given as (time, data) or turn by turn
+        are stored as .npy files, keyed by a hash of the inputs, and from
+        where they are loaded memory-mapped on the next runs; default is None
+        (no cache)
 
     """
     def __init__(self, interpolation='linear', smoothing=0, flat_bottom=0,
                  flat_top=0, t_start=None, t_end=None, plot=False,
-                 figdir='fig', figname='preprocess_ramp', sampling=1):
+                 figdir='fig', figname='preprocess_ramp', sampling=1,
+                 window=None, cache_dir=None):
 
         if interpolation in ['linear', 'cubic', 'derivative']:
             self.interpolation = str(interpolation)
@@ -102,6 +114,14 @@ class RingOptions(object):
             raise RuntimeError("ERROR: sampling value in PreprocessRamp" +
                                " not recognised. Aborting...")
 
+        if (window is not None) and (window < 2):
+            #InputDataError
+            raise RuntimeError("ERROR: window value in PreprocessRamp" +
+                               " should be at least 2. Aborting...")
+        self.window = window if window is None else int(window)
+
+        self.cache_dir = cache_dir if cache_dir is None else str(cache_dir)
+
     def reshape_data(self, input_data, n_turns, n_sections,
                      interp_time='t_rev', input_to_momentum=False,
                      synchronous_data_type='momentum', mass=None, charge=None,
@@ -154,6 +174,35 @@ class RingOptions(object):
 
         """
 
+        # Programmes interpolated or given turn by turn are read from the
+        # cache
+        if (self.cache_dir is not None) and (not self.plot) and \
+                cacheable(input_data, n_sections):
+            key = programme_hash(
+                'Ring', bm.precision.real_t.__name__, input_data, n_turns,
+                n_sections, interp_time, input_to_momentum,
+                synchronous_data_type, mass, charge, circumference,
+                bending_radius, self.interpolation, self.smoothing,
+                self.flat_bottom, self.flat_top, self.t_start, self.t_end)
+            return load_programme(
+                self.cache_dir, 'ring', key,
+                lambda: self._reshape_data(
+                    input_data, n_turns, n_sections, interp_time,
+                    input_to_momentum, synchronous_data_type, mass, charge,
+                    circumference, bending_radius))
+
+        return self._reshape_data(input_data, n_turns, n_sections,
+                                  interp_time, input_to_momentum,
+                                  synchronous_data_type, mass, charge,
+                                  circumference, bending_radius)
+
+    def _reshape_data(self, input_data, n_turns, n_sections,
+                      interp_time='t_rev', input_to_momentum=False,
+                      synchronous_data_type='momentum', mass=None,
+                      charge=None, circumference=None, bending_radius=None):
+        r"""Reshapes the input data, see reshape_data().
+        """
+
         # TO BE IMPLEMENTED: if you pass a filename the function reads the file
         # and reshape the data
         if isinstance(input_data, str):
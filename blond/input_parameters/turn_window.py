@@ -0,0 +1,285 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Turn programmes computed on demand in windows of turns**
+
+:Authors: **Konstantinos Iliakis**
+'''
+
+from __future__ import division
+from builtins import object
+import numpy as np
+from ..utils import bmath as bm
+
+
+class TurnWindow(object):
+    r"""Array-like turn programme, of shape [n_rows, n_turns+1] or
+    [n_turns+1], of which only a window of consecutive turns is kept in
+    memory. The window is computed on demand and moves forward with the
+    turn being accessed, so that indexing with the turn counter, e.g.
+    programme[counter] or programme[:, counter], looks the same as for the
+    precomputed numpy array.
+
+    Values written in the window (e.g. by a feedback) are kept as long as
+    the turn stays in the window. Any other usage, e.g. numpy functions
+    applied to the whole programme, materialises the full array.
+
+    Parameters
+    ----------
+    generator : function
+        generator(start, stop) returns the programme for the turns
+        [start, stop), with the turns along the last axis
+    shape : tuple
+        Shape of the full programme
+    window : int
+        Number of turns kept in memory
+    lookback : int
+        Number of turns before the accessed one kept in the window when the
+        window moves; default is 1
+    dtype : data-type
+        Data type of the programme; default is bm.precision.real_t
+
+    Attributes
+    ----------
+    start : int
+        First turn of the window
+    stop : int
+        One past the last turn of the window
+    data : float array
+        The programme for the turns [start, stop)
+
+    """
+
+    def __init__(self, generator, shape, window, lookback=1, dtype=None):
+
+        self.generator = generator
+        self.shape = tuple(shape)
+        self.window = int(min(max(window, 2), self.shape[-1]))
+        self.lookback = int(lookback)
+        if dtype is None:
+            dtype = bm.precision.real_t
+        self.dtype = np.dtype(dtype)
+
+        self.start = 0
+        self.stop = 0
+        self.data = None
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def move(self, start, stop):
+        """Makes sure that the turns [start, stop) are in the window.
+        """
+
+        if (start >= self.start) and (stop <= self.stop):
+            return
+
+        n_turns = self.shape[-1]
+        new_start = max(0, min(start - self.lookback, n_turns - self.window))
+        new_stop = min(n_turns, max(stop, new_start + self.window))
+        data = np.array(self.generator(new_start, new_stop),
+                        dtype=self.dtype, order='C', ndmin=self.ndim)
+
+        # Keep the values of the turns found in both windows
+        low = max(new_start, self.start)
+        high = min(new_stop, self.stop)
+        if low < high:
+            data[..., low-new_start:high-new_start] = \
+                self.data[..., low-self.start:high-self.start]
+
+        self.data = data
+        self.start = new_start
+        self.stop = new_stop
+
+    def _split_key(self, key):
+        if not isinstance(key, tuple):
+            key = (key, )
+        key = key + (slice(None), ) * (self.ndim - len(key))
+        return key[:-1], key[-1]
+
+    def _turns(self, turn_key):
+        # Range of turns of an integer or slice key, None otherwise
+        n_turns = self.shape[-1]
+        if isinstance(turn_key, (int, np.integer)):
+            turn = int(turn_key)
+            if turn < 0:
+                turn += n_turns
+            if (turn < 0) or (turn >= n_turns):
+                raise IndexError("index %d is out of bounds for a programme " %
+                                 turn_key + "of %d turns" % n_turns)
+            return turn, turn + 1, turn
+        elif isinstance(turn_key, slice):
+            start, stop, step = turn_key.indices(n_turns)
+            if step != 1 or stop <= start:
+                return None
+            return start, stop, slice(start, stop)
+        return None
+
+    def __getitem__(self, key):
+
+        # Single row of a 2D programme, reading and writing this window
+        if (self.ndim == 2) and isinstance(key, (int, np.integer)):
+            return TurnWindowRow(self, key)
+
+        rows, turn_key = self._split_key(key)
+        turns = self._turns(turn_key)
+        if turns is None:
+            return np.asarray(self)[key]
+
+        start, stop, index = turns
+        if stop - start <= self.window:
+            self.move(start, stop)
+            if isinstance(index, slice):
+                index = slice(index.start - self.start,
+                              index.stop - self.start)
+            else:
+                index = index - self.start
+            return self.data[rows + (index, )]
+
+        # Longer than the window, generated without being kept
+        return np.array(self.generator(start, stop), dtype=self.dtype,
+                        ndmin=self.ndim)[rows + (slice(None), )]
+
+    def __setitem__(self, key, value):
+
+        rows, turn_key = self._split_key(key)
+        turns = self._turns(turn_key)
+        if (turns is None) or (turns[1] - turns[0] > self.window):
+            # WindowError
+            raise RuntimeError("ERROR in TurnWindow: only turns inside " +
+                               "the window can be modified")
+
+        start, stop, index = turns
+        self.move(start, stop)
+        if isinstance(index, slice):
+            index = slice(index.start - self.start, index.stop - self.start)
+        else:
+            index = index - self.start
+        self.data[rows + (index, )] = value
+
+    def __array__(self, dtype=None):
+        full = np.array(self.generator(0, self.shape[-1]), dtype=self.dtype,
+                        order='C', ndmin=self.ndim)
+        if self.data is not None:
+            full[..., self.start:self.stop] = self.data
+        if dtype is not None:
+            full = full.astype(dtype)
+        return full
+
+    def __neg__(self):
+        return TurnWindow(lambda start, stop: -np.asarray(
+            self.generator(start, stop)), self.shape, self.window,
+            self.lookback, self.dtype)
+
+
+class TurnWindowRow(object):
+    r"""Row of a 2D TurnWindow, e.g. programme[0], indexed with the turn
+    counter like a row of the precomputed numpy array. Reads and writes go
+    to the window of the parent, so that programme[0][counter] = value
+    changes programme[0, counter].
+
+    Parameters
+    ----------
+    parent : TurnWindow
+        The 2D programme
+    row : int
+        Index of the row
+
+    """
+
+    def __init__(self, parent, row):
+
+        if (row < -parent.shape[0]) or (row >= parent.shape[0]):
+            raise IndexError("index %d is out of bounds for a programme " %
+                             row + "of %d rows" % parent.shape[0])
+        self.parent = parent
+        self.row = int(row)
+        self.shape = parent.shape[1:]
+        self.window = parent.window
+        self.lookback = parent.lookback
+        self.dtype = parent.dtype
+
+    @property
+    def ndim(self):
+        return 1
+
+    @property
+    def size(self):
+        return self.shape[0]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _key(self, key):
+        if isinstance(key, tuple):
+            key = tuple(k for k in key if k is not Ellipsis)
+            if len(key) > 1:
+                raise IndexError("too many indices for a programme row")
+            key = key[0] if key else slice(None)
+        return (self.row, key)
+
+    def __getitem__(self, key):
+        return self.parent[self._key(key)]
+
+    def __setitem__(self, key, value):
+        self.parent[self._key(key)] = value
+
+    def __array__(self, dtype=None):
+        row = np.asarray(self.parent)[self.row]
+        if dtype is not None:
+            row = row.astype(dtype)
+        return row
+
+    def __neg__(self):
+        return (-self.parent)[self.row]
+
+
+def windowed_reshape(reshape_data, input_data, n_turns, n_rows, interp_time,
+                     *args, **kwargs):
+    r"""Function returning a generator(start, stop) of the input data
+    reshaped by reshape_data (RingOptions.reshape_data or
+    RFStationOptions.reshape_data) for the turns [start, stop) only.
+    Programmes given turn by turn are reshaped once and sliced; programmes
+    given as single values or as (time, data) are reshaped on demand, unless
+    they are read memory-mapped from the cache of the options (cache_dir).
+
+    """
+
+    if isinstance(input_data, np.ndarray) or isinstance(input_data, list):
+        data = np.array(input_data, ndmin=2)
+        if (data.size != n_rows) and (data.shape[-1] == n_turns+1):
+            output_data = reshape_data(input_data, n_turns, n_rows,
+                                       interp_time, *args, **kwargs)
+            return lambda start, stop: output_data[:, start:stop]
+
+    elif isinstance(input_data, tuple) and \
+            getattr(getattr(reshape_data, '__self__', None), 'cache_dir',
+                    None) is not None:
+        output_data = reshape_data(input_data, n_turns, n_rows, interp_time,
+                                   *args, **kwargs)
+        return lambda start, stop: output_data[:, start:stop]
+
+    def generator(start, stop):
+        if isinstance(interp_time, np.ndarray):
+            time = interp_time[start:stop]
+        else:
+            time = interp_time
+        return reshape_data(input_data, stop-start-1, n_rows, time,
+                            *args, **kwargs)
+
+    return generator
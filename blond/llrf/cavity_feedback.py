@@ -22,12 +22,14 @@ from scipy.constants import e
 import sys
 
 from ..llrf.signal_processing import comb_filter, cartesian_to_polar, \
-    polar_to_cartesian, modulator, moving_average, rf_beam_current
+    polar_to_cartesian, modulator, moving_average, rf_beam_current, \
+    fir_filter
 from ..llrf.impulse_response import SPS3Section200MHzTWC, \
     SPS4Section200MHzTWC, SPS5Section200MHzTWC
 from ..llrf.signal_processing import feedforward_filter_TWC3, \
     feedforward_filter_TWC4, feedforward_filter_TWC5
 from ..utils import bmath as bm
+from ..toolbox.next_regular import next_regular
 from ..beam.profile import Profile, CutOptions
 
 
@@ -314,6 +316,9 @@ class SPSOneTurnFeedback(object):
         Number of points for moving average modelling cavity response;
         :math:`n_{\mathsf{mov.av.}} = \frac{f_r}{f_{\mathsf{bw,cav}}}`, where
         :math:`f_r` is the cavity resonant frequency of TWC_4 and TWC_5
+    omega_c_rtol : float
+        Relative change of the carrier frequency below which the impulse
+        responses are not recomputed; default is 1e-12
     logger : logger
         Logger of the present class
 
@@ -418,6 +423,13 @@ class SPSOneTurnFeedback(object):
         self.I_gen_prev = np.zeros(self.n_mov_av, dtype=bm.precision.complex_t)
         self.logger.info("Class initialized")
 
+        # Impulse responses are kept as long as the carrier frequency, within
+        # omega_c_rtol, and the grids do not change; FFTs of the kernels of
+        # the convolutions are kept as long as the kernels do not change
+        self.omega_c_rtol = 1e-12
+        self._impulse_response_keys = {}
+        self._kernel_ffts = {}
+
         # Initialise feed-forward; sampled every 5 buckets
         if self.open_FF == 1:
             self.logger.debug("Feed-forward active")
@@ -464,15 +476,15 @@ class SPSOneTurnFeedback(object):
         self.induced_voltage('beam_coarse')
 
         if self.open_FF == 1:
-            # Calculate correction based on previous turn on coarse grid
-            for ind in range(self.n_coarse_FF):
-                self.I_ff_corr[ind] = self.coeff_FF[0]* \
-                                      self.I_beam_coarse_prev[ind]
-                for k in range(self.n_FF):
-                    self.I_ff_corr[ind] += self.coeff_FF[k] * \
-                                           self.I_beam_coarse_prev[ind-k]
+            # Calculate correction based on previous turn on coarse grid;
+            # the samples before the first one are the last ones of that
+            # turn, and the first coefficient is applied twice
+            self.I_ff_corr[:] = self.coeff_FF[0]*self.I_beam_coarse_prev \
+                + fir_filter(self.I_beam_coarse_prev, self.coeff_FF,
+                             x_prev=self.I_beam_coarse_prev)
             self.V_ff_corr = self.G_ff* \
-                self.matr_conv(self.I_ff_corr, self.TWC.h_gen[::5])
+                self.matr_conv(self.I_ff_corr, self.TWC.h_gen[::5],
+                               kernel='ff')
 
             # Compensate for FIR filter delay
             self.dV_ff = np.concatenate((self.V_ff_corr[self.n_FF_delay:],
@@ -571,21 +583,24 @@ class SPSOneTurnFeedback(object):
             # Compute the beam-induced voltage on the fine grid
             self.__setattr__("V_fine_ind_"+name,
                 self.matr_conv(self.__getattribute__("I_"+name+"_fine"),
-                               self.TWC.__getattribute__("h_"+name)))
+                               self.TWC.__getattribute__("h_"+name),
+                               kernel=name))
             self.V_fine_ind_beam *= -self.n_cavities
 
         if name == "beam_coarse" and hasattr(self.TWC, "h_beam_coarse"):
             # Compute the beam-induced voltage on the coarse grid
             self.__setattr__("V_coarse_ind_beam",
                 self.matr_conv(self.__getattribute__("I_"+name),
-                               self.TWC.__getattribute__("h_"+name)))
+                               self.TWC.__getattribute__("h_"+name),
+                               kernel=name))
             self.V_coarse_ind_beam *= -self.n_cavities
 
         if name == "gen":
             # Compute the generator-induced voltage on the coarse grid
             self.__setattr__("V_coarse_ind_" + name,
                 self.matr_conv(self.__getattribute__("I_"+name),
-                               self.TWC.__getattribute__("h_"+name)))
+                               self.TWC.__getattribute__("h_"+name),
+                               kernel=name))
             # Circular convolution
             self.V_coarse_ind_gen = +self.n_cavities \
                 *self.V_coarse_ind_gen[self.n_mov_av:self.n_coarse+self.n_mov_av]
@@ -648,11 +663,55 @@ class SPSOneTurnFeedback(object):
             x_prev=self.dV_ma_in_prev[-self.n_mov_av+1:])
         self.dV_ma_in_prev = np.copy(self.dV_ma_in)
 
-    def matr_conv(self, I, h):
+    def matr_conv(self, I, h, kernel=None):
         """Convolution of beam current with impulse response; uses a complete
-        matrix with off-diagonal elements."""
-
-        return scipy.signal.fftconvolve(I, h, mode='full')[:I.shape[0]]
+        matrix with off-diagonal elements. If a kernel name is given, the FFT
+        of the impulse response is kept and reused for the next calls with
+        the same impulse response array."""
+
+        if kernel is None:
+            return scipy.signal.fftconvolve(I, h, mode='full')[:I.shape[0]]
+
+        n_fft = next_regular(I.shape[0] + h.shape[0] - 1)
+        source = h if h.base is None else h.base
+        key = (h.shape, h.strides, n_fft)
+        cached = self._kernel_ffts.get(kernel)
+        if (cached is None) or (cached[0] is not source) \
+                or (cached[1] != key):
+            cached = (source, key, np.fft.fft(h, n_fft))
+            self._kernel_ffts[kernel] = cached
+
+        result = np.fft.ifft(np.fft.fft(I, n_fft)*cached[2])[:I.shape[0]]
+        return result.astype(np.result_type(I, h), copy=False)
+
+    def update_impulse_response(self, beam=True):
+        """Computes the impulse responses of the cavity at the present carrier
+        frequency, towards the generator and, optionally, the beam. They are
+        only recomputed if the carrier frequency changed by more than
+        omega_c_rtol, relatively, or if the coarse or fine grid changed,
+        which is not the case e.g. on a flat bottom."""
+
+        # The impulse responses only depend on the grids through their
+        # length and spacing
+        grids = {'gen': (self.n_coarse, self.T_s)}
+        if beam:
+            bin_centers = self.profile.bin_centers
+            grids['beam'] = grids['gen'] + \
+                (len(bin_centers), bin_centers[-1] - bin_centers[0])
+
+        for name, grid in grids.items():
+            previous = self._impulse_response_keys.get(name)
+            if (previous is not None) and (previous[1] == grid) and \
+                    (np.fabs(self.omega_c - previous[0])
+                     <= self.omega_c_rtol*np.fabs(self.omega_c)):
+                continue
+            if name == 'gen':
+                self.TWC.impulse_response_gen(self.omega_c, self.rf_centers)
+            else:
+                self.TWC.impulse_response_beam(self.omega_c,
+                                               self.profile.bin_centers,
+                                               self.rf_centers)
+            self._impulse_response_keys[name] = (self.omega_c, grid)
 
     def track(self):
         """Turn-by-turn tracking method."""
@@ -661,9 +720,7 @@ class SPSOneTurnFeedback(object):
         self.update_variables()
 
         # Update the impulse response at present carrier frequency
-        self.TWC.impulse_response_gen(self.omega_c, self.rf_centers)
-        self.TWC.impulse_response_beam(self.omega_c, self.profile.bin_centers,
-                                       self.rf_centers)
+        self.update_impulse_response()
 
         # On current measured (I,Q) voltage, apply LLRF model
         self.llrf_model()
@@ -688,7 +745,7 @@ class SPSOneTurnFeedback(object):
         self.update_variables()
 
         # Update the impulse response at present carrier frequency
-        self.TWC.impulse_response_gen(self.omega_c, self.rf_centers)
+        self.update_impulse_response(beam=False)
 
         # On current measured (I,Q) voltage, apply LLRF model
         self.llrf_model()
@@ -16,6 +16,8 @@ amplitude as a function of bunch length**
 
 from __future__ import division, print_function
 from builtins import range, object
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import numpy.random as rnd
 from scipy.constants import c
@@ -46,7 +48,7 @@ class FlatSpectrum(object):
         correlated sequences of the random number generator.
         '''
         self.total_n_turns = Ring.n_turns
-        self.initial_final_turns = initial_final_turns
+        self.initial_final_turns = list(initial_final_turns)
         if self.initial_final_turns[1]==-1:
             self.initial_final_turns[1] = self.total_n_turns+1
             
@@ -68,12 +70,18 @@ class FlatSpectrum(object):
         self.dphi = np.zeros(self.n_turns+1, dtype=bm.precision.real_t)
         self.continuous_phase = continuous_phase
         if self.continuous_phase:
-            self.dphi2 = np.zeros(self.n_turns+1+self.corr/4, dtype=bm.precision.real_t)
+            self.dphi2 = np.zeros(self.n_turns+1+self.corr//4, dtype=bm.precision.real_t)
         self.folder_plots = folder_plots    
         self.print_option = print_option
     
     
     def spectrum_to_phase_noise(self, freq, spectrum, transform=None):
+
+        self.t, self.dphi_output = self._phase_noise(
+            freq, spectrum, self.seed1, self.seed2, transform)
+
+
+    def _phase_noise(self, freq, spectrum, seed1, seed2, transform=None):
         
         nf = len(spectrum)
         fmax = freq[nf-1]
@@ -90,11 +98,10 @@ class FlatSpectrum(object):
             raise RuntimeError('ERROR: The choice of Fourier transform for the\
              RF noise generation could not be recognized. Use "r" or "c".')
             
-        # Generate white noise in time domain
-        rnd.seed(self.seed1)
-        r1 = rnd.random_sample(nt)
-        rnd.seed(self.seed2)
-        r2 = rnd.random_sample(nt)
+        # Generate white noise in time domain; own generators, so that
+        # segments can be computed concurrently
+        r1 = rnd.RandomState(seed1).random_sample(nt)
+        r2 = rnd.RandomState(seed2).random_sample(nt)
         if transform==None or transform=='r':
             Gt = np.cos(2*np.pi*r1) * np.sqrt(-2*np.log(r2))     
         elif transform=='c':  
@@ -120,75 +127,170 @@ class FlatSpectrum(object):
             dPt = np.fft.ifft(dPf) # in [rad]
                     
         # Use only real part for the phase shift and normalize
-        self.t = np.linspace(0, float(nt*dt), nt, dtype=bm.precision.real_t) 
-        self.dphi_output = dPt.real
- 
-    
-    def generate(self):
-       
-        for i in range(0, np.int(np.ceil(self.n_turns/self.corr))):
+        t = np.linspace(0, float(nt*dt), nt, dtype=bm.precision.real_t) 
+        return t, dPt.real
+
+
+    @property
+    def n_segments(self):
+        '''
+        Number of segments of corr_time turns, each with its own spectrum
+        and seeds.
+        '''
+
+        return int(np.ceil(self.n_turns/self.corr))
+
+
+    def segment_calls(self, i):
+        '''
+        Indices m of the noise realisations of segment i, in the order of
+        the sequential generation; realisation m uses the seeds
+        seed1 + 239*m and seed2 + 158*m. With continuous phase, segment 0
+        has a third realisation for the first corr_time/4 turns of the
+        second noise.
+        '''
+
+        if not self.continuous_phase:
+            return [i]
+        elif i == 0:
+            return [0, 1, 2]
+        else:
+            return [2*i + 1, 2*i + 2]
+
+
+    def segment_spectrum(self, i):
+        '''
+        Frequencies and noise spectrum of segment i.
+        '''
+
+        # Scale amplitude to keep area (phase noise amplitude) constant
+        k = i*self.corr       # current time step
+        ampl = self.A_i*self.fs[0]/self.fs[k]
         
-            # Scale amplitude to keep area (phase noise amplitude) constant
-            k = i*self.corr       # current time step
-            ampl = self.A_i*self.fs[0]/self.fs[k]
+        # Calculate the frequency step
+        f_max = self.f0[k]/2
+        n_points_pos_f_incl_zero = int(np.ceil(f_max/self.delta_f) + 1)
+        nt = 2*(n_points_pos_f_incl_zero - 1)
+        nt_regular = next_regular(int(nt))
+        if nt_regular%2!=0 or nt_regular < self.corr:
+            #NoiseError
+            raise RuntimeError('Error in noise generation!')
+        n_points_pos_f_incl_zero = int(nt_regular/2 + 1)  
+        freq = np.linspace(0, float(f_max), n_points_pos_f_incl_zero, dtype=bm.precision.real_t)
+        delta_f = f_max/(n_points_pos_f_incl_zero-1) 
+
+        # Construct spectrum, zero outside of [nmin, nmax]
+        nmin = int(np.floor(self.fmin_s0*self.fs[k]/delta_f))  
+        nmax = int(np.ceil(self.fmax_s0*self.fs[k]/delta_f))    
+        spectrum = np.zeros(n_points_pos_f_incl_zero, dtype=bm.precision.real_t)
+        
+        # To compensate the notch due to PL at central frequency
+        if self.predistortion == 'exponential':
             
-            # Calculate the frequency step
-            f_max = self.f0[k]/2
-            n_points_pos_f_incl_zero = int(np.ceil(f_max/self.delta_f) + 1)
-            nt = 2*(n_points_pos_f_incl_zero - 1)
-            nt_regular = next_regular(int(nt))
-            if nt_regular%2!=0 or nt_regular < self.corr:
-                #NoiseError
-                raise RuntimeError('Error in noise generation!')
-            n_points_pos_f_incl_zero = int(nt_regular/2 + 1)  
-            freq = np.linspace(0, float(f_max), n_points_pos_f_incl_zero, dtype=bm.precision.real_t)
-            delta_f = f_max/(n_points_pos_f_incl_zero-1) 
-
-            # Construct spectrum   
-            nmin = np.int(np.floor(self.fmin_s0*self.fs[k]/delta_f))  
-            nmax = np.int(np.ceil(self.fmax_s0*self.fs[k]/delta_f))    
+            spectrum[nmin:nmax+1] = ampl*np.exp(
+                np.log(100.)*np.arange(0,nmax-nmin+1, dtype=bm.precision.real_t)/(nmax-nmin) )
+         
+        elif self.predistortion == 'linear':
             
-            # To compensate the notch due to PL at central frequency
-            if self.predistortion == 'exponential':
-                
-                spectrum = np.concatenate((np.zeros(nmin, dtype=bm.precision.real_t), ampl*np.exp(
-                    np.log(100.)*np.arange(0,nmax-nmin+1, dtype=bm.precision.real_t)/(nmax-nmin) ), 
-                                           np.zeros(n_points_pos_f_incl_zero-nmax-1, dtype=bm.precision.real_t) ))
-             
-            elif self.predistortion == 'linear':
-                
-                spectrum = np.concatenate((np.zeros(nmin, dtype=bm.precision.real_t), 
-                    np.linspace(0, float(ampl), nmax-nmin+1, dtype=bm.precision.real_t), 
-                    np.zeros(n_points_pos_f_incl_zero-nmax-1, dtype=bm.precision.real_t)))   
-                
-            elif self.predistortion == 'hyperbolic':
-
-                spectrum = np.concatenate((np.zeros(nmin, dtype=bm.precision.real_t), 
-                    ampl*np.ones(nmax-nmin+1, dtype=bm.precision.real_t)* \
-                    1/(1 + 0.99*(nmin - np.arange(nmin,nmax+1, dtype=bm.precision.real_t))
-                       /(nmax-nmin)), np.zeros(n_points_pos_f_incl_zero-nmax-1, dtype=bm.precision.real_t1)))
-
-            elif self.predistortion == 'weightfunction':
-
-                frel = freq[nmin:nmax+1]/self.fs[k] # frequency relative to fs0
-                frel[np.where(frel > 0.999)[0]] = 0.999 # truncate center freqs
-                sigma = 0.754 # rms bunch length in rad corresponding to 1.2 ns
-                gamma = 0.577216
-                weight = (4.*np.pi*frel/sigma**2)**2 * \
-                    np.exp(-16.*(1. - frel)/sigma**2) + \
-                    0.25*( 1 + 8.*frel/sigma**2 * 
-                           np.exp(-8.*(1. - frel)/sigma**2) * 
-                           ( gamma + np.log(8.*(1. - frel)/sigma**2) + 
-                             8.*(1. - frel)/sigma**2 ) )**2
-                weight /= weight[0] # normalise to have 1 at fmin
-                spectrum = np.concatenate((np.zeros(nmin, dtype=bm.precision.real_t), ampl*weight, 
-                                            np.zeros(n_points_pos_f_incl_zero-nmax-1, dtype=bm.precision.real_t)))
-
-            else:
-                spectrum = np.concatenate((np.zeros(nmin, dtype=bm.precision.real_t), 
-                    ampl*np.ones(nmax-nmin+1, dtype=bm.precision.real_t), 
-                    np.zeros(n_points_pos_f_incl_zero-nmax-1, dtype=bm.precision.real_t)))               
+            spectrum[nmin:nmax+1] = np.linspace(0, float(ampl), nmax-nmin+1, dtype=bm.precision.real_t)
             
+        elif self.predistortion == 'hyperbolic':
+
+            spectrum[nmin:nmax+1] = ampl*np.ones(nmax-nmin+1, dtype=bm.precision.real_t)* \
+                1/(1 + 0.99*(nmin - np.arange(nmin,nmax+1, dtype=bm.precision.real_t))
+                   /(nmax-nmin))
+
+        elif self.predistortion == 'weightfunction':
+
+            frel = freq[nmin:nmax+1]/self.fs[k] # frequency relative to fs0
+            frel[np.where(frel > 0.999)[0]] = 0.999 # truncate center freqs
+            sigma = 0.754 # rms bunch length in rad corresponding to 1.2 ns
+            gamma = 0.577216
+            weight = (4.*np.pi*frel/sigma**2)**2 * \
+                np.exp(-16.*(1. - frel)/sigma**2) + \
+                0.25*( 1 + 8.*frel/sigma**2 * 
+                       np.exp(-8.*(1. - frel)/sigma**2) * 
+                       ( gamma + np.log(8.*(1. - frel)/sigma**2) + 
+                         8.*(1. - frel)/sigma**2 ) )**2
+            weight /= weight[0] # normalise to have 1 at fmin
+            spectrum[nmin:nmax+1] = ampl*weight
+
+        else:
+            spectrum[nmin:nmax+1] = ampl
+
+        return freq, spectrum
+
+
+    def segment(self, i, seed1=None, seed2=None):
+        '''
+        Phase noise of segment i, which only depends on the index and on the
+        initial seeds (default: the current ones), so that the segments can
+        be computed in any order or concurrently. Returns the frequencies,
+        the spectrum, the time array and the list of noise realisations
+        (see segment_calls).
+        '''
+
+        if seed1 is None:
+            seed1 = self.seed1
+        if seed2 is None:
+            seed2 = self.seed2
+
+        freq, spectrum = self.segment_spectrum(i)
+        outputs = []
+        for m in self.segment_calls(i):
+            t, dphi_output = self._phase_noise(freq, spectrum, seed1 + 239*m,
+                                               seed2 + 158*m)
+            outputs.append(dphi_output)
+
+        return freq, spectrum, t, outputs
+
+
+    def segments(self, first=0, n_threads=1, lookahead=None, seed1=None,
+                 seed2=None):
+        '''
+        Generator yielding (i, segment(i)) for the segments from first
+        onwards, in order. With n_threads > 1, the segments are computed by
+        a pool of threads, at most lookahead (default: 2*n_threads) segments
+        ahead of the one yielded.
+        '''
+
+        if seed1 is None:
+            seed1 = self.seed1
+        if seed2 is None:
+            seed2 = self.seed2
+
+        if n_threads <= 1:
+            for i in range(first, self.n_segments):
+                yield i, self.segment(i, seed1, seed2)
+            return
+
+        if lookahead is None:
+            lookahead = 2*n_threads
+        with ThreadPoolExecutor(n_threads) as executor:
+            futures = deque()
+            i_next = first
+            while futures or i_next < self.n_segments:
+                while i_next < self.n_segments and len(futures) < lookahead:
+                    futures.append((i_next, executor.submit(
+                        self.segment, i_next, seed1, seed2)))
+                    i_next += 1
+                i, future = futures.popleft()
+                yield i, future.result()
+
+
+    def generate(self, n_threads=1):
+        '''
+        Generate the phase noise of all the turns in dphi. With n_threads > 1
+        the segments are computed concurrently, with the same result.
+        '''
+
+        seed1, seed2 = self.seed1, self.seed2
+        corr4 = self.corr//4
+       
+        for i, (freq, spectrum, t, outputs) in self.segments(
+                n_threads=n_threads, seed1=seed1, seed2=seed2):
+        
+            k = i*self.corr       # current time step
             
             # Fill phase noise array
             if i < int(self.n_turns/self.corr) - 1:
@@ -196,23 +298,15 @@ class FlatSpectrum(object):
             else:
                 kmax = self.n_turns + 1
             
-            
-            self.spectrum_to_phase_noise(freq, spectrum)
-            self.seed1 +=239
-            self.seed2 +=158
-            self.dphi[k:kmax] = self.dphi_output[0:(kmax-k)]
+            self.dphi[k:kmax] = outputs[0][0:(kmax-k)]
             
             if self.continuous_phase:
                 if i==0:
-                    self.spectrum_to_phase_noise(freq, spectrum)
-                    self.seed1 +=239
-                    self.seed2 +=158
-                    self.dphi2[:self.corr/4] = self.dphi_output[:self.corr/4]
-                    
-                self.spectrum_to_phase_noise(freq, spectrum)
-                self.seed1 +=239
-                self.seed2 +=158
-                self.dphi2[(k+self.corr/4):(kmax+self.corr/4)] = self.dphi_output[0:(kmax-k)]
+                    self.dphi2[:corr4] = outputs[1][:corr4]
+                self.dphi2[(k+corr4):(kmax+corr4)] = outputs[-1][0:(kmax-k)]
+
+            self.t = t
+            self.dphi_output = outputs[-1]
             
             if self.folder_plots != None:
                 fig_folder(self.folder_plots)
@@ -225,6 +319,11 @@ class FlatSpectrum(object):
             if self.print_option:
                 print("RF noise for time step %.4e s (iter %d) has r.m.s. phase %.4e rad (%.3e deg)" \
                     %(self.t[1], i, rms_noise, rms_noise*180/np.pi))
+
+        # Seeds of the next realisation, as after a sequential generation
+        n_calls = self.segment_calls(self.n_segments - 1)[-1] + 1
+        self.seed1 = seed1 + 239*n_calls
+        self.seed2 = seed2 + 158*n_calls
                 
         if self.continuous_phase:
             psi = np.arange(0, self.n_turns+1, dtype=bm.precision.real_t)*2*np.pi/self.corr
@@ -233,6 +332,76 @@ class FlatSpectrum(object):
         if self.initial_final_turns[0]>0 or self.initial_final_turns[1]<self.total_n_turns+1:
             self.dphi = np.concatenate((np.zeros(self.initial_final_turns[0], dtype=bm.precision.real_t), self.dphi, np.zeros(1+self.total_n_turns-self.initial_final_turns[1], dtype=bm.precision.real_t)))
 
+
+    def windowed(self, window=None, n_threads=1, lookahead=None):
+        '''
+        Phase noise of all the turns as a TurnWindow, to be used in place of
+        dphi (e.g. BeamFeedback or RFStation.phi_noise rows): only a window
+        of turns (default: corr_time) is kept in memory, and the segments
+        that follow are computed ahead by n_threads background threads
+        (default lookahead: n_threads segments). The values are the same as
+        the ones of generate(), which must not be called.
+        '''
+
+        from ..input_parameters.turn_window import TurnWindow
+
+        if window is None:
+            window = self.corr
+        if lookahead is None:
+            lookahead = n_threads
+        seed1, seed2 = self.seed1, self.seed2
+        corr4 = self.corr//4
+        n_segments = self.n_segments
+        executor = ThreadPoolExecutor(max(n_threads, 1))
+        futures = {}
+
+        def submit(i):
+            if (i < n_segments) and (i not in futures):
+                futures[i] = executor.submit(self.segment, i, seed1, seed2)
+
+        def noise(turns, offset, which):
+            # Noise realisation 'which' of the segments writing the turns
+            # (turns - offset) in generate()
+            owners = np.minimum((turns - offset)//self.corr, n_segments-1)
+            values = np.zeros(len(turns))
+            for i in np.unique(owners):
+                submit(i)
+                output = futures[i].result()[3][which]
+                indices = owners == i
+                values[indices] = output[turns[indices] - offset - i*self.corr]
+            return values.astype(bm.precision.real_t)
+
+        def generator(start, stop):
+            turns = np.arange(start, stop) - self.initial_final_turns[0]
+            valid = (turns >= 0) & (turns <= self.n_turns)
+            turns = turns[valid]
+            dphi = np.zeros(stop-start, dtype=bm.precision.real_t)
+            if len(turns) == 0:
+                return dphi
+
+            dphi[valid] = noise(turns, 0, 0)
+            if self.continuous_phase:
+                dphi2 = np.zeros(len(turns), dtype=bm.precision.real_t)
+                first = turns < corr4
+                if np.any(first):
+                    submit(0)
+                    dphi2[first] = futures[0].result()[3][1][turns[first]]
+                dphi2[~first] = noise(turns[~first], corr4, -1)
+                psi = turns.astype(bm.precision.real_t)*2*np.pi/self.corr
+                dphi[valid] = dphi[valid]*np.sin(psi) + dphi2*np.cos(psi)
+
+            # Drop the segments behind, compute the next ones ahead
+            last = min(turns[-1]//self.corr, n_segments-1)
+            oldest = min(max(turns[0] - corr4, 0)//self.corr, last)
+            for i in [i for i in futures if i < oldest]:
+                futures.pop(i)
+            for i in range(last + 1, last + 1 + lookahead):
+                submit(i)
+            return dphi
+
+        return TurnWindow(generator, (self.total_n_turns+1, ), window)
+
+
 class LHCNoiseFB(object): 
     '''
     *Feedback on phase noise amplitude for LHC controlled longitudinal emittance
@@ -271,6 +271,37 @@ def moving_average(x, N, x_prev=None):
     return mov_avg[N-1:] / N
 
 
+def fir_filter(x, coefficients, x_prev=None):
+    r"""Function to apply a finite impulse response (FIR) filter to the input
+    data,
+
+    .. math:: y_n = \sum_{k=0}^{N-1} c_k x_{n-k} \, .
+
+    Parameters
+    ----------
+    x : float or complex array
+        Data to be filtered
+    coefficients : float array
+        Filter coefficients :math:`c_k`, N taps
+    x_prev : float or complex array
+        Data preceding x, of which the last N-1 points are used; default is
+        zeros
+
+    Returns
+    -------
+    float or complex array
+        Filtered data array of size len(x)
+
+    """
+
+    n_taps = len(coefficients)
+    if x_prev is None:
+        x_prev = np.zeros(n_taps - 1, dtype=x.dtype)
+    x = np.concatenate((x_prev[len(x_prev) - (n_taps - 1):], x))
+
+    return np.convolve(x, coefficients, mode='valid')
+
+
 def feedforward_filter(TWC, T_s, debug=False, taps=None,
                        opt_output=False):
     """Function to design n-tap FIR filter for SPS TravellingWaveCavity.
@@ -478,6 +478,17 @@ class MultiBunchMonitor(object):
         self.b_std_dt = np.zeros(
             (self.buffer_size, self.Nbunches), dtype='float64')
 
+        # Of every bunch when the beam statistics are given the bunches
+        self.create_data('alive', self.h5file['default'],
+                         (self.n_turns, self.Nbunches), dtype='int64')
+        self.create_data('epsn_rms_l', self.h5file['default'],
+                         (self.n_turns, self.Nbunches), dtype='float64')
+
+        self.b_alive = np.zeros(
+            (self.buffer_size, self.Nbunches), dtype='int64')
+        self.b_epsn_rms_l = np.zeros(
+            (self.buffer_size, self.Nbunches), dtype='float64')
+
     def __del__(self):
         if self.i_turn > self.last_save:
             self.write_data()
@@ -485,17 +496,6 @@ class MultiBunchMonitor(object):
 
     def write_buffer(self, turn):
 
-        # Nppb = int(self.profile.Beam.n_macroparticles // self.Nbunches)
-        # mean_dE = np.zeros(self.Nbunches, dtype=float)
-        # mean_dt = np.zeros(self.Nbunches, dtype=float)
-        # std_dE = np.zeros(self.Nbunches, dtype=float)
-        # std_dt = np.zeros(self.Nbunches, dtype=float)
-        # for i in range(self.Nbunches):
-        #     mean_dE[i] = np.mean(self.profile.Beam.dE[i*Nppb:(i+1)*Nppb])
-        #     mean_dt[i] = np.mean(self.profile.Beam.dt[i*Nppb:(i+1)*Nppb])
-        #     std_dE[i] = np.std(self.profile.Beam.dE[i*Nppb:(i+1)*Nppb])
-        #     std_dt[i] = np.std(self.profile.Beam.dt[i*Nppb:(i+1)*Nppb])
-
         idx = self.i_turn % self.buffer_size
 
         self.b_turns[idx] = turn
@@ -508,17 +508,38 @@ class MultiBunchMonitor(object):
         self.b_min_profile[idx] = np.min(self.profile.n_macroparticles)
         self.b_max_profile[idx] = np.max(self.profile.n_macroparticles)
 
-        # if self.Nbunches == 1:
-        self.b_mean_dE[idx] = self.beam.mean_dE
-        self.b_std_dE[idx] = self.beam.sigma_dE
         self.b_norm_dE[idx] = self.rf.voltage[0, turn]
-        self.b_min_dE[idx] = self.beam.min_dE
-        self.b_max_dE[idx] = self.beam.max_dE
 
-        self.b_mean_dt[idx] = self.beam.mean_dt
-        self.b_std_dt[idx] = self.beam.sigma_dt
-        self.b_min_dt[idx] = self.beam.min_dt
-        self.b_max_dt[idx] = self.beam.max_dt
+        if self.beam._bunch_statistics is not None:
+            # Statistics of every bunch, from beam.statistics(n_bunches, ...)
+            beam = self.beam
+            self.b_alive[idx] = beam.bunch_alive
+            self.b_epsn_rms_l[idx] = beam.bunch_epsn_rms_l
+
+            self.b_mean_dE[idx] = beam.bunch_mean_dE
+            self.b_std_dE[idx] = beam.bunch_sigma_dE
+            self.b_min_dE[idx] = beam.bunch_min_dE
+            self.b_max_dE[idx] = beam.bunch_max_dE
+
+            self.b_mean_dt[idx] = beam.bunch_mean_dt
+            self.b_std_dt[idx] = beam.bunch_sigma_dt
+            self.b_min_dt[idx] = beam.bunch_min_dt
+            self.b_max_dt[idx] = beam.bunch_max_dt
+        else:
+            # Statistics of the whole beam
+            self.b_alive[idx] = self.beam.n_total_macroparticles - \
+                self.beam.n_total_macroparticles_lost
+            self.b_epsn_rms_l[idx] = self.beam.epsn_rms_l
+
+            self.b_mean_dE[idx] = self.beam.mean_dE
+            self.b_std_dE[idx] = self.beam.sigma_dE
+            self.b_min_dE[idx] = self.beam.min_dE
+            self.b_max_dE[idx] = self.beam.max_dE
+
+            self.b_mean_dt[idx] = self.beam.mean_dt
+            self.b_std_dt[idx] = self.beam.sigma_dt
+            self.b_min_dt[idx] = self.beam.min_dt
+            self.b_max_dt[idx] = self.beam.max_dt
 
         if turn == 0:
             self.b_norm_dt[idx] = self.rf.t_rev[0] * self.rf.eta_0[0] * \
@@ -562,6 +583,9 @@ class MultiBunchMonitor(object):
         self.h5group['min_dt'][i1_h5:i2_h5] = self.b_min_dt[i1_b:i2_b]
         self.h5group['max_dt'][i1_h5:i2_h5] = self.b_max_dt[i1_b:i2_b]
 
+        self.h5group['alive'][i1_h5:i2_h5] = self.b_alive[i1_b:i2_b]
+        self.h5group['epsn_rms_l'][i1_h5:i2_h5] = self.b_epsn_rms_l[i1_b:i2_b]
+
 
     def track(self, turn):
 
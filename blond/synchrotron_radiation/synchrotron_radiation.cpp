@@ -13,81 +13,133 @@ Project website: http://blond.web.cern.ch/
 // Author: Juan F. Esteban Mueller, Konstantinos Iliakis
 
 #include <math.h>
-#include <stdlib.h>
-#include <random>
-#include <thread>
-#include <chrono>
+#include <stdint.h>
+#include <algorithm>
 #include "../cpp_routines/common.h"
+#include "../cpp_routines/philox.h"
 
-#ifdef BOOST
-#include <boost/random.hpp>
-#include <boost/random/normal_distribution.hpp>
-using namespace boost;
+// Number of particles processed together: their energies stay in cache
+// during all the kicks, and the Box-Muller transform is vectorised over them
+#define SR_CHUNK 64
 
-#else
-using namespace std;
 
-#endif
+// The n_kicks sub-steps are applied one after the other to each particle,
+// in a single pass over the beam
+template <typename T>
+static void synchrotron_radiation_kernel(T *__restrict__ beam_dE, const T U0,
+                                         const int n_macroparticles,
+                                         const T tau_z, const int n_kicks)
+{
+    // SR damping constant, adjusted for better performance
+    const T const_synch_rad = 1.0 - 2.0 / tau_z;
+
+    // SR damping term due to energy spread and
+    // Average energy change due to SR
+    #pragma omp parallel for
+    for (int i = 0; i < n_macroparticles; i++) {
+        T dE = beam_dE[i];
+        for (int j = 0; j < n_kicks; j++)
+            dE = dE * const_synch_rad - U0;
+        beam_dE[i] = dE;
+    }
+}
+
+
+// The normal numbers of the quantum excitation of a particle come from the
+// counter-based generator, with the particle id as index and the turn in the
+// counter; each block gives the numbers of four kicks, the block of kicks
+// 4j to 4j+3 using the stream stream + j. The result is therefore the same
+// for any number of threads or MPI workers.
+template <typename T>
+static void synchrotron_radiation_full_kernel(
+    T *__restrict__ beam_dE, const long *__restrict__ beam_id, const T U0,
+    const int n_macroparticles, const T sigma_dE, const T tau_z,
+    const T energy, const int n_kicks, const philox_key_t key,
+    const uint64_t stream, const uint64_t turn)
+{
+    // Quantum excitation constant
+    const T const_quantum_exc = 2.0 * sigma_dE / sqrt(tau_z) * energy;
+
+    // Adjusted SR damping constant
+    const T const_synch_rad = 1.0 - 2.0 / tau_z;
+
+    #pragma omp parallel for schedule(static)
+    for (int start = 0; start < n_macroparticles; start += SR_CHUNK) {
+        const int len = std::min(SR_CHUNK, n_macroparticles - start);
+        T *__restrict__ dE = beam_dE + start;
+        double u[4][SR_CHUNK];
+        T z[4][SR_CHUNK];
+
+        for (int j = 0; j < n_kicks; j += 4) {
+            for (int i = 0; i < len; i++) {
+                const uint64_t index = beam_id ? beam_id[start + i] : start + i;
+                uint64_t block[4];
+                philox_block(key, index, stream + j / 4, turn, block);
+                for (int k = 0; k < 4; k++)
+                    u[k][i] = philox_uniform(block[k]);
+            }
+
+            // Box-Muller transform, two normal numbers per pair of uniforms,
+            // only for the kicks left
+            const int kicks = std::min(4, n_kicks - j);
+            if (kicks == 4) {
+                for (int i = 0; i < len; i++) {
+                    const double r0 = sqrt(-2 * log(u[0][i]));
+                    const double r1 = sqrt(-2 * log(u[2][i]));
+                    z[0][i] = r0 * cos(2 * M_PI * u[1][i]);
+                    z[1][i] = r0 * sin(2 * M_PI * u[1][i]);
+                    z[2][i] = r1 * cos(2 * M_PI * u[3][i]);
+                    z[3][i] = r1 * sin(2 * M_PI * u[3][i]);
+                }
+            }
+            else for (int p = 0; p < kicks; p += 2) {
+                if (kicks - p > 1) {
+                    for (int i = 0; i < len; i++) {
+                        const double r = sqrt(-2 * log(u[p][i]));
+                        z[p][i] = r * cos(2 * M_PI * u[p + 1][i]);
+                        z[p + 1][i] = r * sin(2 * M_PI * u[p + 1][i]);
+                    }
+                } else {
+                    for (int i = 0; i < len; i++)
+                        z[p][i] = sqrt(-2 * log(u[p][i]))
+                                  * cos(2 * M_PI * u[p + 1][i]);
+                }
+            }
+
+            // Compute synchrotron radiation damping term and
+            // Applies the quantum excitation term
+            for (int k = 0; k < kicks; k++)
+                for (int i = 0; i < len; i++)
+                    dE[i] = dE[i] * const_synch_rad
+                            + const_quantum_exc * z[k][i] - U0;
+        }
+    }
+}
 
-long unsigned int seed = clock();
 
 // This function calculates and applies only the synchrotron radiation damping term
 extern "C" void synchrotron_radiation(double * __restrict__ beam_dE, const double U0,
                                       const int n_macroparticles, const double tau_z,
                                       const int n_kicks) {
 
-    // SR damping constant, adjusted for better performance
-    const double const_synch_rad = 1.0 - 2.0 / tau_z;
-
-    for (int j = 0; j < n_kicks; j++) {
-        // SR damping term due to energy spread and
-        // Average energy change due to SR
-        #pragma omp parallel for
-        for (int i = 0; i < n_macroparticles; i++)
-            beam_dE[i] = beam_dE[i] * const_synch_rad - U0;
-
-        // #pragma omp parallel for
-        // for (int i = 0; i < n_macroparticles; i++)
-        //     beam_dE[i] -= U0;
-    }
+    synchrotron_radiation_kernel(beam_dE, U0, n_macroparticles, tau_z,
+                                 n_kicks);
 }
 
 
 // This function calculates and applies synchrotron radiation damping and
 // quantum excitation terms
-extern "C" void synchrotron_radiation_full(double * __restrict__ beam_dE, const double U0,
+extern "C" void synchrotron_radiation_full(double * __restrict__ beam_dE,
+        const long * __restrict__ beam_id, const double U0,
         const int n_macroparticles, const double sigma_dE,
         const double tau_z, const double energy,
-        // double * __restrict__ random_array,
-        const int n_kicks)
+        const int n_kicks, const uint64_t key0, const uint64_t key1,
+        const uint64_t stream, const uint64_t turn)
 {
-
-    std::hash<std::thread::id> hash;
-
-    // Quantum excitation constant
-    const double const_quantum_exc = 2.0 * sigma_dE / sqrt(tau_z) * energy;
-
-    // Adjusted SR damping constant
-    const double const_synch_rad = 1.0 - 2.0 / tau_z;
-
-    // Random number generator for the quantum excitation term
-
-    for (int j = 0; j < n_kicks; j++) {
-        // Compute synchrotron radiation damping term and
-        // Applies the quantum excitation term
-        #pragma omp parallel
-        {
-            static __thread mt19937_64 *gen = nullptr;
-            if (!gen) gen = new mt19937_64(seed + omp_get_thread_num());
-            static __thread normal_distribution<double> dist(0.0, 1.0);
-            #pragma omp for
-            for (int i = 0; i < n_macroparticles; i++) {
-                beam_dE[i] = beam_dE[i] * const_synch_rad
-                             + const_quantum_exc * dist(*gen)
-                             - U0;
-            }
-        }
-    }
+    const philox_key_t key = {key0, key1};
+    synchrotron_radiation_full_kernel(beam_dE, beam_id, U0, n_macroparticles,
+                                      sigma_dE, tau_z, energy, n_kicks, key,
+                                      stream, turn);
 }
 
 
@@ -96,61 +148,22 @@ extern "C" void synchrotron_radiationf(float * __restrict__ beam_dE, const float
                                        const int n_macroparticles, const float tau_z,
                                        const int n_kicks) {
 
-    // SR damping constant, adjusted for better performance
-    const float const_synch_rad = 1.0 - 2.0 / tau_z;
-
-    for (int j = 0; j < n_kicks; j++) {
-        // SR damping term due to energy spread and
-        // Average energy change due to SR
-        #pragma omp parallel for
-        for (int i = 0; i < n_macroparticles; i++)
-            beam_dE[i] = beam_dE[i] * const_synch_rad - U0;
-
-        // #pragma omp parallel for
-        // for (int i = 0; i < n_macroparticles; i++)
-        //     beam_dE[i] -= U0;
-    }
+    synchrotron_radiation_kernel(beam_dE, U0, n_macroparticles, tau_z,
+                                 n_kicks);
 }
 
 
 // This function calculates and applies synchrotron radiation damping and
 // quantum excitation terms
-extern "C" void synchrotron_radiation_fullf(float * __restrict__ beam_dE, const float U0,
+extern "C" void synchrotron_radiation_fullf(float * __restrict__ beam_dE,
+        const long * __restrict__ beam_id, const float U0,
         const int n_macroparticles, const float sigma_dE,
         const float tau_z, const float energy,
-        // float * __restrict__ random_array,
-        const int n_kicks)
+        const int n_kicks, const uint64_t key0, const uint64_t key1,
+        const uint64_t stream, const uint64_t turn)
 {
-
-    std::hash<std::thread::id> hash;
-
-    // Quantum excitation constant
-    const float const_quantum_exc = 2.0 * sigma_dE / sqrt(tau_z) * energy;
-
-    // Adjusted SR damping constant
-    const float const_synch_rad = 1.0 - 2.0 / tau_z;
-
-    // Random number generator for the quantum excitation term
-
-    for (int j = 0; j < n_kicks; j++) {
-        // Compute synchrotron radiation damping term and
-        // Applies the quantum excitation term
-        #pragma omp parallel
-        {
-            static __thread mt19937_64 *gen = nullptr;
-            if (!gen) gen = new mt19937_64(seed + omp_get_thread_num());
-            static __thread normal_distribution<float> dist(0.0, 1.0);
-            #pragma omp for
-            for (int i = 0; i < n_macroparticles; i++) {
-                beam_dE[i] = beam_dE[i] * const_synch_rad
-                             + const_quantum_exc * dist(*gen)
-                             - U0;
-            }
-        }
-    }
+    const philox_key_t key = {key0, key1};
+    synchrotron_radiation_full_kernel(beam_dE, beam_id, U0, n_macroparticles,
+                                      sigma_dE, tau_z, energy, n_kicks, key,
+                                      stream, turn);
 }
-
-
-extern "C" void set_random_seed(const int _seed) {
-    seed = _seed;
-}
\ No newline at end of file
@@ -19,6 +19,7 @@ import numpy as np
 # import ctypes
 from scipy.constants import e, c, epsilon_0, hbar
 from ..utils import bmath as bm
+from ..utils import counter_rng
 try:
     from pyprof import timing
     # from pyprof import mpiprof
@@ -82,8 +83,11 @@ class SynchrotronRadiation(object):
                 self.track = self.track_SR_python
         else:
             if quantum_excitation:
-                if seed is not None:
-                    bm.set_random_seed(seed)
+                # Key and stream of the counter-based random numbers of the
+                # quantum excitation, one stream per RF section
+                self.rng_key = counter_rng.philox_key(seed)
+                self.rng_stream = counter_rng.SR_STREAM \
+                    + (self.rf_params.section_index << 20)
                 self.track = self.track_full_C
             else:
                 self.track = self.track_SR_C
@@ -186,4 +190,6 @@ class SynchrotronRadiation(object):
 
         bm.synchrotron_radiation_full(self.beam.dE, self.U0, self.n_kicks,
                                       self.tau_z, self.sigma_dE,
-                                      self.ring.energy[0, i_turn])
+                                      self.ring.energy[0, i_turn],
+                                      id=self.beam.id, key=self.rng_key,
+                                      stream=self.rng_stream, turn=i_turn)
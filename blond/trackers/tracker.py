@@ -18,9 +18,12 @@ from __future__ import division
 from builtins import range, object
 import numpy as np
 from scipy.integrate import cumtrapz
+from scipy.constants import e
 # import ctypes
 import warnings
 from ..utils import bmath as bm
+from ..impedances.impedance import InducedVoltageTime, InducedVoltageFreq
+from ..beam.sparse_slices import SparseProfile
 
 try:
     from pyprof import timing
@@ -70,7 +73,8 @@ class FullRingAndRF(object):
         applied in order to be able to see the min/max that might be exactly on
         the edges of the frame (by adding a % to the length of the frame, this
         is set to 0 by default. It assumes also that the slippage factor is the
-        same in the whole ring.
+        same in the whole ring. A 2D time_array is treated as a stack of
+        frames, one potential well being computed per row.
         """
 
         voltages = np.array([])
@@ -114,16 +118,21 @@ class FullRingAndRF(object):
 
             time_array = np.linspace(float(first_dt), float(last_dt), n_points)
 
+        # A 2D time_array gives one potential well per row
+        time_array = np.asarray(time_array)
         self.total_voltage = np.sum(voltages.T *
-                                    np.sin(omega_rf.T*time_array + phi_offsets.T), axis=0)
+                                    np.sin(omega_rf.T*time_array[..., None, :]
+                                           + phi_offsets.T), axis=-2)
 
         eom_factor_potential = np.sign(slippage_factor)*charge / \
             (RingAndRFSectionElement.t_rev[turn])
 
         potential_well = - cumtrapz(eom_factor_potential*(self.total_voltage -
                                                           (- RingAndRFSectionElement.acceleration_kick[turn])/abs(charge)),
-                                    dx=time_array[1] - time_array[0], initial=0)
-        potential_well = potential_well - np.min(potential_well)
+                                    initial=0, axis=-1) * \
+            (time_array[..., 1:2] - time_array[..., 0:1])
+        potential_well = potential_well - np.min(potential_well, axis=-1,
+                                                 keepdims=True)
 
         self.potential_well_coordinates = time_array
         self.potential_well = potential_well
@@ -239,12 +248,27 @@ class RingAndRFTracker(object):
         interpolation : bool (optional)
             Option to use sliced and interpolated voltage for the kicker; default 
             is False
+        rf_voltage_resync : int (optional)
+            Option to compute the sliced RF voltage from phasors of the RF
+            systems on the bin grid, rotated from turn to turn by the change
+            of RF frequency and phase, and recomputed from scratch every
+            rf_voltage_resync turns to bound the accumulated rounding; default
+            is None (RF voltage computed from scratch every turn)
+        fused_max_slices : int
+            Largest number of slices for which track_n_turns fuses the
+            induced voltage into the C++ kernel; beyond it the direct
+            convolution is slower than the FFTs of TotalInducedVoltage
 
     """
 
+    # Measured crossover of the O(n_slices**2) direct convolution against
+    # the FFT path, independent of the number of macro-particles
+    fused_max_slices = 256
+
     def __init__(self, RFStation, Beam, solver='simple', BeamFeedback=None,
                  NoiseFeedback=None, CavityFeedback=None, periodicity=False,
-                 interpolation=False, Profile=None, TotalInducedVoltage=None):
+                 interpolation=False, Profile=None, TotalInducedVoltage=None,
+                 rf_voltage_resync=None):
 
         # Set up logging
         # self.logger = logging.getLogger(__class__.__name__)
@@ -327,6 +351,21 @@ class RingAndRFTracker(object):
             warnings.warn('Setting interpolation to TRUE')
             # self.logger.warning("Setting interpolation to TRUE")
 
+        if rf_voltage_resync is not None:
+            try:
+                rf_voltage_resync = int(rf_voltage_resync)
+            except:
+                rf_voltage_resync = 0
+            if rf_voltage_resync < 1:
+                # ResyncError
+                raise RuntimeError("ERROR in RingAndRFTracker: Choice of" +
+                                   " rf_voltage_resync not recognised!")
+        self.rf_voltage_resync = rf_voltage_resync
+        # Phasors of the RF systems on the bin grid and the RF frequency,
+        # phase and bin grid they were computed for
+        self.rf_phasors = None
+        self._phasor_state = None
+
     
     def use_gpu(self):
         # There has to be a previous call to bm.use_gpu() to enable gpu mode
@@ -423,18 +462,67 @@ class RingAndRFTracker(object):
             self.rf_voltage = voltages[0] * self.cavityFB.V_corr * \
                 bm.sin(omega_rf[0]*self.profile.bin_centers +
                        phi_rf[0] + self.cavityFB.phi_corr) + \
-                bm.rf_volt_comp(voltages[1:], omega_rf[1:], phi_rf[1:],
-                                self.profile.bin_centers)
+                self._rf_volt_comp(voltages[1:], omega_rf[1:], phi_rf[1:])
         else:
-            self.rf_voltage = bm.rf_volt_comp(voltages, omega_rf, phi_rf,
-                                              self.profile.bin_centers)
-
-    def pre_track(self):
+            self.rf_voltage = self._rf_volt_comp(voltages, omega_rf, phi_rf)
+
+    def _rf_volt_comp(self, voltages, omega_rf, phi_rf):
+        # Sliced RF voltage, from the phasors if rf_voltage_resync is set and
+        # the bins are equally spaced, from scratch otherwise
+        bin_centers = self.profile.bin_centers
+        n_bins = len(bin_centers)
+        if (self.rf_voltage_resync is None) or (n_bins < 2) or \
+                (len(voltages) == 0):
+            return bm.rf_volt_comp(voltages, omega_rf, phi_rf, bin_centers)
+
+        bin_start = bin_centers[0]
+        bin_width = (bin_centers[-1] - bin_centers[0]) / (n_bins - 1)
+        grid = (bin_start, bin_width, n_bins)
+        omega_rf = np.array(omega_rf, dtype=float)
+        phi_rf = np.array(phi_rf, dtype=float)
+
+        state = self._phasor_state
+        reset = (state is None) or (state['grid'] != grid) or \
+            (len(state['omega_rf']) != len(omega_rf)) or \
+            (state['turns'] >= self.rf_voltage_resync)
+        if reset:
+            if not np.allclose(np.diff(bin_centers), bin_width,
+                               rtol=1e-6, atol=0):
+                return bm.rf_volt_comp(voltages, omega_rf, phi_rf,
+                                       bin_centers)
+            self.rf_phasors = np.zeros((2, len(omega_rf), n_bins),
+                                       dtype=bm.precision.real_t)
+            state = {'grid': grid, 'omega_rf': omega_rf, 'phi_rf': phi_rf,
+                     'turns': 0}
+            self._phasor_state = state
+
+        rf_voltage = bm.rf_volt_phasor(voltages, omega_rf, phi_rf,
+                                       omega_rf - state['omega_rf'],
+                                       phi_rf - state['phi_rf'],
+                                       bin_start, bin_width,
+                                       self.rf_phasors, reset=reset)
+        state['omega_rf'] = omega_rf
+        state['phi_rf'] = phi_rf
+        state['turns'] += 1
+        return rf_voltage
+
+    def pre_track(self, histo_wait=None, rf_voltage=True):
         """Tracking method for the section. Applies first the kick, then the 
         drift. Calls also RF/beam feedbacks if applicable. Updates the counter
         of the corresponding RFStation class and the energy-related variables
         of the Beam class.
 
+        Parameters
+        ----------
+        histo_wait : function
+            Optional; completes a histogram reduction in flight, e.g.
+            Profile.reduce_histo_wait. It is called right before the beam
+            feedback, which needs the profile, or else after the RF voltage
+            calculation, so that the reduction overlaps with it.
+        rf_voltage : bool
+            If False, the RF voltage is not calculated; used by
+            track_n_turns, which calculates it in the fused kernel.
+
         """
 
         # Add phase noise directly to the cavity RF phase
@@ -460,6 +548,9 @@ class RingAndRFTracker(object):
 
         # Determine phase loop correction on RF phase and frequency
         if self.beamFB is not None and turn >= self.beamFB.delay:
+            if histo_wait is not None:
+                histo_wait()
+                histo_wait = None
             self.beamFB.track()
 
         # Update the RF phase of all systems for the next turn
@@ -476,9 +567,12 @@ class RingAndRFTracker(object):
             pass
         else:
             if self.rf_params.empty is False:
-                if self.interpolation:
+                if self.interpolation and rf_voltage:
                     self.rf_voltage_calculation()
 
+        if histo_wait is not None:
+            histo_wait()
+
 
     def track_only(self):
         """Tracking method for the section. Applies first the kick, then the 
@@ -551,11 +645,17 @@ class RingAndRFTracker(object):
 
                     with timing.timed_region('comp:LIKick'):
                         # with mpiprof.traced_region('comp:LIKick'):
-                        bm.linear_interp_kick(dt=self.beam.dt, dE=self.beam.dE,
-                                              voltage=self.total_voltage,
-                                              bin_centers=self.profile.bin_centers,
-                                              charge=self.beam.Particle.charge,
-                                              acceleration_kick=self.acceleration_kick[turn])
+                        if isinstance(self.profile, SparseProfile):
+                            self.profile.linear_interp_kick(
+                                self.beam.dt, self.beam.dE,
+                                self.total_voltage, self.beam.Particle.charge,
+                                self.acceleration_kick[turn])
+                        else:
+                            bm.linear_interp_kick(dt=self.beam.dt, dE=self.beam.dE,
+                                                  voltage=self.total_voltage,
+                                                  bin_centers=self.profile.bin_centers,
+                                                  charge=self.beam.Particle.charge,
+                                                  acceleration_kick=self.acceleration_kick[turn])
                 else:
                     self.kick(self.beam.dt, self.beam.dE, turn)
 
@@ -574,6 +674,238 @@ class RingAndRFTracker(object):
         self.pre_track()
         self.track_only()
 
+    def track_n_turns(self, n_turns):
+        """Tracking method for several consecutive turns. The slicing, the
+        induced voltage of the TotalInducedVoltage object, the RF voltage,
+        the kick and the drift of every turn are computed in a single call to
+        the C++ library, without returning to Python in between. The result
+        is the same as calling Profile.track(),
+        TotalInducedVoltage.induced_voltage_sum() and track() once per turn.
+
+        The induced voltage is computed in the kernel by a direct
+        convolution, which costs O(n_slices**2) per turn, so it is only fused
+        up to fused_max_slices slices. Set-ups that need Python between the
+        turns (beam or cavity feedback, larger profiles or other induced
+        voltages, split beam in MPI mode, profile operations other than the
+        slicing) are tracked one turn per call instead: the feedbacks, the
+        histogram reduction and the induced voltage are computed in Python,
+        the RF voltage (without cavity feedback), kick, drift and slicing of
+        the next turn in the kernel. Periodicity, sparse profiles and the GPU
+        fall back to the turn-by-turn loop.
+
+        """
+        turn = self.counter[0]
+        if turn + n_turns > self.rf_params.n_turns:
+            # TurnError
+            raise RuntimeError("ERROR in RingAndRFTracker: Cannot track " +
+                               "beyond the last turn of the RFStation!")
+        if n_turns <= 0:
+            return
+
+        if not self._fused_tracking_allowed():
+            for i in range(n_turns):
+                if self.profile is not None:
+                    self.profile.track()
+                    if bm.mpiMode() and self.beam.is_splitted:
+                        self.profile.reduce_histo()
+                if self.totalInducedVoltage is not None:
+                    self.totalInducedVoltage.induced_voltage_sum()
+                self.track()
+            return
+
+        checkpoints = self._fused_checkpoints()
+        real_t = bm.precision.real_t
+        kwargs = {}
+        if self.profile is not None:
+            n_slices = self.profile.n_slices
+            if self.interpolation:
+                if (self.rf_voltage is None) or \
+                        (len(self.rf_voltage) != n_slices) or \
+                        (self.rf_voltage.dtype != real_t):
+                    self.rf_voltage = np.zeros(n_slices, dtype=real_t)
+                kwargs['rf_voltage'] = self.rf_voltage
+                kwargs['bin_centers'] = np.ascontiguousarray(
+                    self.profile.bin_centers, dtype=real_t)
+            kwargs['profile'] = self.profile.n_macroparticles
+            kwargs['cut_left'] = self.profile.cut_left
+            kwargs['cut_right'] = self.profile.cut_right
+        if (self.totalInducedVoltage is not None) and (not checkpoints):
+            kwargs['wake'] = self._fused_wake()
+            kwargs['induced_factor'] = -(self.beam.Particle.charge * e
+                                         * self.beam.ratio)
+            kwargs['induced_voltage'] = np.zeros(n_slices, dtype=real_t)
+
+        # Programmes computed in windows of turns are tracked window by window
+        if self.rf_params.window is None:
+            step = n_turns
+        else:
+            step = max(self.rf_params.window - 2, 1)
+
+        def turns(programme):
+            return np.ascontiguousarray(programme[..., programmes],
+                                        dtype=real_t)
+
+        for start in range(turn, turn + n_turns, step):
+            n = min(step, turn + n_turns - start)
+
+            # Add phase noise and modulation for all the turns at once; with
+            # checkpoints, pre_track() adds them turn by turn
+            window = slice(start, start + n)
+            if not checkpoints:
+                if self.phi_noise is not None:
+                    if self.noiseFB is not None:
+                        self.phi_rf[:, window] += \
+                            self.noiseFB.x * self.phi_noise[:, window]
+                    else:
+                        self.phi_rf[:, window] += self.phi_noise[:, window]
+                if self.phi_modulation is not None:
+                    self.phi_rf[:, window] += \
+                        self.phi_modulation[0][:, window]
+                    self.omega_rf[:, window] += \
+                        self.phi_modulation[1][:, window]
+
+            # The drift of the last turn needs the programmes of turn n
+            programmes = slice(start, start + n + 1)
+            args = [turns(self.voltage), turns(self.omega_rf),
+                    turns(self.phi_rf),
+                    np.ascontiguousarray(self.acceleration_kick[window],
+                                         dtype=real_t),
+                    turns(self.t_rev), turns(self.eta_0), turns(self.eta_1),
+                    turns(self.eta_2), turns(self.alpha_0),
+                    turns(self.alpha_1), turns(self.alpha_2),
+                    turns(self.rf_params.beta), turns(self.rf_params.energy),
+                    self.solver, self.length_ratio, self.alpha_order,
+                    self.charge]
+
+            if checkpoints:
+                self._track_checkpoints(start, n, turn, turn + n_turns, args,
+                                        kwargs)
+            else:
+                with timing.timed_region('comp:trackNTurns'):
+                    bm.track_n_turns(self.beam.dt, self.beam.dE, 0, n, *args,
+                                     interpolation=self.interpolation,
+                                     **kwargs)
+
+        if (self.totalInducedVoltage is not None) and (not checkpoints):
+            self.totalInducedVoltage.induced_voltage = \
+                kwargs['induced_voltage']
+        if self.interpolation:
+            self.total_voltage = self.rf_voltage
+            if self.totalInducedVoltage is not None:
+                self.total_voltage = self.rf_voltage \
+                    + self.totalInducedVoltage.induced_voltage
+
+        # Updating the beam synchronous momentum etc.
+        turn += n_turns
+        self.beam.beta = self.rf_params.beta[turn]
+        self.beam.gamma = self.rf_params.gamma[turn]
+        self.beam.energy = self.rf_params.energy[turn]
+        self.beam.momentum = self.rf_params.momentum[turn]
+
+        self.counter[0] = turn
+
+    def _track_checkpoints(self, start, n_turns, first, end, args, kwargs):
+        """Tracks n_turns turns from turn start, one kernel call per turn.
+        The profile reduction, the feedbacks and the induced voltage are
+        computed in Python between the calls. The kernel slices the beam
+        after the drift, for the next turn, except after the last turn (end)
+        of track_n_turns; the first turn (first) is sliced in Python.
+        """
+        real_t = bm.precision.real_t
+        kwargs = dict(kwargs)
+        # Programmes updated by pre_track(), copied for the kernel every turn
+        omega_rf, phi_rf = args[1], args[2]
+        kernel_slicing = (self.profile is not None) and \
+            (self.profile.operations == [self.profile._slice])
+        # The cavity feedback corrects the RF voltage bin by bin
+        rf_voltage_given = self.interpolation and (self.cavityFB is not None)
+
+        for i in range(n_turns):
+            turn = start + i
+            if self.profile is not None:
+                if (turn == first) or (not kernel_slicing):
+                    self.profile.track()
+                if bm.mpiMode() and self.beam.is_splitted:
+                    self.profile.reduce_histo()
+                kwargs['profile'] = self.profile.n_macroparticles
+            if self.totalInducedVoltage is not None:
+                self.totalInducedVoltage.induced_voltage_sum()
+                kwargs['induced_voltage'] = np.ascontiguousarray(
+                    self.totalInducedVoltage.induced_voltage, dtype=real_t)
+
+            self.pre_track(rf_voltage=rf_voltage_given)
+            if rf_voltage_given:
+                kwargs['rf_voltage'] = np.ascontiguousarray(
+                    self.rf_voltage, dtype=real_t)
+            omega_rf[:, i] = self.omega_rf[:, turn]
+            phi_rf[:, i] = self.phi_rf[:, turn]
+
+            if kernel_slicing and (turn + 1 < end):
+                slicing = 2
+            else:
+                slicing = 0
+            with timing.timed_region('comp:trackNTurns'):
+                bm.track_n_turns(self.beam.dt, self.beam.dE, i, 1, *args,
+                                 interpolation=self.interpolation,
+                                 slicing=slicing,
+                                 rf_voltage_given=rf_voltage_given, **kwargs)
+
+            # Updating the beam synchronous momentum etc. for the feedbacks
+            self.beam.beta = self.rf_params.beta[turn + 1]
+            self.beam.gamma = self.rf_params.gamma[turn + 1]
+            self.beam.energy = self.rf_params.energy[turn + 1]
+            self.beam.momentum = self.rf_params.momentum[turn + 1]
+            self.counter[0] += 1
+
+    def _fused_tracking_allowed(self):
+        """Checks whether the set-up can be tracked by the fused kernel.
+        """
+        if self.periodicity or self.rf_params.empty or bm.gpuMode():
+            return False
+        if isinstance(self.profile, SparseProfile):
+            return False
+        return True
+
+    def _fused_checkpoints(self):
+        """Checks whether the fused tracking has to return to Python after
+        every turn, for the feedbacks, the histogram reduction of a split
+        beam, the profile operations other than the slicing or an induced
+        voltage that the kernel cannot compute.
+        """
+        if (self.beamFB is not None) or (self.cavityFB is not None):
+            return True
+        if bm.mpiMode() and self.beam.is_splitted:
+            return True
+        if (self.profile is not None) and \
+                (self.profile.operations != [self.profile._slice]):
+            return True
+        if self.totalInducedVoltage is not None:
+            if (not self.interpolation) or \
+                    (self.totalInducedVoltage.profile is not self.profile) or \
+                    (self.profile.n_slices > self.fused_max_slices):
+                return True
+            for obj in self.totalInducedVoltage.induced_voltage_list:
+                if (type(obj) not in [InducedVoltageTime, InducedVoltageFreq]) \
+                        or obj.multi_turn_wake \
+                        or (obj.n_fft != 2 * (len(obj.total_impedance) - 1)):
+                    return True
+        return False
+
+    def _fused_wake(self):
+        """Sums the one-turn wakes of all the induced voltage objects into a
+        kernel of length 2*n_slices-1, centred at index n_slices-1. The
+        circular convolution of the profile with this kernel is the
+        induced voltage of TotalInducedVoltage.induced_voltage_sum().
+        """
+        n_slices = self.profile.n_slices
+        indexes = np.arange(-(n_slices - 1), n_slices)
+        wake = np.zeros(2 * n_slices - 1, dtype=float)
+        for obj in self.totalInducedVoltage.induced_voltage_list:
+            wake += np.fft.irfft(obj.total_impedance,
+                                 obj.n_fft)[indexes % obj.n_fft]
+
+        return wake.astype(bm.precision.real_t, order='C')
+
     # def track(self):
     #     """Tracking method for the section. Applies first the kick, then the
     #     drift. Calls also RF/beam feedbacks if applicable. Updates the counter
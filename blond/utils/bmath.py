@@ -44,15 +44,28 @@ _CPU_func_dict = {
     'beam_phase': butils_wrap.beam_phase,
     'kick': butils_wrap.kick,
     'rf_volt_comp': butils_wrap.rf_volt_comp,
+    'rf_volt_phasor': butils_wrap.rf_volt_phasor,
     'drift': butils_wrap.drift,
     'linear_interp_kick': butils_wrap.linear_interp_kick,
+    'sparse_linear_interp_kick': butils_wrap.sparse_linear_interp_kick,
     'fast_resonator': butils_wrap.fast_resonator,
     'LIKick_n_drift': butils_wrap.linear_interp_kick_n_drift,
+    'track_n_turns': butils_wrap.track_n_turns,
     'synchrotron_radiation': butils_wrap.synchrotron_radiation,
     'synchrotron_radiation_full': butils_wrap.synchrotron_radiation_full,
     # 'linear_interp_time_translation': butils_wrap.linear_interp_time_translation,
     'slice': butils_wrap.slice,
     'slice_smooth': butils_wrap.slice_smooth,
+    'sparse_profile_histogram': butils_wrap.sparse_profile_histogram,
+    'workspace_allocate': butils_wrap.workspace_allocate,
+    'workspace_resize': butils_wrap.workspace_resize,
+    'workspace_release': butils_wrap.workspace_release,
+    'workspace_bytes': butils_wrap.workspace_bytes,
+    'sort_particles': butils_wrap.sort_particles,
+    'random_uniform': butils_wrap.random_uniform,
+    'random_normal': butils_wrap.random_normal,
+    'beam_statistics': butils_wrap.beam_statistics,
+    'bunch_statistics': butils_wrap.bunch_statistics,
     'music_track': butils_wrap.music_track,
     'music_track_multiturn': butils_wrap.music_track_multiturn,
 
@@ -115,6 +128,10 @@ def gpuMode():
     return globals()['device'] == 'GPU'
 
 
+def fftwMode():
+    return globals()['irfft'] is butils_wrap.irfft
+
+
 def enable_gpucache():
     from ..gpu import cucache as cc
     cc.enable_cache()
@@ -239,6 +256,11 @@ def use_gpu(comps=[], gpu_id=0):
         'add': butils_wrap.add,
         'mul': butils_wrap.mul,
         'fast_resonator': butils_wrap.fast_resonator,
+        'sort_particles': butils_wrap.sort_particles,
+        'random_uniform': butils_wrap.random_uniform,
+        'random_normal': butils_wrap.random_normal,
+        'beam_statistics': butils_wrap.beam_statistics,
+        'bunch_statistics': butils_wrap.bunch_statistics,
         'music_track': butils_wrap.music_track,
         'music_track_multiturn': butils_wrap.music_track_multiturn,
         'diff': np.diff,
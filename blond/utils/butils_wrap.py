@@ -420,9 +420,9 @@ def interp_const_space(x, xp, yp, left=None, right=None, result=None):
 
 def rfft(a, n=0, result=None):
     a = a.astype(dtype=precision.real_t, order='C', copy=False)
-    if (n == 0) and (result == None):
+    if (n == 0) and (result is None):
         result = np.empty(len(a)//2 + 1, dtype=precision.complex_t, order='C')
-    elif (n != 0) and (result == None):
+    elif (n != 0) and (result is None):
         result = np.empty(n//2 + 1, dtype=precision.complex_t, order='C')
 
     if precision.num == 1:
@@ -444,9 +444,9 @@ def rfft(a, n=0, result=None):
 def irfft(a, n=0, result=None):
     a = a.astype(dtype=precision.complex_t, order='C', copy=False)
 
-    if (n == 0) and (result == None):
+    if (n == 0) and (result is None):
         result = np.empty(2*(len(a)-1), dtype=precision.real_t, order='C')
-    elif (n != 0) and (result == None):
+    elif (n != 0) and (result is None):
         result = np.empty(n, dtype=precision.real_t, order='C')
 
     if precision.num == 1:
@@ -491,9 +491,9 @@ def irfft_packed(signal, fftsize=0, result=None):
     signal = np.ascontiguousarray(np.reshape(
         signal, -1), dtype=precision.complex_t)
 
-    if (fftsize == 0) and (result == None):
+    if (fftsize == 0) and (result is None):
         result = np.empty(howmany * 2*(n0-1), dtype=precision.real_t)
-    elif (fftsize != 0) and (result == None):
+    elif (fftsize != 0) and (result is None):
         result = np.empty(howmany * fftsize, dtype=precision.real_t)
 
     if precision.num == 1:
@@ -609,6 +609,52 @@ def rf_volt_comp(voltages, omega_rf, phi_rf, bin_centers):
     return rf_voltage
 
 
+def rf_volt_phasor(voltages, omega_rf, phi_rf, domega_rf, dphi_rf, bin_start,
+                   bin_width, phasors, reset=False):
+
+    voltages = voltages.astype(dtype=precision.real_t, order='C', copy=False)
+    omega_rf = omega_rf.astype(dtype=precision.real_t, order='C', copy=False)
+    phi_rf = phi_rf.astype(dtype=precision.real_t, order='C', copy=False)
+    domega_rf = domega_rf.astype(dtype=precision.real_t, order='C', copy=False)
+    dphi_rf = dphi_rf.astype(dtype=precision.real_t, order='C', copy=False)
+    assert phasors.dtype == precision.real_t
+    assert phasors.flags['C_CONTIGUOUS']
+
+    n_bins = phasors.shape[-1]
+    rf_voltage = np.zeros(n_bins, dtype=precision.real_t, order='C')
+
+    if precision.num == 1:
+        __lib.rf_volt_phasorf(__getPointer(voltages),
+                              __getPointer(omega_rf),
+                              __getPointer(phi_rf),
+                              __getPointer(domega_rf),
+                              __getPointer(dphi_rf),
+                              __c_real(bin_start),
+                              __c_real(bin_width),
+                              __getLen(voltages),
+                              ct.c_int(n_bins),
+                              ct.c_bool(reset),
+                              __getPointer(phasors[0]),
+                              __getPointer(phasors[1]),
+                              __getPointer(rf_voltage))
+    else:
+        __lib.rf_volt_phasor(__getPointer(voltages),
+                             __getPointer(omega_rf),
+                             __getPointer(phi_rf),
+                             __getPointer(domega_rf),
+                             __getPointer(dphi_rf),
+                             __c_real(bin_start),
+                             __c_real(bin_width),
+                             __getLen(voltages),
+                             ct.c_int(n_bins),
+                             ct.c_bool(reset),
+                             __getPointer(phasors[0]),
+                             __getPointer(phasors[1]),
+                             __getPointer(rf_voltage))
+
+    return rf_voltage
+
+
 def kick(dt, dE, voltage, omega_rf, phi_rf, charge, n_rf, acceleration_kick):
     assert isinstance(dt[0], precision.real_t)
     assert isinstance(dE[0], precision.real_t)
@@ -717,6 +763,64 @@ def linear_interp_kick(dt, dE, voltage,
                                  __c_real(acceleration_kick))
 
 
+def sparse_profile_histogram(dt, profile, cut_left, bin_size, window_offsets):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(profile[0, 0], precision.real_t)
+    assert window_offsets.dtype == np.int32
+
+    if precision.num == 1:
+        __lib.sparse_profile_histogramf(__getPointer(dt),
+                                        __getPointer(profile),
+                                        __c_real(cut_left),
+                                        __c_real(bin_size),
+                                        __getPointer(window_offsets),
+                                        ct.c_int(profile.shape[0]),
+                                        ct.c_int(profile.shape[1]),
+                                        __getLen(dt))
+    else:
+        __lib.sparse_profile_histogram(__getPointer(dt),
+                                       __getPointer(profile),
+                                       __c_real(cut_left),
+                                       __c_real(bin_size),
+                                       __getPointer(window_offsets),
+                                       ct.c_int(profile.shape[0]),
+                                       ct.c_int(profile.shape[1]),
+                                       __getLen(dt))
+
+
+def sparse_linear_interp_kick(dt, dE, voltage, cut_left, bin_size,
+                              window_offsets, charge, acceleration_kick):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+    assert isinstance(voltage[0, 0], precision.real_t)
+    assert window_offsets.dtype == np.int32
+
+    if precision.num == 1:
+        __lib.sparse_linear_interp_kickf(__getPointer(dt),
+                                         __getPointer(dE),
+                                         __getPointer(voltage),
+                                         __c_real(cut_left),
+                                         __c_real(bin_size),
+                                         __getPointer(window_offsets),
+                                         ct.c_int(voltage.shape[0]),
+                                         ct.c_int(voltage.shape[1]),
+                                         __c_real(charge),
+                                         __getLen(dt),
+                                         __c_real(acceleration_kick))
+    else:
+        __lib.sparse_linear_interp_kick(__getPointer(dt),
+                                        __getPointer(dE),
+                                        __getPointer(voltage),
+                                        __c_real(cut_left),
+                                        __c_real(bin_size),
+                                        __getPointer(window_offsets),
+                                        ct.c_int(voltage.shape[0]),
+                                        ct.c_int(voltage.shape[1]),
+                                        __c_real(charge),
+                                        __getLen(dt),
+                                        __c_real(acceleration_kick))
+
+
 def linear_interp_kick_n_drift(dt, dE, total_voltage, bin_centers, charge, acc_kick,
                                solver, t_rev, length_ratio, alpha_order, eta_0, eta_1,
                                eta_2, beta, energy):
@@ -769,6 +873,56 @@ def linear_interp_kick_n_drift(dt, dE, total_voltage, bin_centers, charge, acc_k
                                          __c_real(charge))
 
 
+def track_n_turns(dt, dE, start_turn, n_turns, voltage, omega_rf, phi_rf,
+                  acceleration_kick, t_rev, eta_0, eta_1, eta_2, alpha_0,
+                  alpha_1, alpha_2, beta, energy, solver, length_ratio,
+                  alpha_order, charge, interpolation=False, cut_left=0.,
+                  cut_right=0., bin_centers=None, profile=None,
+                  rf_voltage=None, wake=None, induced_factor=0.,
+                  induced_voltage=None, slicing=1, rf_voltage_given=False):
+    # slicing: 0 no histogram, 1 at the start of every turn, 2 after every
+    # drift. Without a wake, the given induced_voltage is added as it is.
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+    assert voltage.dtype == precision.real_t
+    assert voltage.flags['C_CONTIGUOUS']
+
+    n_rf, stride = voltage.shape
+
+    def __ptr(x):
+        # NULL pointer for the optional arrays
+        if x is None:
+            return ct.c_void_p(None)
+        assert x.dtype == precision.real_t
+        return __getPointer(x)
+
+    if profile is not None:
+        n_slices = len(profile)
+    elif bin_centers is not None:
+        n_slices = len(bin_centers)
+    else:
+        n_slices = 0
+
+    args = [__getPointer(dt), __getPointer(dE), __getLen(dt),
+            ct.c_int(start_turn), ct.c_int(n_turns), ct.c_int(n_rf),
+            ct.c_int(stride), __ptr(voltage), __ptr(omega_rf),
+            __ptr(phi_rf), __ptr(acceleration_kick), __ptr(t_rev),
+            __ptr(eta_0), __ptr(eta_1), __ptr(eta_2), __ptr(alpha_0),
+            __ptr(alpha_1), __ptr(alpha_2), __ptr(beta), __ptr(energy),
+            ct.c_char_p(solver), __c_real(length_ratio),
+            __c_real(alpha_order), __c_real(charge),
+            ct.c_int(int(interpolation)), ct.c_int(slicing),
+            ct.c_int(int(rf_voltage_given)), ct.c_int(n_slices),
+            __c_real(cut_left), __c_real(cut_right), __ptr(bin_centers),
+            __ptr(profile), __ptr(rf_voltage), __ptr(wake),
+            __c_real(induced_factor), __ptr(induced_voltage)]
+
+    if precision.num == 1:
+        __lib.track_n_turnsf(*args)
+    else:
+        __lib.track_n_turns(*args)
+
+
 def slice(dt, profile, cut_left, cut_right):
     assert isinstance(dt[0], precision.real_t)
     assert isinstance(profile[0], precision.real_t)
@@ -815,6 +969,98 @@ def slice_smooth(dt, profile, cut_left, cut_right):
                                __getLen(dt))
 
 
+# Scratch buffers of the C++ routines. A buffer holds n elements of dtype
+# per thread; threads=0 means one slot per OpenMP thread.
+def workspace_allocate(n, dtype=None, threads=0):
+    if dtype is None:
+        dtype = precision.real_t
+    __lib.workspace_allocate(ct.c_int(n), ct.c_int(np.dtype(dtype).itemsize),
+                             ct.c_int(threads))
+
+
+def workspace_resize(old_n, new_n, dtype=None, threads=0):
+    if dtype is None:
+        dtype = precision.real_t
+    __lib.workspace_resize(ct.c_int(old_n), ct.c_int(new_n),
+                           ct.c_int(np.dtype(dtype).itemsize),
+                           ct.c_int(threads))
+
+
+def workspace_release(n=0, dtype=None, threads=0):
+    if dtype is None:
+        dtype = precision.real_t
+    __lib.workspace_release(ct.c_int(n), ct.c_int(np.dtype(dtype).itemsize),
+                            ct.c_int(threads))
+
+
+def workspace_bytes():
+    __lib.workspace_bytes.restype = ct.c_long
+    return __lib.workspace_bytes()
+
+
+# Sorts the particles with respect to dt, in place. dE and id are permuted
+# with dt; the order of the previous call is reused when almost sorted.
+def sort_particles(dt, dE, id=None):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+    assert len(dt) == len(dE)
+    if id is not None:
+        assert id.dtype == np.int64 and len(id) == len(dt)
+        id_ptr = __getPointer(id)
+    else:
+        id_ptr = None
+
+    if precision.num == 1:
+        __lib.sort_particlesf(__getPointer(dt), __getPointer(dE), id_ptr,
+                              __getLen(dt))
+    else:
+        __lib.sort_particles(__getPointer(dt), __getPointer(dE), id_ptr,
+                             __getLen(dt))
+
+
+def beam_statistics(dt, dE, id, result=None):
+    # Alive and lost particles, then mean, sum of squared deviations from the
+    # mean, min and max of dt and of dE, of the particles with id != 0
+    assert len(dt) == len(dE) == len(id) and id.dtype == np.int64
+    if result is None:
+        result = np.empty(10, dtype=np.float64)
+    if precision.num == 1:
+        __lib.beam_statisticsf(__getPointer(dt), __getPointer(dE),
+                               __getPointer(id), __getLen(dt),
+                               __getPointer(result))
+    else:
+        __lib.beam_statistics(__getPointer(dt), __getPointer(dE),
+                              __getPointer(id), __getLen(dt),
+                              __getPointer(result))
+    return result
+
+
+def bunch_statistics(dt, dE, id, n_bunches, bunch_spacing_buckets,
+                     bucket_length, t_offset=0, result=None):
+    # The statistics of beam_statistics for every bunch, one row per bunch;
+    # bunch i is the RF bucket i * bunch_spacing_buckets, counted from
+    # t_offset, the particles of the other buckets are left out
+    assert len(dt) == len(dE) == len(id) and id.dtype == np.int64
+    if result is None:
+        result = np.empty((n_bunches, 10), dtype=np.float64)
+    assert result.shape == (n_bunches, 10) and result.flags.c_contiguous
+    if precision.num == 1:
+        __lib.bunch_statisticsf(__getPointer(dt), __getPointer(dE),
+                                __getPointer(id), __getLen(dt),
+                                ct.c_double(t_offset),
+                                ct.c_double(bucket_length),
+                                ct.c_int(bunch_spacing_buckets),
+                                ct.c_int(n_bunches), __getPointer(result))
+    else:
+        __lib.bunch_statistics(__getPointer(dt), __getPointer(dE),
+                               __getPointer(id), __getLen(dt),
+                               ct.c_double(t_offset),
+                               ct.c_double(bucket_length),
+                               ct.c_int(bunch_spacing_buckets),
+                               ct.c_int(n_bunches), __getPointer(result))
+    return result
+
+
 def music_track(music):
     assert isinstance(music.beam.dt[0], precision.real_t)
     assert isinstance(music.beam.dE[0], precision.real_t)
@@ -921,33 +1167,53 @@ def synchrotron_radiation(dE, U0, n_kicks, tau_z):
             ct.c_int(n_kicks))
 
 
-def synchrotron_radiation_full(dE, U0, n_kicks, tau_z, sigma_dE, energy):
+def synchrotron_radiation_full(dE, U0, n_kicks, tau_z, sigma_dE, energy,
+                               id=None, key=0, stream=0, turn=0):
     assert isinstance(dE[0], precision.real_t)
+    if id is not None:
+        assert id.dtype == np.int64 and len(id) == len(dE)
+        id_ptr = __getPointer(id)
+    else:
+        id_ptr = None
 
     # dE = dE.astype(dtype=precision.real_t, order='C', copy=False)
 
-    if precision.num == 1:
-        __lib.synchrotron_radiation_fullf(
-            __getPointer(dE),
+    args = (__getPointer(dE),
+            id_ptr,
             __c_real(U0 / n_kicks),
             __getLen(dE),
             __c_real(sigma_dE),
             __c_real(tau_z * n_kicks),
             __c_real(energy),
-            ct.c_int(n_kicks))
+            ct.c_int(n_kicks)) + __philox_args(key, stream, turn)
+    if precision.num == 1:
+        __lib.synchrotron_radiation_fullf(*args)
     else:
-        __lib.synchrotron_radiation_full(
-            __getPointer(dE),
-            __c_real(U0 / n_kicks),
-            __getLen(dE),
-            __c_real(sigma_dE),
-            __c_real(tau_z * n_kicks),
-            __c_real(energy),
-            ct.c_int(n_kicks))
+        __lib.synchrotron_radiation_full(*args)
+
+
+def __philox_args(key, stream, turn):
+    return (ct.c_uint64(key & 0xFFFFFFFFFFFFFFFF), ct.c_uint64(key >> 64),
+            ct.c_uint64(stream), ct.c_uint64(turn))
+
+
+def random_uniform(key, first, n, stream=0, turn=0, result=None):
+    if result is None:
+        result = np.empty((n, 4), dtype=np.float64)
+    assert result.dtype == np.float64 and result.size == 4 * n
+    __lib.random_uniform(*__philox_args(key, stream, turn),
+                         ct.c_uint64(first), ct.c_int(n),
+                         __getPointer(result))
+    return result
 
 
-def set_random_seed(seed):
-    __lib.set_random_seed(ct.c_int(seed))
+def random_normal(key, first, n, stream=0, turn=0):
+    out0 = np.empty(n, dtype=np.float64)
+    out1 = np.empty(n, dtype=np.float64)
+    __lib.random_normal(*__philox_args(key, stream, turn),
+                        ct.c_uint64(first), ct.c_int(n),
+                        __getPointer(out0), __getPointer(out1))
+    return out0, out1
 
 
 def fast_resonator(R_S, Q, frequency_array, frequency_R, impedance=None):
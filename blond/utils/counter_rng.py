@@ -0,0 +1,80 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Counter-based random numbers of the macro-particles**
+
+The random numbers of a particle only depend on the seed, on its global
+index, on the stream number and on the turn, so that any subset of the
+particles can be generated independently, e.g. by each MPI worker or OpenMP
+thread, with the same result. Each (particle, stream, turn) triplet is one
+block of the Philox4x64-10 generator, with the particle index, the stream and
+the turn in the first three words of the counter, and gives four uniform
+numbers. The blocks are computed by libblond (cpp_routines/philox.h, which
+the C++ kernels use directly) and are identical to the ones of
+numpy.random.Philox.
+
+Streams in use:
+
+* 0, 1, ...: generation of the distributions (bigaussian, populate_bunch),
+  one stream per round of reinsertion
+* SPLIT_STREAM: random splitting of the beam between the MPI workers
+* SR_STREAM + (section << 20) + j: quantum excitation of the synchrotron
+  radiation in an RF section, kicks 4j to 4j+3
+
+:Authors: **Konstantinos Iliakis**
+'''
+
+from __future__ import division
+import numpy as np
+from . import bmath as bm
+
+SPLIT_STREAM = 1 << 32
+SR_STREAM = 2 << 32
+
+
+def philox_key(seed):
+    r"""Function returning the Philox key of a seed. A seed of None gives a
+    random key.
+
+    """
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    return int(seed) % (1 << 128)
+
+
+def uniforms(seed, first, n, stream=0, turn=0):
+    r"""Function returning the uniform random numbers in (0, 1) of the
+    particles first to first+n-1, as an (n, 4) array.
+
+    """
+
+    return bm.random_uniform(philox_key(seed), int(first), int(n),
+                             stream=int(stream), turn=int(turn))
+
+
+def normals(seed, first, n, stream=0, turn=0):
+    r"""Function returning two independent standard normal random numbers
+    per particle for the particles first to first+n-1, computed with the
+    Box-Muller transform.
+
+    """
+
+    return bm.random_normal(philox_key(seed), int(first), int(n),
+                            stream=int(stream), turn=int(turn))
+
+
+def permutation(seed, n, stream=SPLIT_STREAM):
+    r"""Function returning a random permutation of range(n), which only
+    depends on the seed.
+
+    """
+
+    return np.argsort(uniforms(seed, 0, n, stream)[:, 0], kind='stable')
@@ -105,6 +105,53 @@ parser.add_argument('-artificialdelay', '--artificialdelay', type=str,
                          'delay: delay increase percentage.\n' +
                          'Default: off. Example: 200,50,300,50,25,20')
 
+parser.add_argument('-cachedir', '--cachedir', type=str, default=None,
+                    help='Directory of the on-disk cache of the preprocessed '
+                    'momentum and rf programmes.'
+                    '\nDefault: None (no cache)')
+
+parser.add_argument('-splitgen', '--splitgen', type=int, default=0,
+                    choices=[0, 1],
+                    help='Every worker generates only its own share of the '
+                    'beam, instead of the master generating and scattering '
+                    'the full beam. The beam does not depend on the number '
+                    'of workers, but differs from the default one.'
+                    '\nDefault: 0 (generate the full beam and split it)')
+
+parser.add_argument('-sharedmem', '--sharedmem', type=int, default=0,
+                    choices=[0, 1],
+                    help='Keep a single copy per node of the programmes and '
+                    'impedance tables, shared by the workers of the node.'
+                    '\nDefault: 0 (one copy per worker)')
+
+parser.add_argument('-gennoise', '--gennoise', type=int, default=0,
+                    help='Generate the RF phase noise on demand, in windows '
+                    'of turns computed ahead by this many background threads, '
+                    'instead of loading the pregenerated noise from file.'
+                    '\nDefault: 0 (load from file)')
+
+parser.add_argument('-reduction', '--reduction', type=str, default='flat',
+                    choices=['flat', 'node'],
+                    help='How the histograms are summed over the workers: '
+                    'flat, a single allreduce over all the workers, or node, '
+                    'first within each node through shared memory, then '
+                    'among one worker per node.'
+                    '\nDefault: flat')
+
+parser.add_argument('-compacthisto', '--compacthisto', type=int, default=0,
+                    choices=[0, 1],
+                    help='Reduce the histograms with a compact encoding '
+                    'chosen every turn: only the occupied range of bins, '
+                    'as (index, count) pairs if sparse, else as uint16 or '
+                    'uint32 counts.'
+                    '\nDefault: 0')
+
+parser.add_argument('-rfresync', '--rfresync', type=int, default=None,
+                    help='Compute the sliced RF voltage from phasors rotated '
+                    'from turn to turn, recomputed from scratch every '
+                    'rfresync turns.'
+                    '\nDefault: None (from scratch every turn)')
+
 
 def parse():
     args = parser.parse_args()
@@ -0,0 +1,420 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Shared-memory communication backend of the Worker, for local processes**
+
+Runs the MPI main files on the processes of a single machine, without an MPI
+library or launcher:
+
+    python -m blond.utils.local_comm -n 4 main_file.py [arguments]
+
+The module implements the part of the mpi4py API that the Worker
+(utils/mpi_config.py) uses, and takes the place of mpi4py.MPI in the worker
+processes started by launch(). The reductions, broadcasts of buffers,
+barriers and shared windows work on memory shared by the processes of a
+communicator, without serialisation: every process writes its buffer in its
+row of the shared scratch area and reduces a slice of the columns, in place.
+The point-to-point messages and the gathers and scatters go through one
+multiprocessing queue per process.
+
+:Authors: **Konstantinos Iliakis**
+'''
+
+from __future__ import division
+import argparse
+import multiprocessing
+import os
+import runpy
+import socket
+import sys
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+# Set in the worker processes by launch(), None otherwise
+COMM_WORLD = None
+
+UNDEFINED = -32766
+IN_PLACE = object()
+COMM_NULL = None
+
+# Tag of the messages of the collective operations
+_COLLECTIVE_TAG = -1
+
+# Queues of all the processes, and the messages received before they were
+# asked for
+_inboxes = None
+_pending = []
+
+
+class Op:
+
+    def __init__(self, ufunc=None, function=None):
+        self.ufunc = ufunc
+        self.function = function
+
+    @classmethod
+    def Create(cls, function, commute=False):
+        # The function adds its first buffer to the second one
+        return cls(function=function)
+
+    def reduce(self, rows, out):
+        if self.ufunc is not None:
+            self.ufunc.reduce(rows, axis=0, dtype=out.dtype, out=out)
+        else:
+            out[...] = rows[0]
+            for row in rows[1:]:
+                self.function(row, out, None)
+
+
+SUM = Op(np.add)
+MAX = Op(np.maximum)
+MIN = Op(np.minimum)
+PROD = Op(np.multiply)
+
+
+class Datatype:
+
+    def __init__(self, count=1):
+        # Number of elements of the buffers in one item
+        self.count = count
+
+    def Create_contiguous(self, count):
+        return Datatype(self.count * count)
+
+    def Commit(self):
+        return self
+
+
+DOUBLE = Datatype()
+
+
+class Request:
+
+    def __init__(self, wait=None):
+        self.wait = wait
+
+    def Wait(self):
+        if self.wait is not None:
+            self.wait()
+            self.wait = None
+
+    @staticmethod
+    def Waitall(requests):
+        for request in requests:
+            request.Wait()
+
+
+REQUEST_NULL = Request()
+
+
+class Win:
+
+    def __init__(self, shm, offsets):
+        self.shm = shm
+        self.offsets = offsets
+
+    @classmethod
+    def Allocate_shared(cls, size, disp_unit=1, comm=None):
+        sizes = comm.allgather(size)
+        offsets = np.append([0], np.cumsum(sizes))
+        return cls(comm._shared_memory(max(int(offsets[-1]), 1)), offsets)
+
+    def Shared_query(self, rank):
+        return (self.shm.buf[self.offsets[rank]:self.offsets[rank + 1]], 1)
+
+    def Free(self):
+        # The memory is released with the process, once the arrays mapping
+        # it are gone
+        pass
+
+
+def Get_processor_name():
+    return socket.gethostname()
+
+
+def get_vendor():
+    return ('multiprocessing', sys.version_info[:3])
+
+
+def Wtime():
+    return time.time()
+
+
+def _array(buf):
+    # Flat view of a buffer argument
+    return np.asarray(buf).reshape(-1)
+
+
+class Comm:
+
+    def __init__(self, ranks, rank, comm_id, barrier=None):
+        # World ranks of the processes of the communicator
+        self.ranks = ranks
+        self.rank = rank
+        self.size = len(ranks)
+        self.id = comm_id
+        self.barrier = barrier
+        self.splits = 0
+        self.scratch = None
+
+    def _send(self, obj, dest, tag):
+        _inboxes[self.ranks[dest]].put((self.id, self.rank, tag, obj))
+
+    def _recv(self, source, tag):
+        for i, (comm_id, src, msg_tag, obj) in enumerate(_pending):
+            if (comm_id, src, msg_tag) == (self.id, source, tag):
+                del _pending[i]
+                return obj
+        inbox = _inboxes[self.ranks[self.rank]]
+        while True:
+            comm_id, src, msg_tag, obj = inbox.get()
+            if (comm_id, src, msg_tag) == (self.id, source, tag):
+                return obj
+            _pending.append((comm_id, src, msg_tag, obj))
+
+    def _shared_memory(self, n_bytes):
+        # Memory created by the first process and mapped by the others; the
+        # name is removed once all of them have mapped it
+        if self.rank == 0:
+            shm = shared_memory.SharedMemory(create=True, size=n_bytes)
+            self.bcast(shm.name)
+        else:
+            shm = shared_memory.SharedMemory(name=self.bcast(None))
+        self.Barrier()
+        if self.rank == 0:
+            shm.unlink()
+        return shm
+
+    def _rows(self, count, dtype):
+        # Scratch area with one row per process and a last row for the
+        # result, grown when needed; all the processes call it with the
+        # same arguments
+        n_bytes = (self.size + 1) * count * dtype.itemsize
+        if (self.scratch is None) or (self.scratch.size < n_bytes):
+            self.scratch = self._shared_memory(max(n_bytes, 1))
+        return np.ndarray(buffer=self.scratch.buf, dtype=dtype,
+                          shape=(self.size + 1, count))
+
+    def Barrier(self):
+        if self.size == 1:
+            return
+        if self.barrier is not None:
+            self.barrier.wait()
+        elif self.rank == 0:
+            for source in range(1, self.size):
+                self._recv(source, _COLLECTIVE_TAG)
+            for dest in range(1, self.size):
+                self._send(None, dest, _COLLECTIVE_TAG)
+        else:
+            self._send(None, 0, _COLLECTIVE_TAG)
+            self._recv(0, _COLLECTIVE_TAG)
+
+    def bcast(self, obj, root=0):
+        if self.rank == root:
+            for dest in range(self.size):
+                if dest != root:
+                    self._send(obj, dest, _COLLECTIVE_TAG)
+            return obj
+        return self._recv(root, _COLLECTIVE_TAG)
+
+    def gather(self, obj, root=0):
+        if self.rank != root:
+            self._send(obj, root, _COLLECTIVE_TAG)
+            return None
+        return [obj if source == root else
+                self._recv(source, _COLLECTIVE_TAG)
+                for source in range(self.size)]
+
+    def allgather(self, obj):
+        return self.bcast(self.gather(obj))
+
+    def Split(self, color=0, key=0):
+        members = self.allgather((color, key, self.rank))
+        self.splits += 1
+        if color == UNDEFINED:
+            return COMM_NULL
+        group = sorted((k, r) for c, k, r in members if c == color)
+        ranks = [self.ranks[r] for k, r in group]
+        # The whole world keeps its barrier
+        barrier = self.barrier if len(ranks) == self.size else None
+        return Comm(ranks, [r for k, r in group].index(self.rank),
+                    self.id + ((self.splits, color),), barrier)
+
+    def Free(self):
+        pass
+
+    def _reduce(self, sendbuf, recvbuf, op, root):
+        # root None: allreduce. The buffers can be given as [array, datatype]
+        if sendbuf is IN_PLACE:
+            sendbuf = recvbuf
+        count = 1
+        if isinstance(sendbuf, (list, tuple)):
+            sendbuf, count = sendbuf[0], sendbuf[-1].count
+        if isinstance(recvbuf, (list, tuple)):
+            recvbuf = recvbuf[0]
+        send = _array(sendbuf)
+        rows = self._rows(send.size, send.dtype)
+        rows[self.rank] = send
+        self.Barrier()
+
+        # Every process reduces a slice of the columns, of whole items
+        bounds = count * np.linspace(0, send.size // count,
+                                     self.size + 1).astype(int)
+        lo, hi = bounds[self.rank], bounds[self.rank + 1]
+        op.reduce(rows[:-1, lo:hi], rows[-1, lo:hi])
+        self.Barrier()
+
+        if (root is None) or (self.rank == root):
+            _array(recvbuf)[:] = rows[-1]
+        self.Barrier()
+
+    def Allreduce(self, sendbuf, recvbuf, op=SUM):
+        self._reduce(sendbuf, recvbuf, op, None)
+
+    def Iallreduce(self, sendbuf, recvbuf, op=SUM):
+        self._reduce(sendbuf, recvbuf, op, None)
+        return Request()
+
+    def Reduce(self, sendbuf, recvbuf, op=SUM, root=0):
+        self._reduce(sendbuf, recvbuf, op, root)
+
+    def Bcast(self, buf, root=0):
+        buf = _array(buf)
+        rows = self._rows(buf.size, buf.dtype)
+        if self.rank == root:
+            rows[-1] = buf
+        self.Barrier()
+        if self.rank != root:
+            buf[:] = rows[-1]
+        self.Barrier()
+
+    def Gatherv(self, sendbuf, recvbuf, root=0):
+        if self.rank != root:
+            self._send(np.array(sendbuf), root, _COLLECTIVE_TAG)
+            return
+        if isinstance(recvbuf, (list, tuple)):
+            recvbuf, counts, displs = recvbuf[:3]
+        else:
+            counts = [_array(sendbuf).size] * self.size
+            displs = np.arange(self.size) * counts[0]
+        recv = _array(recvbuf)
+        for source in range(self.size):
+            if source == root:
+                data = _array(sendbuf)
+            else:
+                data = _array(self._recv(source, _COLLECTIVE_TAG))
+            recv[displs[source]:displs[source] + counts[source]] = data
+
+    def Gather(self, sendbuf, recvbuf, root=0):
+        self.Gatherv(sendbuf, recvbuf, root)
+
+    def Allgatherv(self, sendbuf, recvbuf):
+        self.Gatherv(sendbuf, recvbuf, root=0)
+        if isinstance(recvbuf, (list, tuple)):
+            recvbuf = recvbuf[0]
+        _array(recvbuf)[:] = self.bcast(
+            _array(recvbuf) if self.rank == 0 else None)
+
+    def Allgather(self, sendbuf, recvbuf):
+        self.Allgatherv(sendbuf, recvbuf)
+
+    def Scatterv(self, sendbuf, recvbuf, root=0):
+        if self.rank != root:
+            _array(recvbuf)[:] = self._recv(root, _COLLECTIVE_TAG)
+            return
+        sendbuf, counts, displs = sendbuf[:3]
+        send = _array(sendbuf)
+        for dest in range(self.size):
+            data = send[displs[dest]:displs[dest] + counts[dest]]
+            if dest == root:
+                _array(recvbuf)[:] = data
+            else:
+                self._send(np.array(data), dest, _COLLECTIVE_TAG)
+
+    def Send(self, buf, dest, tag=0):
+        self._send(np.array(buf), dest, tag)
+
+    def Recv(self, buf, source, tag=0):
+        _array(buf)[:] = _array(self._recv(source, tag))
+
+    def Isend(self, buf, dest, tag=0):
+        self.Send(buf, dest, tag)
+        return Request()
+
+    def Irecv(self, buf, source, tag=0):
+        return Request(lambda: self.Recv(buf, source, tag))
+
+    def Sendrecv(self, sendbuf, dest, sendtag=0, recvbuf=None, source=0,
+                 recvtag=0):
+        self.Send(sendbuf, dest, sendtag)
+        self.Recv(recvbuf, source, recvtag)
+
+
+def _worker_main(rank, size, inboxes, barrier, target, args):
+    global COMM_WORLD, _inboxes
+    _inboxes = inboxes
+    COMM_WORLD = Comm(list(range(size)), rank, (), barrier)
+    if callable(target):
+        target(*args)
+    else:
+        sys.argv = [target] + list(args)
+        sys.path.insert(0, os.path.dirname(os.path.realpath(target)))
+        runpy.run_path(target, run_name='__main__')
+
+
+def launch(target, n_workers, args=()):
+    """Runs target, a main file or a function, on n_workers new processes
+    sharing COMM_WORLD, with args as command line arguments or function
+    arguments. If a process fails, the others are terminated. Returns the
+    highest exit code.
+    """
+
+    context = multiprocessing.get_context('spawn')
+    inboxes = [context.Queue() for _ in range(n_workers)]
+    barrier = context.Barrier(n_workers)
+    processes = [context.Process(target=_worker_main,
+                                 args=(rank, n_workers, inboxes, barrier,
+                                       target, args))
+                 for rank in range(n_workers)]
+    for process in processes:
+        process.start()
+
+    running = list(processes)
+    while running:
+        for process in running:
+            process.join(0.1)
+            if process.exitcode is None:
+                continue
+            running.remove(process)
+            if process.exitcode != 0:
+                for other in running:
+                    other.terminate()
+            break
+
+    return max(abs(process.exitcode) for process in processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Runs an MPI main file on local processes.')
+    parser.add_argument('-n', '--workers', type=int, default=os.cpu_count(),
+                        help='Number of worker processes. Default: cores')
+    parser.add_argument('main_file')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    sys.exit(launch(args.main_file, args.workers, args.args))
+
+
+if __name__ == '__main__':
+    # Through the package module, so that the workers initialise the module
+    # the Worker uses
+    from blond.utils import local_comm
+    local_comm.main()
@@ -1,6 +1,6 @@
 import sys
 import os
-from mpi4py import MPI
+import copy
 import numpy as np
 import logging
 from functools import wraps
@@ -14,10 +14,24 @@ except ImportError:
     mpiprof = timing
 
 from ..utils import bmath as bm
+from ..utils import local_comm
+
+# Communication backend: the local processes of local_comm.launch(), or MPI
+if local_comm.COMM_WORLD is not None:
+    MPI = local_comm
+else:
+    from mpi4py import MPI
 
 worker = None
 
 
+def _large_arrays(values, exclude, min_size):
+    # Names of the numpy arrays of at least min_size elements of values
+    return sorted(name for name, value in values.items()
+                  if isinstance(value, np.ndarray) and
+                  (value.size >= min_size) and (name not in exclude))
+
+
 def mpiprint(*args, all=False):
     if worker.isMaster or all:
         print('[{}]'.format(worker.rank), *args)
@@ -90,6 +104,16 @@ class Worker:
         self.gpu_id = -1
         self.hasGPU = False
 
+        # Windows of the node-shared arrays
+        self.shared_windows = []
+
+        # Sum reductions over all the workers, see initReduction()
+        self.reduction = 'flat'
+        self.leadercomm = None
+        self.reduction_buffers = {}
+        self.compact_histo = False
+        self.histo_buffers = {}
+
     def assignGPUs(self, num_gpus=0):
         # Here goes the gpu assignment
         if num_gpus > 0:
@@ -129,6 +153,25 @@ class Worker:
             mpiprof.mode = 'tracing'
             mpiprof.init(logfile=tracefile)
 
+    def initReduction(self, reduction='flat', compact_histo=False):
+        """Selects how the sums of allreduce and iallreduce over all the
+        workers are done. 'flat': a single allreduce over all the workers.
+        'node': the workers of a node first sum their arrays through a
+        shared memory window, the masters of the nodes then run a native
+        MPI.SUM allreduce among them, and the workers of each node read the
+        result back from the window, so that a single message per node
+        crosses the network. With compact_histo, the profiles reduce their
+        histograms with allreduce_histo(). Must be called by all the workers.
+        """
+
+        if reduction not in ['flat', 'node']:
+            raise RuntimeError('Reduction {} not recognized'.format(reduction))
+        self.reduction = reduction
+        self.compact_histo = compact_histo
+        if reduction == 'node' and self.leadercomm is None:
+            color = 0 if self.noderank == 0 else MPI.UNDEFINED
+            self.leadercomm = self.intercomm.Split(color, self.rank)
+
     def __del__(self):
         pass
         # if self.trace:
@@ -207,8 +250,7 @@ class Worker:
         total_size = int(self.intercomm.bcast(len(var), root=0))
 
         # Then calculate the counts (size for each worker)
-        counts = [total_size // self.workers + 1 if i < total_size % self.workers
-                  else total_size // self.workers for i in range(self.workers)]
+        counts = self.split_counts(total_size)
 
         if self.isMaster:
             displs = np.append([0], np.cumsum(counts[:-1]))
@@ -222,6 +264,12 @@ class Worker:
 
         return recvbuf
 
+    def split_counts(self, total_size):
+        # Number of elements of each worker when total_size elements are
+        # split among the workers, as done by scatter
+        return [total_size // self.workers + 1 if i < total_size % self.workers
+                else total_size // self.workers for i in range(self.workers)]
+
     @timing.timeit(key='comm:broadcast')
     # @mpiprof.traceit(key='comm:scatter')
     def broadcast(self, var, root=0):
@@ -236,6 +284,85 @@ class Worker:
 
         return recvbuf
 
+    @timing.timeit(key='serial:shared_array')
+    def shared_array(self, compute):
+        """Returns the array computed by compute() on the master of the node,
+        in memory shared by all the workers of the node (MPI-3 shared window).
+        The other workers of the node do not call compute() but map the
+        memory of the master, so that the node holds a single copy. The
+        array is read-only. All the workers of the node must call this
+        function, in the same order.
+        """
+
+        if self.noderank == 0:
+            data = np.ascontiguousarray(compute())
+            meta = (data.shape, data.dtype.str)
+        else:
+            data = None
+            meta = None
+        shape, dtype = self.nodecomm.bcast(meta, root=0)
+        dtype = np.dtype(dtype)
+        n_bytes = int(np.prod(shape)) * dtype.itemsize
+
+        win = MPI.Win.Allocate_shared(max(n_bytes, 1) if self.noderank == 0
+                                      else 0, dtype.itemsize,
+                                      comm=self.nodecomm)
+        buf, _ = win.Shared_query(0)
+        array = np.ndarray(buffer=buf, dtype=dtype, shape=shape)
+        if self.noderank == 0:
+            array[...] = data
+        self.nodecomm.Barrier()
+        array.flags.writeable = False
+
+        # The window is freed with the worker
+        self.shared_windows.append(win)
+        return array
+
+    def share_arrays(self, obj, attributes=None, exclude=[],
+                     min_size=1024):
+        """Replaces array attributes of obj (or values of a dict) by
+        read-only copies of the ones of the node master, shared by all the
+        workers of the node, see shared_array(). By default all the numpy
+        arrays of at least min_size elements are shared, except the excluded
+        ones. Only arrays that are identical on all workers and are not
+        modified during the tracking can be shared.
+        """
+
+        if isinstance(obj, dict):
+            values = obj
+        else:
+            values = vars(obj)
+        if attributes is None:
+            attributes = _large_arrays(values, exclude, min_size)
+
+        for name in attributes:
+            value = values[name]
+            values[name] = self.shared_array(lambda: value)
+
+    def shared_object(self, build, exclude=[], min_size=1024):
+        """Returns the object built by build() on the master of the node,
+        of which the array attributes selected as in share_arrays() are
+        shared by all the workers of the node. The other workers of the node
+        do not call build(), they receive the rest of the object, pickled,
+        so that the node builds and holds a single copy of the arrays. All
+        the workers of the node must call this function, in the same order.
+        """
+
+        if self.noderank == 0:
+            obj = build()
+            names = _large_arrays(vars(obj), exclude, min_size)
+            arrays = {name: getattr(obj, name) for name in names}
+            obj = copy.copy(obj)
+            for name in names:
+                setattr(obj, name, None)
+        else:
+            obj, names, arrays = None, None, None
+        obj, names = self.nodecomm.bcast((obj, names), root=0)
+
+        for name in names:
+            setattr(obj, name, self.shared_array(lambda: arrays.pop(name)))
+        return obj
+
     # @timing.timeit(key='comm:broadcast_reverse')
     # # @mpiprof.traceit(key='comm:scatter')
     # def broadcast_reverse(self, var):
@@ -318,6 +445,58 @@ class Worker:
             comm.Reduce(sendbuf, recvbuf, op=op, root=0)
             return sendbuf
 
+    def _reduction_buffer(self, size, dtype):
+        # Window shared by the workers of the node, with one row per worker
+        # and a last row for the sum, allocated once per dtype and grown to
+        # the largest size; the first size columns are returned
+        dtype = np.dtype(dtype)
+        key = dtype.str
+        win, rows = self.reduction_buffers.get(key, (None, None))
+        if (rows is None) or (rows.shape[1] < size):
+            if win is not None:
+                self.shared_windows.remove(win)
+                win.Free()
+            n_bytes = (self.nodeworkers + 1) * size * dtype.itemsize
+            win = MPI.Win.Allocate_shared(max(n_bytes, 1) if self.noderank == 0
+                                          else 0, dtype.itemsize,
+                                          comm=self.nodecomm)
+            buf, _ = win.Shared_query(0)
+            self.shared_windows.append(win)
+            rows = np.ndarray(buffer=buf, dtype=dtype,
+                              shape=(self.nodeworkers + 1, size))
+            self.reduction_buffers[key] = (win, rows)
+        return rows[:, :size]
+
+    @timing.timeit(key='comm:node_allreduce')
+    def node_allreduce(self, sendbuf, recvbuf=None):
+        """Two-level sum of sendbuf over all the workers, see
+        initReduction(). The result is written in recvbuf, or in sendbuf if
+        recvbuf is None.
+        """
+
+        if self.log:
+            self.logger.debug('node_allreduce')
+        if recvbuf is None:
+            recvbuf = sendbuf
+        rows = self._reduction_buffer(sendbuf.size, sendbuf.dtype)
+        rows[self.noderank] = sendbuf.ravel()
+        self.nodecomm.Barrier()
+
+        # Every worker of the node sums its share of the columns
+        bounds = np.linspace(0, sendbuf.size, self.nodeworkers + 1).astype(int)
+        lo, hi = bounds[self.noderank], bounds[self.noderank + 1]
+        np.sum(rows[:-1, lo:hi], axis=0, dtype=rows.dtype,
+               out=rows[-1, lo:hi])
+        self.nodecomm.Barrier()
+
+        if self.noderank == 0 and self.leadercomm.size > 1:
+            self.leadercomm.Allreduce(MPI.IN_PLACE, rows[-1], op=MPI.SUM)
+        self.nodecomm.Barrier()
+
+        # Written through, recvbuf may not be contiguous
+        np.copyto(recvbuf, rows[-1].reshape(recvbuf.shape))
+        return recvbuf
+
     @timing.timeit(key='comm:allreduce')
     # @mpiprof.traceit(key='comm:allreduce')
     def allreduce(self, sendbuf, recvbuf=None, dtype=np.uint32, operator='custom_sum',
@@ -368,7 +547,10 @@ class Worker:
                             recvbuf[2::3] * (recvbuf[1::3] - bm.mean(recvbuf[::3]))**2)
             return np.array([np.sqrt(totals / (np.sum(recvbuf[2::3]) - 1))])
 
-        if (recvbuf is None) or (sendbuf is recvbuf):
+        if self.reduction == 'node' and comm is self.intercomm and \
+                operator in ['custom_sum', 'sum', 'mean', 'avg']:
+            recvbuf = self.node_allreduce(sendbuf, recvbuf)
+        elif (recvbuf is None) or (sendbuf is recvbuf):
             comm.Allreduce(MPI.IN_PLACE, sendbuf, op=op)
             recvbuf = sendbuf
         else:
@@ -380,6 +562,117 @@ class Worker:
         else:
             return recvbuf
 
+    @timing.timeit(key='comm:allreduce_histo')
+    def allreduce_histo(self, histo):
+        """Sums in place the histogram histo (non-negative integer counts,
+        of any dtype) of all the workers, with an encoding chosen every call
+        from the statistics of the local histograms, agreed on with a single
+        allreduce of four numbers:
+        - the zero bins before the first and after the last occupied bin of
+          all the workers are skipped,
+        - if few bins are occupied, the (index, count) pairs of the occupied
+          bins are gathered and added up by every worker,
+        - otherwise the occupied range is reduced as uint16 if the sums are
+          sure to fit, else as uint32.
+        """
+
+        if self.log:
+            self.logger.debug('allreduce_histo')
+        occupied = np.flatnonzero(histo)
+        if len(occupied) > 0:
+            first, last = occupied[0], occupied[-1] + 1
+            max_count = int(histo[first:last].max())
+        else:
+            first, last = len(histo), 0
+            max_count = 0
+        stats = np.array([-first, last, max_count, len(occupied)],
+                         dtype=np.int64)
+        self.intercomm.Allreduce(MPI.IN_PLACE, stats, op=MPI.MAX)
+        first, last = -stats[0], stats[1]
+        if last <= first:
+            return histo
+        # Upper bounds of the summed counts and of the occupied bins
+        max_sum = stats[2] * self.workers
+        max_occupied = stats[3] * self.workers
+
+        dtype = np.uint16 if max_sum < 2**16 else np.uint32
+        if 2 * 4 * max_occupied < (last - first) * np.dtype(dtype).itemsize:
+            pairs = np.empty((len(occupied), 2), dtype=np.uint32)
+            pairs[:, 0] = occupied - first
+            pairs[:, 1] = histo[occupied]
+            pairs = self.allgather(pairs.ravel()).reshape(-1, 2)
+            histo[first:last] = np.bincount(pairs[:, 0], weights=pairs[:, 1],
+                                            minlength=last - first)
+        else:
+            # One buffer per dtype, grown to the largest occupied range
+            if (dtype not in self.histo_buffers) or \
+                    (len(self.histo_buffers[dtype]) < last - first):
+                self.histo_buffers[dtype] = np.empty(last - first, dtype=dtype)
+            buffer = self.histo_buffers[dtype][:last - first]
+            np.copyto(buffer, histo[first:last], casting='unsafe')
+            self.allreduce(buffer, dtype=dtype, operator='custom_sum')
+            histo[first:last] = buffer
+        return histo
+
+    @timing.timeit(key='comm:reduce_statistics')
+    def reduce_statistics(self, stats, all=False):
+        """Merges in place the beam statistics stats of all the workers,
+        arrays of structures of 10 doubles as given by bm.beam_statistics,
+        in a single reduction, on all the workers or only on the master.
+        """
+
+        if self.log:
+            self.logger.debug('reduce_statistics')
+        buffer = [stats, statistics_type]
+        if all:
+            self.intercomm.Allreduce(MPI.IN_PLACE, buffer, op=statistics_op)
+        elif self.isMaster:
+            self.intercomm.Reduce(MPI.IN_PLACE, buffer, op=statistics_op,
+                                  root=0)
+        else:
+            self.intercomm.Reduce(buffer, None, op=statistics_op, root=0)
+        return stats
+
+    def iallreduce(self, sendbuf, operator='custom_sum', comm=None):
+        # Non-blocking, in-place allreduce; the result is in sendbuf once
+        # the returned request has been waited for. With the node reduction
+        # the sums are done on the spot and the request is already complete.
+        # supported ops: sum, max, min, prod, custom_sum
+        if comm is None:
+            comm = self.intercomm
+
+        if self.log:
+            self.logger.debug('iallreduce')
+        operator = operator.lower()
+        if operator == 'custom_sum':
+            op = {'int16': add_op_int16, 'int32': add_op_int32,
+                  'uint16': add_op_uint16,
+                  'uint32': add_op_uint32, 'uint64': add_op_uint64,
+                  'float32': add_op_float32,
+                  'float64': add_op_float64}.get(sendbuf.dtype.name)
+            if op is None:
+                print('Error: Not recognized dtype:{}'.format(
+                    sendbuf.dtype.name))
+                exit(-1)
+        elif operator == 'sum':
+            op = MPI.SUM
+        elif operator == 'max':
+            op = MPI.MAX
+        elif operator == 'min':
+            op = MPI.MIN
+        elif operator == 'prod':
+            op = MPI.PROD
+        else:
+            print('Error: Not supported operator:{}'.format(operator))
+            exit(-1)
+
+        if self.reduction == 'node' and comm is self.intercomm and \
+                operator in ['custom_sum', 'sum']:
+            self.node_allreduce(sendbuf)
+            return MPI.REQUEST_NULL
+
+        return comm.Iallreduce(MPI.IN_PLACE, sendbuf, op=op)
+
     @timing.timeit(key='serial:sync')
     # @mpiprof.traceit(key='serial:sync')
     def sync(self):
@@ -503,59 +796,9 @@ class Worker:
         transactions = calc_transactions(
             dPi, cutoff=self.dlb['cutoff'] * P / self.workers)[self.rank]
         if dPi[self.rank] > 0 and len(transactions) > 0:
-            reqs = []
-            tot_to_send = np.sum([t[1] for t in transactions])
-            i = beam.n_macroparticles - tot_to_send
-            for t in transactions:
-                # I need to send t[1] particles to t[0]
-                # buf[:t[1]] de, then dt, then id
-                buf = np.empty(3*t[1], dtype=float)
-                buf[0:t[1]] = beam.dE[i:i+t[1]]
-                buf[t[1]:2*t[1]] = beam.dt[i:i+t[1]]
-                buf[2*t[1]:3*t[1]] = beam.id[i:i+t[1]]
-                i += t[1]
-                # self.logger.critical(
-                #     '[{}]: Sending {} parts to {}.'.format(self.rank, t[1], t[0]))
-                reqs.append(self.intercomm.Isend(buf, t[0]))
-            # Then I need to resize local beam.dt and beam.dE, also
-            # beam.n_macroparticles
-            beam.dE = beam.dE[:beam.n_macroparticles-tot_to_send]
-            beam.dt = beam.dt[:beam.n_macroparticles-tot_to_send]
-            beam.id = beam.id[:beam.n_macroparticles-tot_to_send]
-            beam.n_macroparticles -= tot_to_send
-            for req in reqs:
-                req.Wait()
-            # req[0].Waitall(req)
+            self.send_particles(beam, transactions, comm=self.intercomm)
         elif dPi[self.rank] < 0 and len(transactions) > 0:
-            reqs = []
-            recvbuf = []
-            for t in transactions:
-                # I need to receive t[1] particles from t[0]
-                # The buffer contains: de, dt, id
-                buf = np.empty(3*t[1], float)
-                recvbuf.append(buf)
-                # self.logger.critical(
-                #     '[{}]: Receiving {} parts from {}.'.format(self.rank, t[1], t[0]))
-                reqs.append(self.intercomm.Irecv(buf, t[0]))
-            for req in reqs:
-                req.Wait()
-            # req[0].Waitall(req)
-            # Then I need to resize local beam.dt and beam.dE, also
-            # beam.n_macroparticles
-            tot_to_recv = np.sum([t[1] for t in transactions])
-            beam.dE = np.resize(
-                beam.dE, beam.n_macroparticles + tot_to_recv)
-            beam.dt = np.resize(
-                beam.dt, beam.n_macroparticles + tot_to_recv)
-            beam.id = np.resize(
-                beam.id, beam.n_macroparticles + tot_to_recv)
-            i = beam.n_macroparticles
-            for buf, t in zip(recvbuf, transactions):
-                beam.dE[i:i+t[1]] = buf[0:t[1]]
-                beam.dt[i:i+t[1]] = buf[t[1]:2*t[1]]
-                beam.id[i:i+t[1]] = buf[2*t[1]:3*t[1]]
-                i += t[1]
-            beam.n_macroparticles += tot_to_recv
+            self.recv_particles(beam, transactions, comm=self.intercomm)
 
         if np.sum(np.abs(dPi))/2 < 1e-4 * P:
             self.interval = min(2*self.interval, 4000)
@@ -759,59 +1002,9 @@ class Worker:
         transactions = calc_transactions(
             dPi, cutoff=self.dlb['cutoff'] * P / self.nodeworkers)[self.noderank]
         if dPi[self.noderank] > 0 and len(transactions) > 0:
-            reqs = []
-            tot_to_send = np.sum([t[1] for t in transactions])
-            i = beam.n_macroparticles - tot_to_send
-            for t in transactions:
-                # I need to send t[1] particles to t[0]
-                # buf[:t[1]] de, then dt, then id
-                buf = np.empty(3*t[1], dtype=float)
-                buf[0:t[1]] = beam.dE[i:i+t[1]]
-                buf[t[1]:2*t[1]] = beam.dt[i:i+t[1]]
-                buf[2*t[1]:3*t[1]] = beam.id[i:i+t[1]]
-                i += t[1]
-                # self.logger.critical(
-                #     '[{}]: Sending {} parts to {}.'.format(self.rank, t[1], t[0]))
-                reqs.append(self.nodecomm.Isend(buf, t[0]))
-            # Then I need to resize local beam.dt and beam.dE, also
-            # beam.n_macroparticles
-            beam.dE = beam.dE[:beam.n_macroparticles-tot_to_send]
-            beam.dt = beam.dt[:beam.n_macroparticles-tot_to_send]
-            beam.id = beam.id[:beam.n_macroparticles-tot_to_send]
-            beam.n_macroparticles -= tot_to_send
-            for req in reqs:
-                req.Wait()
-            # req[0].Waitall(req)
+            self.send_particles(beam, transactions, comm=self.nodecomm)
         elif dPi[self.noderank] < 0 and len(transactions) > 0:
-            reqs = []
-            recvbuf = []
-            for t in transactions:
-                # I need to receive t[1] particles from t[0]
-                # The buffer contains: de, dt, id
-                buf = np.empty(3*t[1], float)
-                recvbuf.append(buf)
-                # self.logger.critical(
-                #     '[{}]: Receiving {} parts from {}.'.format(self.rank, t[1], t[0]))
-                reqs.append(self.nodecomm.Irecv(buf, t[0]))
-            for req in reqs:
-                req.Wait()
-            # req[0].Waitall(req)
-            # Then I need to resize local beam.dt and beam.dE, also
-            # beam.n_macroparticles
-            tot_to_recv = np.sum([t[1] for t in transactions])
-            beam.dE = np.resize(
-                beam.dE, beam.n_macroparticles + tot_to_recv)
-            beam.dt = np.resize(
-                beam.dt, beam.n_macroparticles + tot_to_recv)
-            beam.id = np.resize(
-                beam.id, beam.n_macroparticles + tot_to_recv)
-            i = beam.n_macroparticles
-            for buf, t in zip(recvbuf, transactions):
-                beam.dE[i:i+t[1]] = buf[0:t[1]]
-                beam.dt[i:i+t[1]] = buf[t[1]:2*t[1]]
-                beam.id[i:i+t[1]] = buf[2*t[1]:3*t[1]]
-                i += t[1]
-            beam.n_macroparticles += tot_to_recv
+            self.recv_particles(beam, transactions, comm=self.nodecomm)
 
         if np.sum(np.abs(dPi))/2 < 1e-4 * P:
             self.interval = min(2*self.interval, 4000)
@@ -820,6 +1013,40 @@ class Worker:
             self.interval = self.start_interval
             return self.start_turn
 
+    def send_particles(self, beam, transactions, comm=None):
+        # Send the last particles of the local beam, t[1] particles to
+        # worker t[0] for every transaction. The coordinates are sent
+        # straight from the beam arrays, then the beam is shrunk in place.
+        if comm is None:
+            comm = self.intercomm
+        reqs = []
+        tot_to_send = int(np.sum([t[1] for t in transactions]))
+        i = beam.n_macroparticles - tot_to_send
+        for t in transactions:
+            for tag, coords in enumerate([beam.dE, beam.dt, beam.id]):
+                reqs.append(comm.Isend(coords[i:i+t[1]], int(t[0]),
+                                       tag=tag))
+            i += t[1]
+        MPI.Request.Waitall(reqs)
+        beam.resize(beam.n_macroparticles - tot_to_send)
+
+    def recv_particles(self, beam, transactions, comm=None):
+        # Receive t[1] particles from worker t[0] for every transaction. The
+        # beam grows within its capacity buffers and the coordinates are
+        # received straight into them.
+        if comm is None:
+            comm = self.intercomm
+        reqs = []
+        tot_to_recv = int(np.sum([t[1] for t in transactions]))
+        i = beam.n_macroparticles
+        beam.resize(beam.n_macroparticles + tot_to_recv)
+        for t in transactions:
+            for tag, coords in enumerate([beam.dE, beam.dt, beam.id]):
+                reqs.append(comm.Irecv(coords[i:i+t[1]], int(t[0]),
+                                       tag=tag))
+            i += t[1]
+        MPI.Request.Waitall(reqs)
+
     def report(self, scope, turn, beam, tcomp, tcomm, tconst, tsync):
         latency = tcomp / beam.n_macroparticles
         if self.log:
@@ -1158,3 +1385,33 @@ def c_add_int64(xmem, ymem, dt):
     x = np.frombuffer(xmem, dtype=np.int64)
     y = np.frombuffer(ymem, dtype=np.int64)
     bm.add(y, x, inplace=True)
+
+
+def merge_statistics(a, b):
+    # Adds in place the beam statistics b to a, arrays of structures of 10
+    # doubles as given by bm.beam_statistics (Chan et al.)
+    a = a.reshape(-1, 10)
+    b = b.reshape(-1, 10)
+    n_a = a[:, 0].copy()
+    n = n_a + b[:, 0]
+    weight = np.divide(b[:, 0], n, out=np.zeros_like(n), where=n > 0)
+    for i in [2, 6]:
+        delta = b[:, i] - a[:, i]
+        a[:, i] += delta * weight
+        a[:, i+1] += b[:, i+1] + delta**2 * n_a * weight
+        np.minimum(a[:, i+2], b[:, i+2], out=a[:, i+2])
+        np.maximum(a[:, i+3], b[:, i+3], out=a[:, i+3])
+    a[:, 0] = n
+    a[:, 1] += b[:, 1]
+
+
+def c_merge_statistics(xmem, ymem, dt):
+    x = np.frombuffer(xmem, dtype=np.float64)
+    y = np.frombuffer(ymem, dtype=np.float64)
+    merge_statistics(y, x)
+
+
+statistics_op = MPI.Op.Create(c_merge_statistics, commute=True)
+
+# One structure of statistics, so that a reduction never splits it
+statistics_type = MPI.DOUBLE.Create_contiguous(10).Commit()
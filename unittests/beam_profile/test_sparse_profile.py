@@ -0,0 +1,150 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+**Unit-tests for the SparseProfile class, compared with a dense Profile over
+the same grid of bins.**
+
+:Authors: **Konstantinos Iliakis**
+'''
+
+import unittest
+import numpy as np
+
+from blond.beam.beam import Beam, Proton
+from blond.beam.profile import Profile, CutOptions
+from blond.beam.sparse_slices import SparseProfile
+from blond.impedances.impedance import InducedVoltageTime, \
+    InducedVoltageSparse
+from blond.impedances.impedance_sources import Resonators
+from blond.input_parameters.ring import Ring
+from blond.utils import bmath as bm
+
+
+class TestSparseProfile(unittest.TestCase):
+
+    window_slices = 32
+    bucket = 2.5e-9
+
+    # Run before every test
+    def setUp(self):
+        ring = Ring(26658.883, 1/55.759505**2, 450e9, Proton(), 1)
+        self.buckets = np.array([0, 10, 11, 40])
+        n_bunch = 5000
+        self.beam = Beam(ring, n_bunch * len(self.buckets), 1e11)
+        np.random.seed(0)
+        self.beam.dt = np.concatenate(
+            [np.random.normal((b + 0.5) * self.bucket, 0.15e-9, n_bunch)
+             for b in self.buckets])
+        self.beam.dE = np.zeros(self.beam.n_macroparticles)
+
+        self.sparse = SparseProfile(self.beam, self.buckets * self.bucket,
+                                    self.bucket, self.window_slices)
+        # Dense profile with the same bins, from the first to the last window
+        n_slices = (self.buckets[-1] + 1) * self.window_slices
+        self.dense = Profile(self.beam, CutOptions(
+            cut_left=0, cut_right=(self.buckets[-1] + 1) * self.bucket,
+            n_slices=n_slices))
+        self.windows = (self.buckets[:, None] * self.window_slices +
+                        np.arange(self.window_slices)).reshape(-1)
+
+    def test_bins(self):
+        np.testing.assert_array_equal(self.sparse.window_offsets,
+                                      self.buckets * self.window_slices)
+        np.testing.assert_allclose(self.sparse.bin_centers,
+                                   self.dense.bin_centers[self.windows],
+                                   rtol=1e-12)
+
+    def test_histogram(self):
+        self.sparse.track()
+        self.dense.track()
+        np.testing.assert_array_equal(
+            self.sparse.n_macroparticles,
+            self.dense.n_macroparticles[self.windows])
+        self.assertEqual(np.sum(self.sparse.n_macroparticles_array),
+                         np.sum(self.dense.n_macroparticles))
+
+    def test_kick(self):
+        voltage = 1e6 * np.sin(2 * np.pi * self.dense.bin_centers /
+                               self.bucket).astype(bm.precision.real_t)
+        # Particles between the first and last bin centres of their window
+        in_window = np.abs(
+            (self.beam.dt % self.bucket) - 0.5 * self.bucket) < \
+            0.5 * self.bucket - self.sparse.bin_size
+        dt = np.ascontiguousarray(self.beam.dt[in_window])
+        dE_dense = np.zeros(len(dt))
+        dE_sparse = np.zeros(len(dt))
+
+        bm.linear_interp_kick(dt=dt, dE=dE_dense, voltage=voltage,
+                              bin_centers=self.dense.bin_centers,
+                              charge=1.0, acceleration_kick=10.0)
+        self.sparse.linear_interp_kick(dt, dE_sparse,
+                                       np.ascontiguousarray(
+                                           voltage[self.windows]),
+                                       1.0, 10.0)
+        np.testing.assert_allclose(dE_sparse, dE_dense, rtol=0, atol=1e-6)
+
+    def test_outside_kick(self):
+        dt = np.array([-1e-9, 5.5 * self.bucket, 100 * self.bucket])
+        dE = np.zeros(len(dt))
+        self.sparse.linear_interp_kick(
+            dt, dE, np.ones(self.sparse.n_slices), 1.0, 10.0)
+        np.testing.assert_array_equal(dE, 0)
+
+    def test_induced_voltage(self):
+        self.sparse.track()
+        self.dense.track()
+        resonators = Resonators([4.5e6, 1e5], [200.222e6, 1e9], [200, 10])
+
+        dense = InducedVoltageTime(self.beam, self.dense, [resonators])
+        dense.induced_voltage_generation()
+        sparse = InducedVoltageSparse(self.beam, self.sparse, [resonators])
+        sparse.induced_voltage_generation()
+
+        reference = dense.induced_voltage[self.windows]
+        np.testing.assert_allclose(sparse.induced_voltage, reference,
+                                   rtol=0,
+                                   atol=1e-9 * np.max(np.abs(reference)))
+
+    def test_short_wake(self):
+        self.sparse.track()
+        resonators = Resonators([1e5], [1e9], [10])
+        sparse = InducedVoltageSparse(self.beam, self.sparse, [resonators],
+                                      wake_length=self.bucket)
+        # Only the neighbouring buckets 10 and 11 are coupled
+        self.assertEqual(len(sparse._target), len(self.buckets) + 1)
+        sparse.induced_voltage_generation()
+        self.assertEqual(len(sparse.induced_voltage), self.sparse.n_slices)
+
+    def test_wake_tolerance(self):
+        self.sparse.track()
+        resonators = Resonators([1e5], [1e9], [1])
+        # The wake has decayed below the tolerance after a few buckets, only
+        # the neighbouring buckets 10 and 11 are coupled
+        sparse = InducedVoltageSparse(self.beam, self.sparse, [resonators])
+        self.assertEqual(len(sparse._target), len(self.buckets) + 1)
+        sparse.induced_voltage_generation()
+
+        full = InducedVoltageSparse(self.beam, self.sparse, [resonators],
+                                    wake_tolerance=0)
+        full.induced_voltage_generation()
+        np.testing.assert_allclose(sparse.induced_voltage,
+                                   full.induced_voltage, rtol=0,
+                                   atol=1e-9 * np.max(np.abs(
+                                       full.induced_voltage)))
+
+    def test_overlap(self):
+        with self.assertRaises(RuntimeError):
+            SparseProfile(self.beam, [0, 0.5 * self.bucket], self.bucket,
+                          self.window_slices)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
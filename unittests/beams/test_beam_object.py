@@ -25,7 +25,8 @@ from blond.beam.beam import Particle, Proton
 from blond.input_parameters.ring import Ring
 from blond.input_parameters.rf_parameters import RFStation
 from blond.beam.beam import Beam
-from blond.beam.distributions import matched_from_distribution_function
+from blond.beam.distributions import matched_from_distribution_function, \
+    action_integrals, bigaussian
 from blond.trackers.tracker import FullRingAndRF, RingAndRFTracker
 import blond.utils.exceptions as blExcept
 
@@ -151,6 +152,11 @@ class testBeamClass(unittest.TestCase):
         self.assertAlmostEqual(self.beam.mean_dE, 0., delta=1e-2,
                                msg='Beam: Failed statistic mean_dE')
 
+    def test_bunch_statistics_bucket(self):
+
+        with self.assertRaises(RuntimeError):
+            self.beam.statistics(n_bunches=2)
+
     def test_losses_separatrix(self):
 
 
@@ -294,6 +300,125 @@ class testBeamClass(unittest.TestCase):
         with self.assertRaises(TypeError, msg='Wrong type should raise exception'):
             self.beam.add_beam(([1], [2]))
         
+    def test_action_integrals(self):
+
+        np = numpy
+        longitudinal_tracker = RingAndRFTracker(self.rf_params, self.beam)
+        full_tracker = FullRingAndRF([longitudinal_tracker])
+        full_tracker.potential_well_generation(n_points=1000)
+        time_low_res = full_tracker.potential_well_coordinates[::10]
+        well_low_res = full_tracker.potential_well[::10]
+        eom_factor_dE = 1e-9
+
+        J = action_integrals(full_tracker, time_low_res, well_low_res,
+                             eom_factor_dE, 1000, max_points=20000)
+
+        # Reference: one frame at a time
+        self.assertEqual(len(full_tracker.potential_well_coordinates), 1000)
+        for j in range(0, 100, 7):
+            indexes = np.where(well_low_res <= well_low_res[j])[0]
+            time_high_res = np.linspace(time_low_res[indexes[0]],
+                                        time_low_res[indexes[-1]], 1000)
+            full_tracker.potential_well_generation(time_array=time_high_res)
+            dE = np.sqrt(np.maximum(well_low_res[j] -
+                                    full_tracker.potential_well, 0) /
+                         eom_factor_dE)
+            J_ref = np.trapz(dE, dx=time_high_res[1]-time_high_res[0]) / np.pi
+            self.assertAlmostEqual(J[j], J_ref, delta=1e-12 * np.max(J))
+
+        # Same inputs: cached result
+        J_cached = action_integrals(full_tracker, time_low_res, well_low_res,
+                                    eom_factor_dE, 1000)
+        np.testing.assert_array_equal(J, J_cached)
+
+    def test_bigaussian_split(self):
+
+        np = numpy
+        n_macroparticles = 10000
+
+        # Local shares of 1 and 3 workers, as allocated by Beam(split=True)
+        def generate(n_workers):
+            dt, dE = [], []
+            for first in np.linspace(0, n_macroparticles, n_workers + 1,
+                                     dtype=int)[:-1]:
+                n_local = n_macroparticles // n_workers
+                beam = Beam(self.general_params, n_local, 1e9)
+                beam.id += first
+                beam.n_total_macroparticles = n_macroparticles
+                beam.is_splitted = True
+                bigaussian(self.general_params, self.rf_params, beam, 0.3e-9,
+                           seed=2, reinsertion=True)
+                dt.append(beam.dt)
+                dE.append(beam.dE)
+            return np.concatenate(dt), np.concatenate(dE)
+
+        dt_1, dE_1 = generate(1)
+        dt_4, dE_4 = generate(4)
+        np.testing.assert_array_equal(dt_1, dt_4)
+        np.testing.assert_array_equal(dE_1, dE_4)
+        self.assertAlmostEqual(np.std(dt_1), 0.3e-9, delta=0.02e-9)
+
+    def test_resize(self):
+
+        np = numpy
+        beam = Beam(self.general_params, 1000, 1e9)
+        beam.dt[:] = np.arange(1000)
+        beam.dE[:] = -np.arange(1000)
+
+        # Shrinking keeps the first particles
+        beam.resize(600)
+        self.assertEqual(beam.n_macroparticles, 600)
+        np.testing.assert_array_equal(beam.dt, np.arange(600))
+        np.testing.assert_array_equal(beam.dE, -np.arange(600))
+        np.testing.assert_array_equal(beam.id, np.arange(1, 601))
+
+        # Growing within the capacity does not reallocate
+        buffers = [beam.dt.base, beam.dE.base, beam.id.base]
+        beam.resize(700)
+        self.assertEqual(len(beam.dt), 700)
+        self.assertEqual(len(beam.id), 700)
+        for array, buffer in zip([beam.dt, beam.dE, beam.id], buffers):
+            self.assertIs(array.base, buffer)
+        np.testing.assert_array_equal(beam.dt[:600], np.arange(600))
+
+        # Growing beyond the capacity keeps the coordinates
+        beam.resize(2000)
+        self.assertEqual(len(beam.dE), 2000)
+        np.testing.assert_array_equal(beam.dE[:600], -np.arange(600))
+
+        # Arrays replaced by the user are adopted
+        beam.dt = np.ones(2000)
+        beam.resize(10)
+        np.testing.assert_array_equal(beam.dt, np.ones(10))
+
+    def test_sort_particles(self):
+
+        np = numpy
+        np.random.seed(1)
+        beam = Beam(self.general_params, 10000, 1e9)
+        dt = np.random.uniform(0, 1e-9, 10000)
+        beam.dt[:] = dt
+        beam.dE[:] = 2 * dt
+        arrays = [beam.dt, beam.dE, beam.id]
+
+        # Unsorted beam: full sort, dE and id follow dt, no reallocation
+        beam.sort_particles()
+        np.testing.assert_array_equal(beam.dt, np.sort(dt))
+        np.testing.assert_array_equal(beam.dE, 2 * beam.dt)
+        np.testing.assert_array_equal(beam.dt, dt[beam.id - 1])
+        for array, previous in zip([beam.dt, beam.dE, beam.id], arrays):
+            self.assertIs(array, previous)
+
+        # Nearly sorted beam, as after one turn
+        beam.dt += np.random.normal(0, 1e-14, 10000)
+        dt = beam.dt.copy()
+        ids = beam.id.copy()
+        beam.dE[:] = 2 * beam.dt
+        beam.sort_particles()
+        np.testing.assert_array_equal(beam.dt, np.sort(dt))
+        np.testing.assert_array_equal(beam.dE, 2 * beam.dt)
+        np.testing.assert_array_equal(beam.dt, dt[np.argsort(ids)][beam.id - 1])
+
 
 if __name__ == '__main__':
 
@@ -0,0 +1,123 @@
+# coding: utf-8
+# Copyright 2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+'''
+Unit-tests for the multi-bunch distributions.
+
+Run as python test_distributions_multibunch.py in console or via travis
+'''
+
+# General imports
+# -----------------
+from __future__ import division, print_function
+import unittest
+import numpy as np
+
+# BLonD imports
+# --------------
+from blond.beam.beam import Beam, Proton
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.trackers.tracker import FullRingAndRF, RingAndRFTracker
+from blond.beam.distributions_multibunch import match_beam_from_distribution, \
+    matched_from_distribution_density_multibunch, bunch_seeds
+
+
+class testMultiBunchDistributions(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+
+        self.ring = Ring(6911.5038, 1./17.95142852**2, 450e9, Proton(), 10)
+        self.rf_params = RFStation(self.ring, [4620], [7e6], [0.])
+        self.n_bunches = 4
+        self.distribution_options = {'type': 'binomial', 'exponent': 1.5,
+                                     'emittance': 0.35,
+                                     'density_variable': 'Hamiltonian'}
+
+    def generate(self, n_processes, seed=1):
+
+        beam = Beam(self.ring, 1000 * self.n_bunches, 1e11)
+        full_tracker = FullRingAndRF([RingAndRFTracker(self.rf_params, beam)])
+        dt, dE = beam.dt, beam.dE
+        match_beam_from_distribution(beam, full_tracker, self.ring,
+                                     self.distribution_options,
+                                     self.n_bunches, 10,
+                                     n_points_potential=1000, seed=seed,
+                                     n_processes=n_processes)
+        # The bunches are written in place
+        self.assertIs(beam.dt, dt)
+        self.assertIs(beam.dE, dE)
+        return beam
+
+    def test_bunch_seeds(self):
+
+        self.assertEqual(bunch_seeds(1, 5), bunch_seeds(1, 5))
+        self.assertEqual(bunch_seeds(1, 5)[:3], bunch_seeds(1, 3))
+        self.assertEqual(len(set(bunch_seeds(1, 5))), 5)
+        self.assertEqual(bunch_seeds(None, 2), [None, None])
+
+    def test_independent_of_processes(self):
+
+        serial = self.generate(None)
+        parallel = self.generate(2)
+        np.testing.assert_array_equal(serial.dt, parallel.dt)
+        np.testing.assert_array_equal(serial.dE, parallel.dE)
+
+        # Different bunches, in their own buckets
+        bunches = serial.dE.reshape(self.n_bunches, -1)
+        self.assertFalse(np.array_equal(bunches[0], bunches[1]))
+        bucket = 2 * np.pi / self.rf_params.omega_rf[0, 0]
+        self.assertTrue(np.all(np.diff(
+            serial.dt.reshape(self.n_bunches, -1).mean(axis=1)) > 9 * bucket))
+
+    def test_density_multibunch_independent_of_processes(self):
+
+        results = []
+        for n_processes in [None, 2]:
+            beam = Beam(self.ring, 1000 * self.n_bunches, 1e11)
+            full_tracker = FullRingAndRF([RingAndRFTracker(self.rf_params,
+                                                           beam)])
+            matched_from_distribution_density_multibunch(
+                beam, self.ring, full_tracker, self.distribution_options,
+                self.n_bunches, 10, seed=1, n_processes=n_processes)
+            results.append(beam)
+
+        np.testing.assert_array_equal(results[0].dt, results[1].dt)
+        np.testing.assert_array_equal(results[0].dE, results[1].dE)
+
+    def test_split_beam(self):
+
+        # Beams holding the particles of 1 and 3 workers, as allocated by
+        # Beam(split=True)
+        def generate(counts):
+            dt = []
+            first = 0
+            for n_local in counts:
+                beam = Beam(self.ring, n_local, 1e11)
+                beam.id += first
+                beam.n_total_macroparticles = 1000 * self.n_bunches
+                beam.is_splitted = True
+                full_tracker = FullRingAndRF([RingAndRFTracker(self.rf_params,
+                                                               beam)])
+                match_beam_from_distribution(beam, full_tracker, self.ring,
+                                             self.distribution_options,
+                                             self.n_bunches, 10,
+                                             n_points_potential=1000, seed=3)
+                dt.append(beam.dt)
+                first += n_local
+            return np.concatenate(dt)
+
+        np.testing.assert_array_equal(generate([4000]),
+                                      generate([1334, 1333, 1333]))
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -16,9 +16,13 @@ Unittest for impedances.impedance
 import unittest
 import numpy as np
 
+from blond.beam.beam import Beam, Proton
 from blond.beam.profile import Profile, CutOptions
-from blond.impedances.impedance import InducedVoltageFreq, InducedVoltageTime
+from blond.input_parameters.ring import Ring
+from blond.impedances.impedance import InducedVoltageFreq, \
+    InducedVoltageTime, InductiveImpedance, TotalInducedVoltage
 from blond.impedances.impedance_sources import Resonators
+from blond.input_parameters.rf_parameters import RFStation
 
 class TestInducedVoltageFreq(unittest.TestCase):
 
@@ -120,6 +124,68 @@ class TestInducedVoltageTime(unittest.TestCase):
         np.testing.assert_allclose(test_object.wake_length_input, 11e-9)
 
 
+class TestTotalInducedVoltage(unittest.TestCase):
+
+    def setUp(self):
+
+        ring = Ring(26658.883, 1/55.759505**2, 450e9, Proton(), 10)
+        self.rf = RFStation(ring, [35640], [6e6], [0])
+        self.beam = Beam(ring, 10000, 1e11)
+        np.random.seed(1)
+        self.beam.dt = np.random.normal(1.25e-9, 0.2e-9, self.beam.n_macroparticles)
+        self.beam.dE = np.random.normal(0, 1e8, self.beam.n_macroparticles)
+        self.profile = Profile(self.beam,
+           CutOptions=CutOptions(cut_left=0, cut_right=2.5e-9, n_slices=64))
+        self.profile.track()
+        self.resonators = [Resonators([4.5e6], [200.222e6], [200]),
+                           Resonators([1e5], [1e9], [10])]
+
+    def test_fused_sum(self):
+        induced_voltage_list = [
+            InducedVoltageTime(self.beam, self.profile, [self.resonators[0]]),
+            InducedVoltageTime(self.beam, self.profile, [self.resonators[1]]),
+            InducedVoltageFreq(self.beam, self.profile, [self.resonators[0]],
+                               frequency_resolution=5e6),
+            InducedVoltageFreq(self.beam, self.profile, [self.resonators[1]],
+                               frequency_resolution=5e6),
+            InductiveImpedance(self.beam, self.profile, [0.1]*11, self.rf)]
+        total_voltage = TotalInducedVoltage(self.beam, self.profile,
+                                            induced_voltage_list)
+
+        # One impedance per n_fft, the inductive impedance separately
+        self.assertEqual(len(total_voltage.fused_impedances), 2)
+        self.assertEqual(total_voltage._separate_objects,
+                         induced_voltage_list[-1:])
+
+        total_voltage.induced_voltage_sum()
+        # The voltages of the fused objects are not computed per object
+        for obj in induced_voltage_list[:-1]:
+            self.assertIsNone(obj.induced_voltage)
+
+        reference = 0
+        for obj in induced_voltage_list:
+            obj.induced_voltage_generation()
+            reference += obj.induced_voltage[:self.profile.n_slices]
+
+        np.testing.assert_allclose(total_voltage.induced_voltage, reference,
+                                   rtol=1e-10,
+                                   atol=1e-10*np.max(np.abs(reference)))
+
+    def test_reprocess(self):
+        induced_voltage = InducedVoltageTime(self.beam, self.profile,
+                                             [self.resonators[0]])
+        total_voltage = TotalInducedVoltage(self.beam, self.profile,
+                                            [induced_voltage])
+        self.resonators[0].R_S[0] *= 2
+        total_voltage.reprocess()
+        total_voltage.induced_voltage_sum()
+
+        induced_voltage.induced_voltage_generation()
+        np.testing.assert_array_equal(
+            total_voltage.induced_voltage,
+            induced_voltage.induced_voltage[:self.profile.n_slices])
+
+
 if __name__ == '__main__':
 
     unittest.main()
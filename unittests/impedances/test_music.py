@@ -0,0 +1,80 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unittest for impedances.music
+
+:Authors: **Konstantinos Iliakis**
+"""
+
+import unittest
+import numpy as np
+
+from blond.beam.beam import Beam, Proton
+from blond.input_parameters.ring import Ring
+from blond.impedances.music import Music
+
+
+class TestMusic(unittest.TestCase):
+
+    def setUp(self):
+
+        ring = Ring(26658.883, 1/55.759505**2, 450e9, Proton(), 10)
+        self.t_rev = ring.t_rev[0]
+        # More than the 16384 steps from which the scan of an OpenMP build
+        # is split between threads, see test_threads
+        self.n_macroparticles = 20000
+        self.resonator = [1e6, 2*np.pi*1e9, 10]
+        np.random.seed(1)
+        dt = np.random.normal(1.25e-9, 0.2e-9, self.n_macroparticles)
+        dE = np.random.normal(0, 1e8, self.n_macroparticles)
+
+        self.beams = []
+        for i in range(2):
+            beam = Beam(ring, self.n_macroparticles, 1e11)
+            beam.dt = dt.copy()
+            beam.dE = dE.copy()
+            self.beams.append(beam)
+
+    def test_cpp_vs_py(self):
+        music_cpp = Music(self.beams[0], self.resonator,
+                          self.n_macroparticles, 1e11, self.t_rev)
+        music_py = Music(self.beams[1], self.resonator,
+                         self.n_macroparticles, 1e11, self.t_rev)
+
+        music_cpp.track_cpp()
+        music_py.track_py()
+        for i in range(2):
+            music_cpp.track_cpp_multi_turn()
+            music_py.track_py_multi_turn()
+
+            np.testing.assert_allclose(
+                music_cpp.induced_voltage, music_py.induced_voltage,
+                rtol=1e-8,
+                atol=1e-8*np.max(np.abs(music_py.induced_voltage)))
+            np.testing.assert_allclose(
+                self.beams[0].dE, self.beams[1].dE, rtol=1e-8,
+                atol=1e-8*np.max(np.abs(self.beams[1].dE)))
+
+    def test_threads(self):
+        from blond import libblond
+        if not hasattr(libblond, 'omp_get_max_threads'):
+            self.skipTest('libblond is not compiled with OpenMP (-p)')
+        threads = libblond.omp_get_max_threads()
+        # The blocked parallel scan, even on fewer cores
+        libblond.omp_set_num_threads(4)
+        try:
+            self.test_cpp_vs_py()
+        finally:
+            libblond.omp_set_num_threads(threads)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
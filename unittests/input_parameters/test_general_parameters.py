@@ -18,7 +18,7 @@ import unittest
 import numpy as np
 
 from blond.input_parameters.ring import Ring
-from blond.input_parameters.ring_options import convert_data
+from blond.input_parameters.ring_options import convert_data, RingOptions
 from blond.beam.beam import Electron
 
 
@@ -152,6 +152,39 @@ class TestGeneralParameters(unittest.TestCase):
                          msg='In TestGeneralParameters cycle_time at first ' +
                          'turn not equal to revolution time at first turn!')
 
+    def test_window_programmes(self):
+        # Programmes computed in windows of turns must match the full ones
+        momentum = [np.linspace(450e9, 451e9, 101),
+                    np.linspace(450e9, 451e9, 101)]
+        alpha_0 = ((np.array([0, 1e-3]), np.array([3.21e-4, 3.22e-4])),
+                   (np.array([0, 1e-3]), np.array([2.89e-4, 2.90e-4])))
+        full = Ring(self.C, alpha_0, momentum, self.particle, 100,
+                    n_sections=self.num_sections, alpha_1=self.alpha_1)
+        windowed = Ring(self.C, alpha_0, momentum, self.particle, 100,
+                        n_sections=self.num_sections, alpha_1=self.alpha_1,
+                        RingOptions=RingOptions(window=7))
+
+        np.testing.assert_array_equal(windowed.cycle_time, full.cycle_time)
+        for name in ['beta', 'gamma', 'energy', 'kin_energy', 'delta_E',
+                     't_rev', 'f_rev', 'omega_rev', 'alpha_0', 'alpha_1',
+                     'alpha_2', 'eta_0', 'eta_1', 'eta_2']:
+            for turn in [0, 5, 6, 50, 99, -1]:
+                np.testing.assert_array_equal(
+                    getattr(windowed, name)[..., turn],
+                    getattr(full, name)[..., turn],
+                    err_msg='In TestGeneralParameters windowed ' + name +
+                    ' differs at turn ' + str(turn))
+            np.testing.assert_array_equal(np.asarray(getattr(windowed, name)),
+                                          getattr(full, name))
+
+    def test_window_exception(self):
+        with self.assertRaisesRegex(
+                RuntimeError,
+                'ERROR: window value in PreprocessRamp should be at least 2',
+                msg='No RuntimeError for a window of one turn!'):
+
+            RingOptions(window=1)
+
     def test_convert_data_exception(self):
         with self.assertRaisesRegex(
                 RuntimeError,
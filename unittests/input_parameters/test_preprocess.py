@@ -12,11 +12,18 @@ Test preprocess.py
 
 '''
 
+import os
+import shutil
 import sys
+import tempfile
 import unittest
 import numpy as np
 
+from blond.beam.beam import Proton
+from blond.input_parameters.ring import Ring
 from blond.input_parameters.ring_options import RingOptions
+from blond.input_parameters.rf_parameters import RFStation
+from blond.input_parameters.rf_parameters_options import RFStationOptions
 
 
 class test_preprocess(unittest.TestCase):
@@ -82,6 +89,40 @@ class test_preprocess(unittest.TestCase):
             RingOptions(sampling=0)
 
 
+    def test_cache_dir(self):
+        # Cached programmes are loaded memory-mapped and match the original
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        time = np.array([0, 0.1, 0.2])
+        momentum = np.array([450e9, 450e9, 450.5e9])
+        voltage = (time, np.array([6e6, 6e6, 8e6]))
+
+        def create(cache_dir):
+            ring = Ring(26658.883, 3.21e-4, (time, momentum), Proton(),
+                        RingOptions=RingOptions(cache_dir=cache_dir))
+            rf = RFStation(ring, [35640], voltage, [0],
+                           RFStationOptions=RFStationOptions(
+                               cache_dir=cache_dir))
+            return ring, rf
+
+        ref_ring, ref_rf = create(None)
+        create(cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+        ring, rf = create(cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+        self.assertIsInstance(ring.momentum, np.memmap)
+        self.assertIsInstance(rf.voltage, np.memmap)
+        np.testing.assert_array_equal(ring.momentum, ref_ring.momentum)
+        np.testing.assert_array_equal(rf.voltage, ref_rf.voltage)
+        np.testing.assert_array_equal(rf.phi_s, ref_rf.phi_s)
+
+        # A different programme is stored under a different key
+        Ring(26658.883, 3.21e-4, (time, 2*momentum), Proton(),
+             RingOptions=RingOptions(cache_dir=cache_dir))
+        self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+
 if __name__ == '__main__':
 
     unittest.main()
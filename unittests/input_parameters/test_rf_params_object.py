@@ -22,6 +22,7 @@ import numpy
 # BLonD imports
 # --------------
 from blond.input_parameters.ring import Ring
+from blond.input_parameters.ring_options import RingOptions
 from blond.input_parameters.rf_parameters import RFStation
 from blond.beam.beam import Beam, Proton
 from blond.llrf.rf_modulation import PhaseModulation as PMod
@@ -205,6 +206,50 @@ class testRFParamClass(unittest.TestCase):
                                    n_rf = 2)
         
 
+    def test_window_programmes(self):
+        # RF programmes computed in windows of turns must match the full ones
+        momentum = numpy.linspace(450e9, 460e9, 201)
+        voltage = ((numpy.array([0, 1e-3]), numpy.array([6e6, 8e6])),
+                   (numpy.array([0, 1e-3]), numpy.array([1e6, 2e6])))
+        full_ring = Ring(6911.5038, 1./17.95142852**2, momentum, Proton(),
+                         200)
+        ring = Ring(6911.5038, 1./17.95142852**2, momentum, Proton(), 200,
+                    RingOptions=RingOptions(window=10))
+        full = RFStation(full_ring, [4620, 9240], voltage, [0, 0.1],
+                         n_rf=2)
+        windowed = RFStation(ring, [4620, 9240], voltage, [0, 0.1],
+                             n_rf=2)
+
+        for name in ['harmonic', 'voltage', 'phi_rf_d', 'omega_rf_d',
+                     'phi_rf', 'omega_rf', 't_rf', 'phi_s', 'Q_s',
+                     'omega_s0', 'sign_eta_0', 'beta', 'energy', 'eta_0']:
+            for turn in [0, 9, 10, 100, 199, 200]:
+                numpy.testing.assert_array_equal(
+                    getattr(windowed, name)[..., turn],
+                    getattr(full, name)[..., turn],
+                    err_msg='Windowed ' + name + ' differs at turn ' +
+                    str(turn))
+            numpy.testing.assert_array_equal(
+                numpy.asarray(getattr(windowed, name)), getattr(full, name))
+
+        # Values written by feedbacks are kept while the turn is in memory
+        windowed.phi_rf[:, 150] += 0.5
+        self.assertEqual(windowed.phi_rf[0, 150], full.phi_rf[0, 150] + 0.5)
+        with self.assertRaises(RuntimeError):
+            windowed.phi_rf[:, :] = 0
+
+        # Rows of a programme read and write the same window
+        windowed.phi_rf[1][151] = 2.
+        windowed.phi_rf[1][152:154] += 1.
+        self.assertEqual(windowed.phi_rf[1, 151], 2.)
+        numpy.testing.assert_array_equal(windowed.phi_rf[1, 152:154],
+                                         full.phi_rf[1, 152:154] + 1.)
+        self.assertEqual(windowed.phi_rf[1][150], full.phi_rf[1, 150] + 0.5)
+        numpy.testing.assert_array_equal(numpy.asarray(windowed.voltage[0]),
+                                         full.voltage[0])
+        with self.assertRaises(RuntimeError):
+            windowed.phi_rf[0][:] = 0
+
     def test_RFSectionParameters_eta_tracking(self):
 
         # To be written
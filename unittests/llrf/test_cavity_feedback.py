@@ -349,6 +349,59 @@ class TestCavityFeedback(unittest.TestCase):
                                    err_msg='In TestCavityFeedback test_Vsum_IQ: total voltage ' +
                                    'is different from expected values!')
 
+    def test_impulse_response_cache(self):
+
+        OTFB = self.OTFB.OTFB_1
+        OTFB.track()
+        h_gen, h_beam = OTFB.TWC.h_gen, OTFB.TWC.h_beam
+
+        # Same carrier frequency and grids, impulse responses kept
+        OTFB.track()
+        self.assertIs(OTFB.TWC.h_gen, h_gen)
+        self.assertIs(OTFB.TWC.h_beam, h_beam)
+
+        # The cached kernel FFT gives the same convolution
+        I = OTFB.I_beam_fine
+        np.testing.assert_allclose(
+            OTFB.matr_conv(I, h_beam, kernel='beam'),
+            OTFB.matr_conv(I, h_beam), rtol=0,
+            atol=1e-12*np.max(np.abs(OTFB.V_fine_ind_beam)))
+
+        # New carrier frequency, impulse responses recomputed
+        self.rf.omega_rf[0, 0] *= 1 + 1e-6
+        OTFB.track()
+        self.assertIsNot(OTFB.TWC.h_gen, h_gen)
+        self.assertIsNot(OTFB.TWC.h_beam, h_beam)
+        self.assertEqual(OTFB.TWC.omega_c, self.rf.omega_rf[0, 0])
+
+    def test_feedforward(self):
+
+        OTFB = SPSCavityFeedback(
+            self.rf, self.beam, self.profile, G_llrf=5, G_tx=0.5,
+            a_comb=15/16, turns=50, post_LS2=False,
+            Commissioning=CavityFeedbackCommissioning(open_FF=False)).OTFB_1
+        # The beam of the set-up lies between the samples of the feed-forward
+        np.random.seed(1)
+        I_prev = np.random.randn(OTFB.n_coarse_FF) \
+            + 1j*np.random.randn(OTFB.n_coarse_FF)
+        OTFB.I_beam_coarse_prev = I_prev.copy()
+        OTFB.track()
+
+        # The FIR filter of the previous turn, periodic, with the first
+        # coefficient applied twice
+        I_ff_corr = np.zeros(OTFB.n_coarse_FF, dtype=complex)
+        for ind in range(OTFB.n_coarse_FF):
+            I_ff_corr[ind] = OTFB.coeff_FF[0]*I_prev[ind]
+            for k in range(OTFB.n_FF):
+                I_ff_corr[ind] += OTFB.coeff_FF[k]*I_prev[ind-k]
+        np.testing.assert_allclose(OTFB.I_ff_corr, I_ff_corr, rtol=0,
+                                   atol=1e-12*np.max(np.abs(I_ff_corr)))
+        np.testing.assert_allclose(
+            OTFB.V_ff_corr, OTFB.G_ff*OTFB.matr_conv(I_ff_corr,
+                                                     OTFB.TWC.h_gen[::5]),
+            rtol=0, atol=1e-12*np.max(np.abs(OTFB.V_ff_corr)))
+
+
 
 if __name__ == '__main__':
 
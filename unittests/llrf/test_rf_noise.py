@@ -0,0 +1,69 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unittest for llrf.rf_noise
+
+:Authors: **Konstantinos Iliakis**
+"""
+
+import unittest
+import numpy as np
+
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Proton
+from blond.llrf.rf_noise import FlatSpectrum
+
+
+class TestFlatSpectrum(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        self.ring = Ring(26658.883, 1/55.759505**2,
+                         np.linspace(450e9, 451e9, 2501), Proton(), 2500)
+        self.rf = RFStation(self.ring, 35640, 6e6, 0)
+
+    def noise(self, **kwargs):
+        return FlatSpectrum(self.ring, self.rf, delta_f=5, corr_time=1000,
+                            folder_plots=None, print_option=False, **kwargs)
+
+    def test_segments_independent(self):
+        # Sequential generation, with the seeds moved after each segment
+        noise = self.noise(predistortion='weightfunction')
+        dphi = np.zeros(2501)
+        for i in range(noise.n_segments):
+            freq, spectrum = noise.segment_spectrum(i)
+            noise.spectrum_to_phase_noise(freq, spectrum)
+            kmax = (i + 1)*1000 if i < 1 else 2501
+            dphi[i*1000:kmax] = noise.dphi_output[:kmax - i*1000]
+            noise.seed1 += 239
+            noise.seed2 += 158
+
+        for n_threads in [1, 3]:
+            noise = self.noise(predistortion='weightfunction')
+            noise.generate(n_threads=n_threads)
+            np.testing.assert_equal(noise.dphi, dphi)
+            self.assertEqual(noise.seed1, 1234 + 3*239)
+
+    def test_windowed(self):
+        for kwargs in [dict(initial_final_turns=[300, 2000]),
+                       dict(continuous_phase=True)]:
+            noise = self.noise(**kwargs)
+            noise.generate(n_threads=2)
+            windowed = self.noise(**kwargs).windowed(window=300, n_threads=2)
+            self.assertEqual(len(windowed), len(noise.dphi))
+            np.testing.assert_equal(
+                [windowed[turn] for turn in range(2501)], noise.dphi)
+            np.testing.assert_equal(np.asarray(windowed), noise.dphi)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -18,6 +18,7 @@ import numpy as np
 from scipy.constants import e
 
 from blond.llrf.signal_processing import moving_average, modulator
+from blond.llrf.signal_processing import fir_filter
 from blond.llrf.signal_processing import polar_to_cartesian, cartesian_to_polar
 from blond.llrf.signal_processing import comb_filter, low_pass_filter
 from blond.llrf.signal_processing import rf_beam_current, feedforward_filter
@@ -512,6 +513,31 @@ class TestMovingAverage(unittest.TestCase):
             msg="In TestMovingAverage, test_3: arrays differ")
 
 
+class TestFIRFilter(unittest.TestCase):
+
+    def test_1(self):
+
+        x = np.array([0, 3, 6, 3, 0, 3], dtype=float)
+        y = fir_filter(x, np.array([1, 0.5, 0.25]))
+        self.assertSequenceEqual(y.tolist(),
+            [0, 3, 7.5, 6.75, 3, 3.75],
+            msg="In TestFIRFilter, test_1: arrays differ")
+
+    def test_2(self):
+
+        # Periodic signal, the previous samples are the last ones
+        np.random.seed(1)
+        x = np.random.randn(100) + 1j*np.random.randn(100)
+        coefficients = feedforward_filter_TWC4
+        y = fir_filter(x, coefficients, x_prev=x)
+        y_loop = np.zeros(len(x), dtype=complex)
+        for i in range(len(x)):
+            for k in range(len(coefficients)):
+                y_loop[i] += coefficients[k]*x[i-k]
+        np.testing.assert_allclose(y, y_loop, rtol=0, atol=1e-14,
+            err_msg="In TestFIRFilter, test_2: arrays differ")
+
+
 class TestFeedforwardFilter(unittest.TestCase):
 
     # Run before every test
@@ -159,6 +159,45 @@ class TestSynchtrotronRadiation(unittest.TestCase):
         # np.testing.assert_almost_equal(self.beam.dE, beam_C.dE, decimal=8,
         #                                err_msg='SR: Python and C implementations yield different results for two kicks')
 
+    def test_quantum_excitation_counter_based(self):
+        n_kicks = 6
+        iSR = SynchrotronRadiation(self.ring, self.rf_station, self.beam, self.R_bend,
+                                   n_kicks=n_kicks, shift_beam=False,
+                                   python=False, quantum_excitation=True, seed=self.seed)
+        self.beam.id[::3] = np.arange(1000, 1000 + len(self.beam.id[::3]))
+        dE = self.beam.dE.copy()
+        iSR.track()
+
+        # The random numbers of kick 4j+k come from the block (id, stream + j)
+        const_synch_rad = 1 - 2 / (iSR.tau_z * n_kicks)
+        const_quantum_exc = 2 * iSR.sigma_dE / np.sqrt(iSR.tau_z * n_kicks) \
+            * self.ring.energy[0, 0]
+        normals = []
+        for j in range(2):
+            u = np.array([bm.random_uniform(iSR.rng_key, i, 1,
+                                            stream=iSR.rng_stream + j)[0]
+                          for i in self.beam.id])
+            normals += [np.sqrt(-2 * np.log(u[:, 0])) * np.cos(2*np.pi*u[:, 1]),
+                        np.sqrt(-2 * np.log(u[:, 0])) * np.sin(2*np.pi*u[:, 1]),
+                        np.sqrt(-2 * np.log(u[:, 2])) * np.cos(2*np.pi*u[:, 3]),
+                        np.sqrt(-2 * np.log(u[:, 2])) * np.sin(2*np.pi*u[:, 3])]
+        for k in range(n_kicks):
+            dE = dE * const_synch_rad + const_quantum_exc * normals[k] \
+                - iSR.U0 / n_kicks
+        np.testing.assert_allclose(self.beam.dE, dE, rtol=1e-10, atol=1e-3)
+
+        # The kick of a particle only depends on its id
+        beam_C = Beam(self.ring, self.n_macroparticles, self.intensity)
+        bigaussian(self.ring, self.rf_station, beam_C,
+                   self.sigma_dt, seed=self.seed)
+        beam_C.id[::3] = np.arange(1000, 1000 + len(beam_C.id[::3]))
+        part = slice(17, 60)
+        beam_C.dE = np.ascontiguousarray(beam_C.dE[part])
+        beam_C.id = np.ascontiguousarray(beam_C.id[part])
+        iSR.beam = beam_C
+        iSR.track()
+        np.testing.assert_equal(beam_C.dE, self.beam.dE[part])
+
 
 class TestSynchRad(unittest.TestCase):
     # SIMULATION PARAMETERS -------------------------------------------------------
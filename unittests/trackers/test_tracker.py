@@ -14,18 +14,24 @@ Unittest for trackers.tracker.py
 """
 
 import unittest
+from types import SimpleNamespace
 import numpy as np
 import matplotlib.pyplot as plt
 # import inspect
 
 from blond.utils import bmath as bm
 from blond.input_parameters.ring import Ring
+from blond.input_parameters.ring_options import RingOptions
 from blond.input_parameters.rf_parameters import RFStation
 from blond.trackers.tracker import RingAndRFTracker
 from blond.beam.beam import Beam, Proton
 from blond.beam.distributions import bigaussian
 from blond.beam.profile import CutOptions, FitOptions, Profile
 from blond.llrf.rf_modulation import PhaseModulation as PMod
+from blond.impedances.impedance import InducedVoltageFreq, InducedVoltageTime, \
+    TotalInducedVoltage
+from blond.impedances.impedance_sources import Resonators
+from blond.llrf.beam_feedback import BeamFeedback
 import os
 
 
@@ -124,6 +130,24 @@ class TestRfVoltageCalc(unittest.TestCase):
         np.testing.assert_almost_equal(
             self.long_tracker.rf_voltage, orig_rf_voltage, decimal=8)
 
+    def test_rf_voltage_phasors(self):
+        long_tracker = RingAndRFTracker(
+            self.rf, self.beam, Profile=self.profile, rf_voltage_resync=30)
+        for i in range(100):
+            self.profile.track()
+            long_tracker.track()
+            long_tracker.rf_voltage_calculation()
+            orig_rf_voltage = orig_rf_volt_comp(long_tracker)
+            np.testing.assert_allclose(
+                long_tracker.rf_voltage, orig_rf_voltage,
+                rtol=0, atol=1e-9 * self.V)
+        self.assertEqual(long_tracker._phasor_state['turns'], 100 % 30)
+
+    def test_rf_voltage_resync_exception(self):
+        with self.assertRaises(RuntimeError):
+            RingAndRFTracker(self.rf, self.beam, Profile=self.profile,
+                             rf_voltage_resync=0)
+
 
 class CavityFB:
     V_corr = 0
@@ -250,6 +274,172 @@ class TestRfVoltageCalcWCavityFB(unittest.TestCase):
                 """Phi modulation not added correctly in tracker""")
 
 
+class TestTrackNTurns(unittest.TestCase):
+    # Simulation parameters -------------------------------------------------------
+    # Bunch parameters
+    N_b = 1e11          # Intensity
+    N_p = 50000         # Macro-particles
+    tau_0 = 0.4e-9          # Initial bunch length, 4 sigma [s]
+    # Machine and RF parameters
+    C = 26658.883        # Machine circumference [m]
+    p_i = 450e9         # Synchronous momentum [eV/c]
+    p_f = 460.005e9      # Synchronous momentum, final
+    h = 35640            # Harmonic number
+    V = 6e6                # RF voltage [V]
+    dphi = 0             # Phase modulation/offset
+    gamma_t = 55.759505  # Transition gamma
+    alpha = 1./gamma_t/gamma_t        # First order mom. comp. factor
+    # Tracking details
+    N_t = 2000           # Number of turns to track
+
+    def create_tracker(self, interpolation=False, impedance=False,
+                       fit=False, window=None, n_slices=100, feedback=False,
+                       cavity_feedback=False):
+        ring = Ring(self.C, self.alpha, np.linspace(
+            self.p_i, self.p_f, self.N_t + 1), Proton(), self.N_t,
+            RingOptions=RingOptions(window=window))
+        beam = Beam(ring, self.N_p, self.N_b)
+        if feedback:
+            # Second RF system, so that the programmes are copied for the
+            # kernel
+            rf = RFStation(ring, [self.h, 2 * self.h],
+                           [self.V * np.linspace(1, 1.1, self.N_t+1),
+                            0.1 * self.V * np.ones(self.N_t+1)],
+                           [self.dphi, np.pi], n_rf=2)
+        else:
+            rf = RFStation(ring, [self.h], self.V * np.linspace(1, 1.1, self.N_t+1),
+                           [self.dphi])
+        bigaussian(ring, rf, beam, self.tau_0/4, reinsertion=True, seed=1)
+        if fit:
+            fit_options = FitOptions(fit_option='gaussian')
+        else:
+            fit_options = FitOptions()
+        profile = Profile(beam, CutOptions(n_slices=n_slices, cut_left=0,
+                                           cut_right=rf.t_rf[0, 0]),
+                          FitOptions=fit_options)
+        if impedance:
+            resonator = Resonators(5e8, 1.5e9, 10)
+            total_voltage = TotalInducedVoltage(
+                beam, profile, [InducedVoltageFreq(beam, profile, [resonator]),
+                                InducedVoltageTime(beam, profile, [resonator])])
+        else:
+            total_voltage = None
+        if feedback:
+            PL_gain = 1. / (5. * ring.t_rev[0])
+            beam_feedback = BeamFeedback(
+                ring, rf, profile, {'machine': 'LHC', 'PL_gain': PL_gain,
+                                    'SL_gain': PL_gain / 10.})
+        else:
+            beam_feedback = None
+        if cavity_feedback:
+            # Corrections of the RF voltage bin by bin, as the SPS OTFB
+            cavity_feedback = SimpleNamespace(
+                V_corr=np.linspace(0.98, 1.02, n_slices),
+                phi_corr=np.linspace(-0.01, 0.01, n_slices))
+        else:
+            cavity_feedback = None
+        tracker = RingAndRFTracker(rf, beam, Profile=profile,
+                                   interpolation=interpolation,
+                                   TotalInducedVoltage=total_voltage,
+                                   BeamFeedback=beam_feedback,
+                                   CavityFeedback=cavity_feedback)
+        return tracker
+
+    def track_per_turn(self, tracker, n_turns):
+        for i in range(n_turns):
+            tracker.profile.track()
+            if tracker.totalInducedVoltage is not None:
+                tracker.totalInducedVoltage.induced_voltage_sum()
+            tracker.track()
+
+    def compare(self, window=None, **kwargs):
+        ref = self.create_tracker(**kwargs)
+        fused = self.create_tracker(window=window, **kwargs)
+
+        self.track_per_turn(ref, 50)
+        fused.track_n_turns(20)
+        fused.track_n_turns(30)
+
+        self.assertEqual(ref.counter[0], fused.counter[0])
+        self.assertEqual(ref.beam.energy, fused.beam.energy)
+        np.testing.assert_allclose(fused.beam.dt, ref.beam.dt,
+                                   rtol=1e-8, atol=1e-18)
+        np.testing.assert_allclose(fused.beam.dE, ref.beam.dE,
+                                   rtol=1e-8, atol=1e-3)
+        np.testing.assert_array_equal(fused.profile.n_macroparticles,
+                                      ref.profile.n_macroparticles)
+        return ref, fused
+
+    def test_kick(self):
+        self.compare()
+
+    def test_window(self):
+        self.compare(window=16)
+
+    def test_window_per_turn(self):
+        ref = self.create_tracker(interpolation=True)
+        windowed = self.create_tracker(interpolation=True, window=16)
+        self.track_per_turn(ref, 50)
+        self.track_per_turn(windowed, 50)
+        np.testing.assert_array_equal(windowed.beam.dt, ref.beam.dt)
+        np.testing.assert_array_equal(windowed.beam.dE, ref.beam.dE)
+
+    def test_interpolation(self):
+        ref, fused = self.compare(interpolation=True)
+        np.testing.assert_allclose(fused.rf_voltage, ref.rf_voltage,
+                                   rtol=1e-8, atol=1e-6)
+
+    def test_induced_voltage(self):
+        ref, fused = self.compare(interpolation=True, impedance=True)
+        np.testing.assert_allclose(
+            fused.totalInducedVoltage.induced_voltage,
+            ref.totalInducedVoltage.induced_voltage,
+            rtol=1e-6, atol=1e-6 * np.max(np.abs(
+                ref.totalInducedVoltage.induced_voltage)))
+
+    def test_fit(self):
+        tracker = self.create_tracker(interpolation=True, fit=True)
+        self.assertTrue(tracker._fused_checkpoints())
+        self.compare(interpolation=True, fit=True)
+
+    def test_large_profile(self):
+        tracker = self.create_tracker(interpolation=True, impedance=True,
+                                      n_slices=1024)
+        self.assertTrue(tracker._fused_tracking_allowed())
+        self.assertTrue(tracker._fused_checkpoints())
+        tracker.fused_max_slices = 1024
+        self.assertFalse(tracker._fused_checkpoints())
+        for window in [None, 16]:
+            ref, fused = self.compare(window=window, interpolation=True,
+                                      impedance=True, n_slices=1024)
+            np.testing.assert_allclose(
+                fused.totalInducedVoltage.induced_voltage,
+                ref.totalInducedVoltage.induced_voltage, rtol=1e-10)
+
+    def test_beam_feedback(self):
+        tracker = self.create_tracker(interpolation=True, feedback=True)
+        self.assertTrue(tracker._fused_checkpoints())
+        ref, fused = self.compare(interpolation=True, impedance=True,
+                                  feedback=True)
+        np.testing.assert_allclose(fused.omega_rf[:, :51],
+                                   ref.omega_rf[:, :51], rtol=1e-12)
+        np.testing.assert_allclose(fused.phi_rf[:, :51], ref.phi_rf[:, :51],
+                                   rtol=1e-8, atol=1e-12)
+        self.assertNotEqual(ref.beamFB.dphi, 0)
+
+    def test_cavity_feedback(self):
+        ref, fused = self.compare(interpolation=True, cavity_feedback=True)
+        np.testing.assert_allclose(fused.rf_voltage, ref.rf_voltage,
+                                   rtol=1e-8, atol=1e-6)
+
+    def test_last_turn(self):
+        tracker = self.create_tracker()
+        tracker.track_n_turns(self.N_t)
+        self.assertEqual(tracker.counter[0], self.N_t)
+        with self.assertRaises(RuntimeError):
+            tracker.track_n_turns(1)
+
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -655,6 +655,143 @@ class TestSort(unittest.TestCase):
         np.testing.assert_equal(y, y2)
 
 
+class TestWorkspace(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+        np.random.seed(0)
+        bm.workspace_release()
+
+    # Run after every test
+    def tearDown(self):
+        bm.workspace_release()
+
+    def test_allocate_release(self):
+        n_bytes = bm.workspace_bytes()
+        bm.workspace_allocate(1000, np.float64, threads=2)
+        self.assertEqual(bm.workspace_bytes(), n_bytes + 16000)
+        bm.workspace_allocate(1000, np.float64, threads=2)
+        self.assertEqual(bm.workspace_bytes(), n_bytes + 16000)
+        bm.workspace_release(1000, np.float64, threads=2)
+        self.assertEqual(bm.workspace_bytes(), n_bytes)
+
+    def test_resize(self):
+        n_bytes = bm.workspace_bytes()
+        bm.workspace_allocate(100, np.float32, threads=1)
+        bm.workspace_resize(100, 300, np.float32, threads=1)
+        self.assertEqual(bm.workspace_bytes(), n_bytes + 1200)
+
+    def test_histogram_different_sizes(self):
+        dt = np.random.randn(100000).astype(bm.precision.real_t)
+        for n_slices in [100, 1000, 10, 500, 100]:
+            profile = np.zeros(n_slices, dtype=bm.precision.real_t)
+            bm.slice(dt, profile, -3., 3.)
+            histo = np.histogram(dt, bins=n_slices, range=(-3., 3.))[0]
+            np.testing.assert_equal(profile, histo)
+
+    def test_histogram_reuse(self):
+        dt = np.random.randn(10000).astype(bm.precision.real_t)
+        profile = np.zeros(200, dtype=bm.precision.real_t)
+        bm.slice(dt, profile, -3., 3.)
+        n_bytes = bm.workspace_bytes()
+        for i in range(10):
+            bm.slice(dt, profile, -3., 3.)
+        self.assertEqual(bm.workspace_bytes(), n_bytes)
+
+
+class TestRandom(unittest.TestCase):
+
+    def test_uniform_numpy_philox(self):
+        key = (3 << 64) + 12345
+        for stream, turn in [(0, 0), (5, 7), (2**64 - 1, 2**64 - 1)]:
+            raw = np.random.Philox(
+                key=key, counter=100 + (stream << 64) + (turn << 128)
+            ).random_raw(4 * 50).reshape(50, 4)
+            u = bm.random_uniform(key, 100, 50, stream=stream, turn=turn)
+            np.testing.assert_equal(
+                u, ((raw >> np.uint64(11)) + 0.5) * 2.**-53)
+
+    def test_independent_subsets(self):
+        u = bm.random_uniform(7, 0, 1000, stream=2, turn=3)
+        np.testing.assert_equal(
+            bm.random_uniform(7, 300, 200, stream=2, turn=3), u[300:500])
+        dt, dE = bm.random_normal(7, 0, 1000, stream=2, turn=3)
+        dt2, dE2 = bm.random_normal(7, 300, 200, stream=2, turn=3)
+        np.testing.assert_equal(dt2, dt[300:500])
+        np.testing.assert_equal(dE2, dE[300:500])
+        radius = np.sqrt(-2 * np.log(u[:, 0]))
+        np.testing.assert_allclose(dt, radius * np.cos(2*np.pi*u[:, 1]),
+                                   rtol=1e-12, atol=1e-12)
+
+    def test_normal_moments(self):
+        dt, dE = bm.random_normal(11, 0, 200000)
+        self.assertAlmostEqual(np.mean(dt), 0, delta=0.01)
+        self.assertAlmostEqual(np.std(dE), 1, delta=0.01)
+        self.assertAlmostEqual(np.corrcoef(dt, dE)[0, 1], 0, delta=0.01)
+
+
+class TestBeamStatistics(unittest.TestCase):
+
+    def test_alive_particles(self):
+        np.random.seed(0)
+        n = 10007
+        # Large offset, where the sum of squares loses all the precision
+        dt = 1e6 + np.random.randn(n) * 1e-3
+        dE = np.random.randn(n) * 1e6
+        id = np.arange(1, n + 1)
+        id[np.random.rand(n) < 0.3] = 0
+        alive = id != 0
+
+        stats = bm.beam_statistics(dt, dE, id)
+        self.assertEqual(stats[0], np.sum(alive))
+        self.assertEqual(stats[1], n - np.sum(alive))
+        for x, i in [(dt[alive], 2), (dE[alive], 6)]:
+            np.testing.assert_allclose(stats[i], np.mean(x), rtol=1e-15)
+            np.testing.assert_allclose(stats[i+1], np.var(x) * len(x),
+                                       rtol=1e-6)
+            np.testing.assert_equal(stats[i+2:i+4], [x.min(), x.max()])
+
+    def test_all_lost(self):
+        stats = bm.beam_statistics(np.ones(10), np.ones(10),
+                                   np.zeros(10, dtype=int))
+        np.testing.assert_equal(stats[:4], [0, 10, 0, 0])
+
+    def test_bunches(self):
+        np.random.seed(0)
+        n, n_bunches, spacing, bucket, shift = 20000, 4, 3, 2.5e-9, 1e-10
+        dt = shift + np.random.rand(n) * bucket * spacing * (n_bunches + 1)
+        dE = np.random.randn(n) * 1e6
+        id = np.arange(1, n + 1)
+        id[np.random.rand(n) < 0.1] = 0
+
+        stats = bm.bunch_statistics(dt, dE, id, n_bunches, spacing, bucket,
+                                    t_offset=shift)
+        self.assertEqual(stats.shape, (n_bunches, 10))
+        buckets = np.floor((dt - shift) / bucket).astype(int)
+        for i in range(n_bunches):
+            in_bunch = buckets == i * spacing
+            alive = in_bunch & (id != 0)
+            self.assertEqual(stats[i, 0], np.sum(alive))
+            self.assertEqual(stats[i, 1], np.sum(in_bunch & (id == 0)))
+            for x, j in [(dt[alive], 2), (dE[alive], 6)]:
+                np.testing.assert_allclose(stats[i, j], np.mean(x),
+                                           rtol=1e-12)
+                np.testing.assert_allclose(stats[i, j+1], np.var(x) * len(x),
+                                           rtol=1e-10)
+                np.testing.assert_equal(stats[i, j+2:j+4],
+                                        [x.min(), x.max()])
+
+    def test_empty_bunch(self):
+        stats = bm.bunch_statistics(np.array([0.5, 2.5]), np.ones(2),
+                                    np.ones(2, dtype=int), 3, 1, 1.)
+        np.testing.assert_equal(stats[:, 0], [1, 0, 1])
+        np.testing.assert_equal(stats[1, :4], [0, 0, 0, 0])
+        # Min and max left out of a reduction over the workers
+        big = np.finfo(np.float64).max
+        np.testing.assert_equal(stats[1, 4:6], [big, -big])
+        np.testing.assert_equal(stats[1, 8:10], [big, -big])
+
+
 if __name__ == '__main__':
 
     unittest.main()
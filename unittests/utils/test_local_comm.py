@@ -0,0 +1,222 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unittest for utils.local_comm
+
+:Authors: **Konstantinos Iliakis**
+"""
+
+import unittest
+import numpy as np
+
+from blond.utils import local_comm
+from blond.utils import bmath as bm
+
+
+def check_worker(reduction, compact_histo):
+    # Runs on every local process, fails with an AssertionError
+    from blond.utils.mpi_config import worker
+    worker.initReduction(reduction, compact_histo)
+    rank, workers = worker.rank, worker.workers
+    assert workers == 3
+
+    x = np.arange(10, dtype=np.uint32) * (rank + 1)
+    worker.allreduce(x, dtype=np.uint32, operator='custom_sum')
+    np.testing.assert_equal(x, np.arange(10) * 6)
+    y = np.array([rank + 1.])
+    np.testing.assert_equal(worker.allreduce(y, operator='max'), [3.])
+    np.testing.assert_equal(worker.allreduce(np.array([rank + 1.]),
+                                             operator='mean'), [2.])
+    z = np.full(5, rank, dtype=np.int64)
+    worker.iallreduce(z, operator='sum').Wait()
+    np.testing.assert_equal(z, 3)
+    r = worker.reduce(np.array([rank + 1.]), operator='sum')
+    if worker.isMaster:
+        np.testing.assert_equal(r, [6.])
+
+    histo = np.zeros(1000)
+    histo[100 + rank] = rank + 1
+    worker.allreduce_histo(histo)
+    np.testing.assert_equal(histo[100:103], [1, 2, 3])
+    assert histo.sum() == 6
+
+    part = worker.scatter(np.arange(10.))
+    np.testing.assert_equal(part, np.array_split(np.arange(10.), 3)[rank])
+    np.testing.assert_equal(worker.allgather(part), np.arange(10.))
+    gathered = worker.gather(part)
+    if worker.isMaster:
+        np.testing.assert_equal(gathered, np.arange(10.))
+
+    # Statistics of unequal numbers of particles, none on the last worker
+    n = [1000, 10, 0][rank]
+    dt = 1e6 + np.linspace(rank, rank + 1, n)
+    stats = worker.reduce_statistics(
+        bm.beam_statistics(dt, -dt, np.ones(n, dtype=int)), all=True)
+    all_dt = np.concatenate([1e6 + np.linspace(r, r + 1, [1000, 10, 0][r])
+                             for r in range(3)])
+    np.testing.assert_allclose(stats[[0, 2, 4, 5]], [1010, all_dt.mean(),
+                               all_dt.min(), all_dt.max()], rtol=1e-15)
+    np.testing.assert_allclose(stats[3], np.var(all_dt) * 1010, rtol=1e-8)
+    np.testing.assert_allclose(stats[6], -all_dt.mean(), rtol=1e-15)
+
+    # Statistics of the beam and of every bunch, merged together
+    from blond.beam.beam import Beam
+    bm.use_mpi()
+    beam = Beam.__new__(Beam)
+    beam.dt = np.linspace(0, 3, 31)[rank::3].copy()
+    beam.dE = beam.dt * 2
+    beam.id = np.ones(len(beam.dt), dtype=int)
+    beam.statistics(n_bunches=2, bunch_spacing_buckets=2, bucket_size_tau=1.)
+    beam.gather_statistics(all=True)
+    all_dt = np.linspace(0, 3, 31)
+    np.testing.assert_equal(beam.bunch_alive, [10, 10])
+    for i in range(2):
+        x = all_dt[(all_dt >= 2 * i) & (all_dt < 2 * i + 1)]
+        np.testing.assert_allclose([beam.bunch_mean_dt[i],
+                                    beam.bunch_sigma_dt[i],
+                                    beam.bunch_mean_dE[i]],
+                                   [x.mean(), x.std(), 2 * x.mean()],
+                                   rtol=1e-14)
+    np.testing.assert_equal(beam.n_total_macroparticles_lost, 0)
+    np.testing.assert_allclose(beam.mean_dt, 1.5, rtol=1e-15)
+
+    # The second bunch is empty on the first worker, its min and max are
+    # those of the other workers
+    beam.dt = np.array([0.5]) if rank == 0 else np.array([2. + rank / 4])
+    beam.dE = -beam.dt
+    beam.id = np.ones(1, dtype=int)
+    beam.statistics(n_bunches=2, bunch_spacing_buckets=2, bucket_size_tau=1.)
+    beam.gather_statistics(all=True)
+    np.testing.assert_equal(beam.bunch_alive, [1, 2])
+    np.testing.assert_equal([beam.bunch_min_dt, beam.bunch_max_dt],
+                            [[0.5, 2.25], [0.5, 2.5]])
+    np.testing.assert_equal([beam.bunch_min_dE, beam.bunch_max_dE],
+                            [[-0.5, -2.5], [-0.5, -2.25]])
+
+    # The first worker has not computed its statistics yet
+    from blond.beam.beam import Proton
+    from blond.input_parameters.ring import Ring
+    ring = Ring(26658.883, 1/55.759505**2, 450e9, Proton(), 1)
+    beam = Beam(ring, 2, 1e11)
+    if rank > 0:
+        beam.dt[:] = [1. + rank, 2. + rank]
+        beam.dE[:] = -beam.dt
+        beam.statistics()
+    beam.gather_statistics(all=True)
+    np.testing.assert_equal([beam.min_dt, beam.max_dt, beam.min_dE,
+                             beam.max_dE], [2., 4., -4., -2.])
+
+    shared = worker.shared_array(lambda: np.arange(4.))
+    np.testing.assert_equal(shared, np.arange(4.))
+
+    # Built on the master of the node only, the large arrays shared
+    from types import SimpleNamespace
+    built = []
+
+    def build():
+        built.append(rank)
+        return SimpleNamespace(large=np.arange(2000.), small=np.arange(3.),
+                               name='programme')
+
+    obj = worker.shared_object(build)
+    assert built == ([rank] if worker.noderank == 0 else [])
+    np.testing.assert_equal(obj.large, np.arange(2000.))
+    np.testing.assert_equal(obj.small, np.arange(3.))
+    assert obj.name == 'programme'
+    assert (not obj.large.flags.writeable) and obj.small.flags.writeable
+
+    # Messages arriving in another order than asked for
+    comm = worker.intercomm
+    if rank == 0:
+        comm.Isend(np.array([1.]), 1, tag=1)
+        comm.Isend(np.array([2.]), 1, tag=2)
+    elif rank == 1:
+        first, second = np.empty(1), np.empty(1)
+        requests = [comm.Irecv(second, 0, tag=2), comm.Irecv(first, 0, tag=1)]
+        local_comm.Request.Waitall(requests)
+        np.testing.assert_equal([first[0], second[0]], [1., 2.])
+    worker.sync()
+
+
+def check_reductions(reduction):
+    # The sums of allreduce and allreduce_histo, compared with a plain sum
+    from blond.utils.mpi_config import worker, MPI
+    worker.initReduction(reduction)
+    rank = worker.rank
+    np.random.seed(rank)
+
+    def reference(x):
+        total = np.array(x)
+        worker.intercomm.Allreduce(MPI.IN_PLACE, total, op=MPI.SUM)
+        return total
+
+    for dtype in [np.float64, np.int32, np.uint32]:
+        x = (np.random.rand(5, 7) * 100).astype(dtype)
+        expected = reference(x)
+        np.testing.assert_equal(worker.allreduce(x.copy(), dtype=dtype,
+                                                 operator='custom_sum'),
+                                expected)
+        if reduction == 'node':
+            # Result written in an array that cannot be flattened in place
+            recvbuf = np.zeros((5, 8), dtype=dtype)[:, :7]
+            worker.allreduce(x, recvbuf, dtype=dtype, operator='sum')
+            np.testing.assert_equal(recvbuf, expected)
+
+    n_bins = 10000
+    sparse = np.zeros(n_bins)
+    sparse[[10 + rank, 5000, n_bins - 1 - rank]] = [1, rank + 2, 3]
+    histograms = [('sparse', sparse, None), ('zero', np.zeros(n_bins), None)]
+    for name, (lo, hi), count, dtype in [
+            ('dense16', (200, 800), 100, np.uint16),
+            ('dense16', (100, 3000), 100, np.uint16),
+            ('dense32', (300, 900), 50000, np.uint32)]:
+        histo = np.zeros(n_bins)
+        histo[lo + rank:hi - rank] = np.random.randint(
+            0, count, hi - lo - 2 * rank)
+        histograms.append((name, histo, dtype))
+
+    for name, histo, dtype in histograms:
+        expected = reference(histo)
+        worker.allreduce_histo(histo)
+        np.testing.assert_equal(histo, expected, err_msg=name)
+        if dtype is not None:
+            # Reduced densely, in a buffer grown to the occupied range
+            assert len(worker.histo_buffers[dtype]) >= \
+                np.ptp(np.flatnonzero(expected)) + 1, name
+        else:
+            assert len(worker.histo_buffers) == 0, name
+
+
+def fail(exit_rank):
+    from blond.utils.mpi_config import worker
+    assert worker.rank != exit_rank
+    worker.sync()
+
+
+class TestLocalComm(unittest.TestCase):
+
+    def test_worker(self):
+        for reduction, compact_histo in [('flat', False), ('node', True)]:
+            self.assertEqual(local_comm.launch(
+                check_worker, 3, args=(reduction, compact_histo)), 0)
+
+    def test_reductions(self):
+        for reduction in ['flat', 'node']:
+            self.assertEqual(local_comm.launch(
+                check_reductions, 3, args=(reduction, )), 0)
+
+    def test_failure(self):
+        # The other processes, blocked in the barrier, are terminated
+        self.assertNotEqual(local_comm.launch(fail, 3, args=(1,)), 0)
+
+
+if __name__ == '__main__':
+
+    unittest.main()